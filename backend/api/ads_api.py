@@ -1,45 +1,119 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timezone
+from typing import Optional
+import base64
 import os
 
-from models.mongo_client import get_mongo_client
+from fastapi.concurrency import run_in_threadpool
+
+from models.mongo_client import get_async_db
 
 router = APIRouter()
-client = get_mongo_client()
-db = client["test"]
-ads_collection = db["ads"]
+
+def ads_collection():
+    return get_async_db()["ads"]
+
+AD_FIELDS = [
+    "profile_name", "keyword", "advertiser", "link", "domain", "screenshot_path", "timestamp",
+    "first_seen", "last_seen", "seen_count", "profiles",
+]
 
 class DeleteAdRequest(BaseModel):
     ad_id: str
 
+def encode_cursor(ad: dict) -> str:
+    ts = ad.get("timestamp")
+    ms = int(ts.replace(tzinfo=timezone.utc).timestamp() * 1000) if isinstance(ts, datetime) else 0
+    return base64.urlsafe_b64encode(f"{ms}:{ad['_id']}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        ms, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        ts = datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return ts, ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+def split_values(value: Optional[str]) -> list:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
 @router.get("/")
-def get_all_ads():
-    ads = list(ads_collection.find())
-    result = []
-    for ad in ads:
-        result.append({
-            "id": str(ad.get("_id")),
-            "profile_name": ad.get("profile_name"),
-            "keyword": ad.get("keyword", ""),
-            "advertiser": ad.get("advertiser", ""),
-            "link": ad.get("link", ""),
-            "domain": ad.get("domain", ""),
-            "screenshot_path": ad.get("screenshot_path", ""),
-            "timestamp": ad.get("timestamp", ""),
-        })
-    return result
+async def get_all_ads(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    keyword: Optional[str] = None,
+    domain: Optional[str] = None,
+    advertiser: Optional[str] = None,
+    profile_name: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = None,
+):
+    conditions = []
+    for name, value in [("keyword", keyword), ("domain", domain), ("advertiser", advertiser), ("profile_name", profile_name)]:
+        values = split_values(value)
+        if len(values) == 1:
+            conditions.append({name: values[0]})
+        elif values:
+            conditions.append({name: {"$in": values}})
+
+    ts_range = {}
+    if start:
+        ts_range["$gte"] = start
+    if end:
+        ts_range["$lte"] = end
+    if ts_range:
+        conditions.append({"timestamp": ts_range})
+
+    if cursor:
+        ts, oid = decode_cursor(cursor)
+        # the plain range keeps index bounds tight, the $or breaks timestamp ties on _id
+        conditions.append({"timestamp": {"$lte": ts}})
+        conditions.append({"$or": [
+            {"timestamp": {"$lt": ts}},
+            {"timestamp": ts, "_id": {"$lt": oid}},
+        ]})
+
+    query = {"$and": conditions} if conditions else {}
+
+    wanted = [f for f in split_values(fields) if f in AD_FIELDS] or AD_FIELDS
+    projection = {f: 1 for f in wanted}
+    projection["timestamp"] = 1
+
+    docs = await (
+        ads_collection().find(query, projection)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(None)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    items = []
+    for ad in docs:
+        item = {"id": str(ad.get("_id"))}
+        for f in wanted:
+            item[f] = ad.get(f, "")
+        items.append(item)
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(docs[-1]) if has_more else None,
+    }
 
 @router.delete("/delete")
-def delete_ad(data: DeleteAdRequest):
-    ad = ads_collection.find_one({"_id": ObjectId(data.ad_id)})
+async def delete_ad(data: DeleteAdRequest):
+    ad = await ads_collection().find_one({"_id": ObjectId(data.ad_id)})
     if not ad:
         raise HTTPException(status_code=404, detail="Không tìm thấy quảng cáo")
 
     screenshot_path = ad.get("screenshot_path")
-    if screenshot_path and os.path.exists(screenshot_path):
-        os.remove(screenshot_path)
+    if screenshot_path and await run_in_threadpool(os.path.exists, screenshot_path):
+        await run_in_threadpool(os.remove, screenshot_path)
         print(f"Đã xoá ảnh: {screenshot_path}")
 
-    ads_collection.delete_one({"_id": ObjectId(data.ad_id)})
+    await ads_collection().delete_one({"_id": ObjectId(data.ad_id)})
     return {"message": "Đã xoá quảng cáo và ảnh thành công!"}
@@ -1,56 +1,87 @@
+import hashlib
+import json
 import math
 import os
+import tempfile
 import time
 import random
-import shutil
-import requests
-import boto3
 import uuid
 import socket
 import stat
+import threading
 from datetime import datetime
-from urllib.parse import urlparse, parse_qs
 
-from fastapi import APIRouter, BackgroundTasks, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
-from botocore.client import Config
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
-from models.keyword_model import get_all_keywords
+from models.keyword_model import get_all_keywords, keywords_cache
 from models.mongo_client import get_mongo_client
-from models.profile_model import get_all_profiles
+from models.profile_model import get_valid_profiles, profiles_cache
+from services.keyword_queue import KeywordQueue
+from services.job_queue import RedisJobQueue
+from services.driver_pool import driver_pool
+from services.r2_uploader import r2_uploader
+from services.profile_clone import profile_cloner
+from services.ad_writer import ad_writer
+from services.screenshot_dedup import screenshot_dedup, dhash
+from services.screenshot_processing import screenshot_processor
+from services.progress import get_progress_reporter
+from services.crawl_events import emit_event, stream_events
+from services.proxy_pool import NO_PROXY, proxy_pool
+from services.pacing import get_rate_budget, wait_for_serp
+from services.metrics import CRAWL_ADS, CRAWL_KEYWORDS, observe_stage, record_error
+from services.governor import GOVERNOR_MAX_WORKERS, RunLock, governor
+from services.scheduler import SCHEDULER_ENABLED, RunResults, release_keywords
+from services.serp_archive import SERP_ARCHIVE_ENABLED, archive_page
+from services.serp_extract import extract_ads, capture_clip, extract_real_link_and_domain, make_ad_key
+from services.resource_blocking import (
+    LIGHTWEIGHT_BROWSING, PERFORMANCE_LOGGING_PREFS, apply_resource_blocking, record_page_bytes, page_bytes_stats,
+)
 
 load_dotenv()
 
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
 PATH_PROFILE = os.getenv("PATH_PROFILE")
 PATH_PROFILE_CLONE = os.getenv("PATH_PROFILE_CLONE")
-API_PROXY_URL = os.getenv("API_PROXY_URL")
 
 UA_MOBILE_FILE = os.getenv("USER_AGENT_MOBILE_FILE")
 UA_TABLET_FILE = os.getenv("USER_AGENT_TABLET_FILE")
 UA_LAPTOP_FILE = os.getenv("USER_AGENT_LAPTOP_FILE")
 
+SERP_BASE_URL = os.getenv("SERP_BASE_URL", "https://www.google.com.vn").rstrip("/")
+CHROME_VERSION_MAIN = int(os.getenv("CHROME_VERSION_MAIN", 120))
+CHROME_HEADLESS = os.getenv("CHROME_HEADLESS", "0") == "1"
+PROXY_EXTENSION_DIR = os.getenv("PROXY_EXTENSION_DIR", os.path.join(tempfile.gettempdir(), "proxy_auth"))
+
 REDIS_KEY_LOCK = os.getenv("REDIS_KEY_LOCK", "crawl:lock")
 REDIS_KEY_LATEST = os.getenv("REDIS_KEY_LATEST", "crawl:latest_run")
 REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "crawl:status:")
-REDIS_TTL_LOCK = int(os.getenv("REDIS_TTL", 60 * 60))
+REDIS_KEY_PROFILE_LOCK = os.getenv("REDIS_KEY_PROFILE_LOCK", "crawl:profile_lock:")
+# renewed by a heartbeat now, so it only bounds how long a crashed holder blocks; REDIS_TTL is the old name
+REDIS_TTL_LOCK = int(os.getenv("REDIS_TTL_LOCK") or os.getenv("REDIS_TTL") or 5 * 60)
+# "reject": a second /api/crawl gets 409, "queue": it waits for the running crawl to finish
+CRAWL_LOCK_MODE = os.getenv("CRAWL_LOCK_MODE", "queue")
+CRAWL_LOCK_WAIT = int(os.getenv("CRAWL_LOCK_WAIT", 6 * 60 * 60))
 RUN_METADATA_TTL = int(os.getenv("RUN_METADATA_TTL", 60 * 60 * 24))
 
-
-MAX_THREADS = int(os.getenv("THREAD_MAX", 2))
+MAX_THREADS = GOVERNOR_MAX_WORKERS
+# "shard": profiles share one keyword queue, "full": every profile crawls every keyword
+CRAWL_DISTRIBUTION = os.getenv("CRAWL_DISTRIBUTION", "shard")
+KEYWORD_REPLICAS = int(os.getenv("KEYWORD_REPLICAS", 1))
+# a profile that keeps failing (captcha, dead driver, bad proxy) stops pulling keywords
+CRAWL_MAX_CONSECUTIVE_FAILURES = int(os.getenv("CRAWL_MAX_CONSECUTIVE_FAILURES", 3))
+# "local": crawl inside the API process, "queue": only enqueue jobs for `python -m crawl_worker`
+CRAWL_EXECUTOR = os.getenv("CRAWL_EXECUTOR", "local")
+# whole runs execute here, never on the request threadpool
+CRAWL_RUN_WORKERS = int(os.getenv("CRAWL_RUN_WORKERS", 2))
+crawl_executor = ThreadPoolExecutor(max_workers=CRAWL_RUN_WORKERS, thread_name_prefix="crawl-run")
 
 router = APIRouter()
+ads_collection = get_mongo_client()["test"]["ads"]
 
 def load_uas(path: str) -> list:
     if not path or not os.path.exists(path):
@@ -96,132 +127,159 @@ def choose_user_agent_and_window(profile: dict, keyword: str = None):
 
     return ua, win
 
-def upload_to_r2(local_path: str, remote_path: str) -> bool:
-    if not all([R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_ENDPOINT_URL]):
-        return False
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        endpoint_url=R2_ENDPOINT_URL,
-        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
-        region_name="auto",
-    )
-    try:
-        s3.upload_file(local_path, R2_BUCKET_NAME, remote_path)
-        return True
-    except Exception as e:
-        print("[R2 Upload Error]", e)
-        return False
+def screenshot_writeback(ad_key: str, phash: str = None):
+    def on_done(key):
+        if not key:
+            return
+        if phash:
+            screenshot_dedup.remember(ad_key, phash, key)
+        ads_collection.update_one(
+            {"ad_key": ad_key},
+            {"$set": {"screenshot_path": key, "screenshot_uploaded": True, "screenshot_hash": phash}}
+        )
+    return on_done
+
+def thumbnail_writeback(ad_key: str):
+    def on_done(key):
+        if key:
+            ads_collection.update_one({"ad_key": ad_key}, {"$set": {"screenshot_thumbnail": key}})
+    return on_done
+
+def upload_screenshot(ad_key: str, processed: dict):
+    local_path = processed["path"]
+    if not os.path.exists(local_path):
+        return
+    phash = processed.get("phash")
+    if phash is None:
+        try:
+            phash = dhash(local_path)
+        except Exception as e:
+            print("[PHASH] hash error", e)
+
+    # unchanged creative: point at the object we already stored and skip the upload
+    existing = screenshot_dedup.lookup(ad_key, phash) if phash else None
+    if existing:
+        screenshot_writeback(ad_key, phash)(existing)
+        for path in (local_path, processed.get("thumbnail")):
+            try:
+                if path:
+                    os.remove(path)
+            except OSError:
+                pass
+        return
+    r2_uploader.submit(local_path, screenshot_writeback(ad_key, phash))
+    if processed.get("thumbnail"):
+        r2_uploader.submit(processed["thumbnail"], thumbnail_writeback(ad_key))
+
+def submit_screenshot_uploads(docs: list):
+    for doc in docs:
+        # waits (off this thread) for crop/resize/encode if the screenshot went through the processor
+        screenshot_processor.when_ready(
+            doc["screenshot_path"],
+            lambda processed, ad_key=doc["ad_key"]: upload_screenshot(ad_key, processed),
+        )
 
 profile_index = 0
 def choose_next_profile():
     global profile_index
-    profiles = get_all_profiles()
-    valid_profiles = [
-        p for p in profiles
-        if os.path.exists(f"{PATH_PROFILE}/{p.get('name','').strip()}")
-    ]
+    valid_profiles = get_valid_profiles(PATH_PROFILE)
     if not valid_profiles:
         return None
     profile = valid_profiles[profile_index % len(valid_profiles)]
     profile_index += 1
     return profile
 
-def get_proxy_from_api():
-    try:
-        r = requests.get(API_PROXY_URL, timeout=10)
-        text = r.text.strip()
-
-        if ":" in text and len(text.split(":")) == 4:
-            return tuple(text.split(":"))
-
-        data = r.json()
-        px = data.get("proxyhttp")
-        if px and len(px.split(":")) == 4:
-            return tuple(px.split(":"))
-
-        return (
-            data.get("ip"),
-            data.get("port"),
-            data.get("username"),
-            data.get("password"),
+def get_fresh_proxy_for_profile(profile_name: str):
+    # served from the prefetched pool; keeps the pooled browser's proxy while it is healthy,
+    # so the driver is reused and the score lands on the proxy that actually carried the traffic
+    return proxy_pool.acquire(profile_name, prefer=driver_pool.launch_key(profile_name))
+
+def proxy_auth_extension(proxy: tuple) -> str:
+    # Chrome ignores credentials in --proxy-server; a tiny extension answers the 407 instead
+    host, port, user, password = proxy
+    digest = hashlib.sha1(f"{host}:{port}:{user}:{password}".encode("utf-8")).hexdigest()[:16]
+    ext_dir = os.path.join(PROXY_EXTENSION_DIR, digest)
+    if os.path.exists(os.path.join(ext_dir, "manifest.json")):
+        return ext_dir
+    os.makedirs(ext_dir, exist_ok=True)
+    with open(os.path.join(ext_dir, "background.js"), "w", encoding="utf-8") as f:
+        f.write(
+            "chrome.webRequest.onAuthRequired.addListener("
+            f"(details, callback) => callback({{authCredentials: {{username: {json.dumps(user)}, password: {json.dumps(password)}}}}}),"
+            "{urls: ['<all_urls>']}, ['asyncBlocking']);"
         )
-    except Exception as e:
-        print("[Proxy Error]", e)
-        return None, None, None, None
-def get_fresh_proxy_for_profile(profile_name: str, retry: int = 3):
-    for i in range(retry):
-        proxy_host, proxy_port, proxy_user, proxy_pass = get_proxy_from_api()
-
-        if proxy_host and proxy_port:
-            return proxy_host, proxy_port, proxy_user, proxy_pass
-
-        time.sleep(1)
-
-    print(f"[{profile_name}] NO PROXY (fallback)")
-    return None, None, None, None
-
-def extract_real_link_and_domain(href: str):
-    if "google.com/aclk" in href or "google.com/url" in href:
-        qs = parse_qs(urlparse(href).query)
-        real = qs.get("adurl", qs.get("q", [href]))[0]
-        return real, urlparse(real).netloc.replace("www.", "")
-    return href, urlparse(href).netloc.replace("www.", "")
-
-def scroll_and_focus(driver, element, timeout=5) -> bool:
-    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", element)
-    time.sleep(random.uniform(0.3, 0.9))
-
-    ActionChains(driver).move_to_element(element).pause(random.uniform(0.1, 0.5)).perform()
+    with open(os.path.join(ext_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "manifest_version": 3,
+            "name": "proxy-auth",
+            "version": "1.0",
+            "permissions": ["webRequest", "webRequestAuthProvider"],
+            "host_permissions": ["<all_urls>"],
+            "background": {"service_worker": "background.js"},
+        }, f)
+    return ext_dir
+
+def proxy_launch_key(proxy: tuple):
+    host, port, user, password = proxy or NO_PROXY
+    return f"{host}:{port}" if host and port else None
+
+def launch_driver(profile: dict, user_agent: str, proxy: tuple = None):
+    options = uc.ChromeOptions()
+    options.add_argument(f"--user-data-dir={profile['user_data_dir']}")
+    options.add_argument(f"--profile-directory={profile['profile_directory']}")
+    options.add_argument(f"--user-agent={user_agent}")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    # options.add_argument("--headless=chrome")
+    # CDP network events for exact per-page byte counts (/api/crawl/bandwidth)
+    options.set_capability("goog:loggingPrefs", PERFORMANCE_LOGGING_PREFS)
+    if proxy_launch_key(proxy):
+        options.add_argument(f"--proxy-server=http://{proxy[0]}:{proxy[1]}")
+        options.add_argument("--proxy-bypass-list=localhost;127.0.0.1")
+        if proxy[2] and proxy[3]:
+            options.add_argument(f"--load-extension={proxy_auth_extension(proxy)}")
+
+    return uc.Chrome(
+        version_main=CHROME_VERSION_MAIN,
+        options=options,
+        headless=CHROME_HEADLESS,
+    )
 
-    end = time.time() + timeout
-    while time.time() < end:
-        try:
-            if element.is_displayed() and element.size.get("height", 0) > 8:
-                return True
-        except: pass
-        time.sleep(0.2)
-    return False
-
-def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
-    client = None
+def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None, keyword_queue: KeywordQueue = None,
+                       keywords: list = None, schedule_results: RunResults = None):
     driver = None
+    progress = None
+    proxy = None
+    proxy_ok = False
+    profile_lease = None
     try:
-        keywords = get_all_keywords()
-        if not keywords:
-            return {"status": "error", "error": "Không có keyword nào"}
-
         if not profile:
             return {"status": "error", "error": "No profile provided"}
 
+        if redis_client is not None:
+            # one browser per user_data_dir across the API and every worker replica
+            owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+            lease = RunLock(redis_client, f"{REDIS_KEY_PROFILE_LOCK}{profile.get('name', '').strip()}", owner, REDIS_TTL_LOCK)
+            if not lease.acquire():
+                print(f"[{profile.get('name', '')}] busy on {lease.holder()}, skipped")
+                return {"status": "busy", "ads_collected": 0, "profile": profile.get("name", "")}
+            profile_lease = lease
+
+        if keyword_queue is not None:
+            keywords = None
+            if not keyword_queue.has_work_for(profile.get("name", "").strip()):
+                return {"status": "done", "ads_collected": 0, "profile": profile.get("name", "")}
+        else:
+            # full distribution: the run's own list (a scheduled run only carries the due keywords)
+            if keywords is None:
+                keywords = get_all_keywords()
+            if not keywords:
+                return {"status": "error", "error": "Không có keyword nào"}
+
         def get_or_create_clone(profile: dict):
             profile_name = profile.get("name", "").strip()
-            if not profile_name:
-                raise Exception("Profile name empty")
-
-            clone_root = os.path.join(PATH_PROFILE_CLONE, profile_name)
-
-            if not os.path.exists(clone_root):
-                print(f"[CLONE] Create clone for {profile_name}")
-
-                def ignore_singleton(dirpath, names):
-                    return [n for n in names if n.startswith("Singleton")]
-
-                shutil.copytree(PATH_PROFILE, clone_root, ignore=ignore_singleton)
-
-                for name in [
-                    "SingletonCookie", "SingletonLock",
-                    "SingletonSocket", "SingletonLazyLock", "lockfile"
-                ]:
-                    p = os.path.join(clone_root, name)
-                    if os.path.exists(p):
-                        try:
-                            os.remove(p)
-                        except:
-                            pass
-            else:
-                print(f"[CLONE] Reuse clone for {profile_name}")
+            clone_root = profile_cloner.get_clone(profile_name)
 
             profile["user_data_dir"] = clone_root
             profile["profile_directory"] = profile_name
@@ -230,47 +288,25 @@ def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
 
         profile = get_or_create_clone(profile)
         profile_name = profile.get("name", "").strip()
+        # files are removed by the uploader once they are safely in R2
         ss_dir = "screenshots"
-        if os.path.exists(ss_dir):
-            try:
-                shutil.rmtree(ss_dir)
-            except Exception:
-                pass
         os.makedirs(ss_dir, exist_ok=True)
 
-        client = get_mongo_client()
-        collection = client["test"]["ads"]
-
-        proxy_host, proxy_port, proxy_user, proxy_pass = get_fresh_proxy_for_profile(profile_name)
+        with observe_stage("proxy_fetch"):
+            proxy = get_fresh_proxy_for_profile(profile_name)
+        proxy_host, proxy_port, proxy_user, proxy_pass = proxy
 
-        seleniumwire_options = None
-
-        if all([proxy_host, proxy_port, proxy_user, proxy_pass]):
-            seleniumwire_options = {
-                "proxy": {
-                    "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-                    "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
-                    "no_proxy": "localhost,127.0.0.1",
-                }
-            }
         user_agent, window = choose_user_agent_and_window(profile)
         print(f"[{profile_name}] user_agent={user_agent}, window={window}, proxy={proxy_host}:{proxy_port}")
 
-        options = uc.ChromeOptions()
-        options.add_argument(f"--user-data-dir={profile['user_data_dir']}")
-        options.add_argument(f"--profile-directory={profile['profile_directory']}")
-        options.add_argument(f"--user-agent={user_agent}")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        # options.add_argument("--headless=chrome")
-
-        driver = uc.Chrome(
-            version_main=120,
-            options=options,
-            seleniumwire_options=seleniumwire_options,
-            headless=False,
+        driver, reused = driver_pool.checkout(
+            profile_name,
+            lambda: launch_driver(profile, user_agent, proxy),
+            launch_key=proxy_launch_key(proxy),
         )
+        if reused and not driver_pool.rebind(driver, user_agent):
+            print(f"[{profile_name}] reused driver keeps its launch user agent")
+        apply_resource_blocking(driver, enabled=bool(profile.get("lightweight", LIGHTWEIGHT_BROWSING)))
 
         driver.set_window_size(*window)
 
@@ -288,8 +324,14 @@ def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
         except Exception:
             pass
 
-        total_keywords = len(keywords)
+        if keyword_queue is not None:
+            total_keywords = keyword_queue.total
+            keyword_iter = iter(lambda: keyword_queue.next_for(profile_name), None)
+        else:
+            total_keywords = len(keywords)
+            keyword_iter = iter(keywords)
         processed_local = 0
+        progress = get_progress_reporter(redis_client) if redis_client is not None else None
 
         if redis_client is not None and run_id is not None:
             run_key = f"{REDIS_KEY_PREFIX}{run_id}"
@@ -301,110 +343,150 @@ def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
                 pass
 
         total_ads = 0
-        all_uploaded = True
+        network_errors = 0
+        consecutive_failures = 0
+        abort_reason = None
+        yielded = False
+        budget = get_rate_budget(profile)
 
-        for kw in keywords:
+        for kw in keyword_iter:
             keyword = kw["keyword"]
+            # queue jobs carry their own run id (worker mode serves several runs)
+            kw_run_id = kw.get("run_id") or run_id
+            kw_ads = 0
+            kw_bytes = 0
+            kw_ad_keys = None
+            kw_status = "error"
+            emit_event(redis_client, kw_run_id, "keyword_started", profile=profile_name, keyword=keyword)
             try:
-                delay = random.uniform(3, 5)
-                time.sleep(delay)
-                driver.get(f"https://www.google.com.vn/search?q={keyword}")
-
-                WebDriverWait(driver, 30).until(
-                    EC.presence_of_element_located((By.XPATH, "//*[contains(text(),'Quảng cáo') or contains(text(),'Sponsored') or contains(text(),'Được tài trợ')]"))
-                )
-
-                ad_blocks = driver.find_elements(By.XPATH, "//span[text()='Quảng cáo' or text()='Sponsored' or text()='Được tài trợ']/ancestor::div[@data-text-ad]")
-                if not ad_blocks:
-                    if redis_client is not None and run_id is not None:
-                        try:
-                            run_key = f"{REDIS_KEY_PREFIX}{run_id}"
-                            redis_client.hincrby(run_key, "processed_keywords", 1)
-                            tot = int(redis_client.hget(run_key, "total_keywords") or total_keywords)
-                            proc = int(redis_client.hget(run_key, "processed_keywords") or 0)
-                            percent = int(proc * 100 / max(1, tot))
-                            redis_client.hset(run_key, "progress", percent)
-                            redis_client.hset(run_key, "message", f"{profile_name}: processed {proc}/{tot}")
-                        except Exception:
-                            pass
-                    continue
+                budget.acquire()
+                with observe_stage("page_load"):
+                    driver.get(f"{SERP_BASE_URL}/search?q={keyword}")
+
+                # returns as soon as the results are there, with or without ads
+                with observe_stage("ad_wait"):
+                    serp_state = wait_for_serp(driver)
+                if serp_state == "captcha":
+                    abort_reason = "captcha"
+                    raise Exception("captcha page")
+                kw_bytes = record_page_bytes(driver)
+
+                with observe_stage("extraction"):
+                    ad_blocks = extract_ads(driver)
+                if SERP_ARCHIVE_ENABLED:
+                    try:
+                        archive_page(driver.page_source, kw_run_id, keyword, profile_name, ads=len(ad_blocks))
+                    except Exception as e:
+                        print(f"[{profile_name}] [SERP archive error] {keyword}: {e}")
+                kw_ad_keys = set()
+                kw_status = "ok"
 
                 ads_data = []
-                for ad in ad_blocks:
-                    link, domain = None, None
-                    for a in ad.find_elements(By.XPATH, ".//a[@href]"):
-                        href = a.get_attribute("href")
-                        if href and href.startswith("http"):
-                            link, domain = extract_real_link_and_domain(href)
-                            break
+                for i, ad in enumerate(ad_blocks):
+                    if not ad.get("href"):
+                        continue
+                    link, domain = extract_real_link_and_domain(ad["href"])
                     if not (link and domain):
                         continue
 
-                    try:
-                        advertiser = ad.find_element(By.XPATH, ".//span[contains(@data-dtld)]").text.strip()
-                    except Exception:
-                        advertiser = domain
+                    advertiser = ad.get("advertiser") or domain
 
-                    filename = f"{profile_name.replace(' ', '_')}_{datetime.now().timestamp()}.png"
+                    filename = f"{profile_name.replace(' ', '_')}_{datetime.now().timestamp()}_{i}.png"
                     local_path = os.path.join(ss_dir, filename)
                     try:
-                        if scroll_and_focus(driver, ad):
-                            ad.screenshot(local_path)
-                        else:
-                            driver.save_screenshot(local_path)
-                    except Exception:
-                            pass
-
-                    uploaded = upload_to_r2(local_path, f"screenshots")
-                    if not uploaded:
-                        all_uploaded = False
+                        with observe_stage("screenshot"):
+                            try:
+                                clipped = capture_clip(driver, ad.get("rect"), local_path)
+                            except Exception as e:
+                                # a CDP error costs the clip, not the screenshot
+                                print(f"[{profile_name}] [clip error] {keyword}: {e}")
+                                clipped = False
+                            if not clipped:
+                                driver.save_screenshot(local_path)
+                        # a full-viewport fallback still gets cropped to the ad block
+                        screenshot_processor.submit(local_path, None if clipped else ad.get("rect"))
+                    except Exception as e:
+                        print(f"[{profile_name}] [screenshot error] {keyword}: {e}")
 
                     ads_data.append({
+                        "ad_key": make_ad_key(keyword, link, domain),
                         "profile_name": profile_name,
                         "keyword": keyword,
                         "link": link,
                         "domain": domain,
                         "advertiser": advertiser,
-                        "screenshot_path": f"screenshots" if uploaded else local_path,
+                        "screenshot_path": local_path,
                         "timestamp": datetime.now()
                     })
 
                 if ads_data:
-                    try:
-                        collection.insert_many(ads_data)
-                    except Exception as e:
-                        print(f"[{profile_name}] [Mongo insert error]", e)
+                    # batched with other keywords/profiles; uploads start once the docs exist
+                    ad_writer.add(ads_data, on_written=submit_screenshot_uploads)
                     total_ads += len(ads_data)
-
-                time.sleep(random.uniform(5, 12))
+                    kw_ads = len(ads_data)
+                    kw_ad_keys = {d["ad_key"] for d in ads_data}
+                    CRAWL_ADS.inc(kw_ads)
+                    emit_event(
+                        redis_client, kw_run_id, "ads_found",
+                        profile=profile_name, keyword=keyword, count=kw_ads,
+                        domains=sorted({d["domain"] for d in ads_data}),
+                    )
 
             except Exception as e:
                 print(f"[{profile_name}] [Crawl Error] {keyword}: {e}")
+                record_error(e)
+                if "net::ERR" in str(e):
+                    network_errors += 1
+                emit_event(
+                    redis_client, kw_run_id, "error",
+                    profile=profile_name, keyword=keyword, error_type=type(e).__name__, error=str(e)[:500],
+                )
             finally:
                 processed_local += 1
-                if redis_client is not None and run_id is not None:
+                CRAWL_KEYWORDS.labels(kw_status).inc()
+                requeued = False
+                if keyword_queue is not None:
                     try:
-                        run_key = f"{REDIS_KEY_PREFIX}{run_id}"
-                        redis_client.hincrby(run_key, "processed_keywords", 1)
-                        tot = int(redis_client.hget(run_key, "total_keywords") or total_keywords)
-                        proc = int(redis_client.hget(run_key, "processed_keywords") or 0)
-                        percent = int(proc * 100 / max(1, tot))
-                        redis_client.hset(run_key, "progress", percent)
-                        redis_client.hset(run_key, "message", f"{profile_name}: processed {proc}/{tot}")
-                    except Exception:
-                        pass
-
-        try:
-            if driver:
-                driver.quit()
-        except:
-            pass
-
-        if all_uploaded and os.path.exists(ss_dir):
-            try:
-                shutil.rmtree(ss_dir)
-            except Exception:
-                pass
+                        # failures go back to the queue for a healthy profile, up to an attempt cap
+                        if kw_status == "ok":
+                            keyword_queue.done(kw)
+                        else:
+                            requeued = keyword_queue.retry(kw)
+                    except Exception as e:
+                        print(f"[{profile_name}] [Queue ack error] {keyword}: {e}")
+                emit_event(
+                    redis_client, kw_run_id, "keyword_finished",
+                    profile=profile_name, keyword=keyword, ads=kw_ads, bytes=kw_bytes, requeued=requeued,
+                )
+                if progress is not None and kw_run_id is not None and not requeued:
+                    progress.increment(kw_run_id, profile_name, total_keywords)
+                # the schedule is updated once per keyword when the run finishes, not per replica
+                results = schedule_results
+                if results is None and SCHEDULER_ENABLED and redis_client is not None and kw_run_id is not None:
+                    results = RunResults(kw_run_id, redis_client)
+                if results is not None and not requeued:
+                    try:
+                        results.add(keyword, kw_ad_keys)
+                    except Exception as e:
+                        print(f"[{profile_name}] [Schedule update error] {keyword}: {e}")
+
+            consecutive_failures = 0 if kw_status == "ok" else consecutive_failures + 1
+            if abort_reason is None and consecutive_failures >= CRAWL_MAX_CONSECUTIVE_FAILURES:
+                abort_reason = f"{consecutive_failures} consecutive failures"
+            if abort_reason is not None:
+                print(f"[{profile_name}] stopping: {abort_reason}")
+                break
+            # the host is over its browser budget: hand the rest of the queue to the profiles still running
+            if keyword_queue is not None and governor.should_yield():
+                yielded = True
+                print(f"[{profile_name}] yielding to the governor")
+                break
+
+        if driver:
+            # an aborted profile gets a fresh browser (and proxy) next time
+            driver_pool.checkin(profile_name, driver, healthy=abort_reason is None)
+            driver = None
+        proxy_ok = abort_reason is None and (processed_local == 0 or network_errors < processed_local)
 
         if redis_client is not None and run_id is not None:
             try:
@@ -415,16 +497,22 @@ def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
                 })
             except Exception:
                 pass
+        emit_event(
+            redis_client, run_id, "profile_done",
+            profile=profile_name, ads_collected=total_ads, keywords=processed_local, aborted=abort_reason,
+        )
+        if abort_reason is not None:
+            return {"status": "aborted", "reason": abort_reason, "ads_collected": total_ads,
+                    "keywords_processed": processed_local, "profile": profile_name}
 
-        return {"status": "done", "ads_collected": total_ads, "profile": profile_name}
+        return {"status": "yielded" if yielded else "done", "ads_collected": total_ads,
+                "keywords_processed": processed_local, "profile": profile_name}
 
     except Exception as e:
         print(f"[{profile.get('name','unknown')}] [crawl_ads_internal error]", e)
-        try:
-            if driver:
-                driver.quit()
-        except Exception:
-            pass
+        record_error(e)
+        if driver:
+            driver_pool.checkin(profile.get("name", "").strip(), driver, healthy=False)
 
         if redis_client is not None and run_id is not None:
             try:
@@ -436,29 +524,51 @@ def crawl_ads_internal(profile: dict, run_id: str = None, redis_client=None):
                 })
             except Exception:
                 pass
+        emit_event(redis_client, run_id, "error", profile=profile.get("name", ""), error_type=type(e).__name__, error=str(e)[:500])
 
         return {"status": "error", "error": str(e), "profile": profile.get("name", "")}
     finally:
-        try:
-            if client:
-                client.close()
-        except Exception:
-            pass
+        if proxy:
+            proxy_pool.release(proxy, proxy_ok)
+        if profile_lease is not None:
+            profile_lease.release()
+        if progress is not None:
+            progress.flush()
+        if profile and profile.get("_clone_root"):
+            try:
+                profile_cloner.release(profile.get("name", "").strip(), protected=driver_pool.profile_names())
+            except Exception as e:
+                print("[CLONE] release error", e)
 
-def crawl_multi_profiles(run_id: str, redis_client=None):
-    keywords = get_all_keywords() or []
-    total_keywords = len(keywords)
+def crawl_multi_profiles(run_id: str, redis_client=None, distribution: str = None, replicas: int = None, keywords: list = None):
+    if keywords is None:
+        keywords = get_all_keywords() or []
 
-    profiles = get_all_profiles()
-    valid_profiles = [
-        p for p in profiles
-        if os.path.exists(f"{PATH_PROFILE}/{p.get('name','').strip()}")
-    ]
+    valid_profiles = get_valid_profiles(PATH_PROFILE)
     if not valid_profiles:
+        if redis_client is not None and run_id is not None:
+            try:
+                redis_client.hset(f"{REDIS_KEY_PREFIX}{run_id}", mapping={
+                    "status": "error",
+                    "message": "Không có profile hợp lệ",
+                    "finish_ts": str(int(time.time()))
+                })
+            except Exception:
+                pass
+        emit_event(redis_client, run_id, "run_error", error="Không có profile hợp lệ")
         return {"status": "error", "error": "Không có profile hợp lệ"}
 
-    num_workers = min(MAX_THREADS, len(valid_profiles))
-    profiles_to_run = valid_profiles[:num_workers]
+    distribution = distribution or CRAWL_DISTRIBUTION
+    num_workers = min(governor.max_workers, len(valid_profiles))
+    if distribution == "shard":
+        # every valid profile takes part; the pool runs num_workers of them at a time
+        keyword_queue = KeywordQueue(keywords, replicas or KEYWORD_REPLICAS, max_profiles=len(valid_profiles))
+        profiles_to_run = valid_profiles
+        total_keywords = keyword_queue.total
+    else:
+        keyword_queue = None
+        profiles_to_run = valid_profiles[:num_workers]
+        total_keywords = len(keywords) * len(profiles_to_run)
 
     if redis_client is not None and run_id is not None:
         run_key = f"{REDIS_KEY_PREFIX}{run_id}"
@@ -477,18 +587,49 @@ def crawl_multi_profiles(run_id: str, redis_client=None):
             pass
 
     results = []
+    pending = list(profiles_to_run)
+    futures = {}
+    schedule_results = RunResults(run_id) if SCHEDULER_ENABLED else None
+
+    def run_profile(p):
+        try:
+            return crawl_ads_internal(p, run_id, redis_client, keyword_queue, keywords, schedule_results)
+        finally:
+            governor.leave()
+
     with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = {executor.submit(crawl_ads_internal, p, run_id, redis_client): p for p in profiles_to_run}
-        for future in as_completed(futures):
-            profile_obj = futures[future]
-            profile_name = profile_obj.get("name", "unknown")
-            try:
-                res = future.result()
-                print(f" {profile_obj} ")
-                results.append(res)
-            except Exception as e:
-                print(f"[MULTI] Profile {profile_name} exception: {e}")
-                results.append({"status": "error", "profile": profile_name, "error": str(e)})
+        while pending or futures:
+            # admit profiles while the host has headroom; the governor ramps one step per sample
+            # a run always keeps at least one profile going, whatever the host looks like
+            while pending and len(futures) < num_workers and governor.try_enter(force=not futures):
+                p = pending.pop(0)
+                if keyword_queue is not None and not keyword_queue.has_work_for(p.get("name", "").strip()):
+                    governor.leave()
+                    continue
+                futures[executor.submit(run_profile, p)] = p
+            if not futures:
+                break
+            done, _ = wait(futures, timeout=governor.sample_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                profile_obj = futures.pop(future)
+                profile_name = profile_obj.get("name", "unknown")
+                try:
+                    res = future.result()
+                    print(f" {profile_obj} ")
+                    results.append(res)
+                    # keywords another profile failed may have come back; a healthy profile takes them,
+                    # and a profile that yielded is readmitted once the governor has room again
+                    if (res.get("status") in ("done", "yielded") and keyword_queue is not None
+                            and keyword_queue.has_work_for(profile_name.strip())):
+                        pending.append(profile_obj)
+                except Exception as e:
+                    print(f"[MULTI] Profile {profile_name} exception: {e}")
+                    results.append({"status": "error", "profile": profile_name, "error": str(e)})
+
+    ad_writer.flush()
+    if schedule_results is not None:
+        # keywords no profile got through are released from their lease here
+        print("[MULTI] schedule", schedule_results.finish([(k.get("keyword") or "").strip() for k in keywords]))
 
     if redis_client is not None and run_id is not None:
         try:
@@ -501,11 +642,39 @@ def crawl_multi_profiles(run_id: str, redis_client=None):
             })
         except Exception:
             pass
+    emit_event(redis_client, run_id, "run_done", profiles=len(results), ads_collected=sum(r.get("ads_collected", 0) for r in results))
 
     return {"status": "done", "results": results}
 
 def crawl_multi_worker(app, run_id):
     redis_client = getattr(app.state, "redis", None)
+    lock = RunLock(redis_client, REDIS_KEY_LOCK, run_id, REDIS_TTL_LOCK) if redis_client is not None else None
+    # reject mode answered 409 up front; a run that loses the race in between fails fast too
+    wait = 0 if CRAWL_LOCK_MODE == "reject" else CRAWL_LOCK_WAIT
+    if lock is not None and not lock.acquire(wait=wait):
+        holder = lock.holder()
+        if CRAWL_LOCK_MODE == "reject":
+            status, message = "rejected", f"Crawl {holder} đang chạy"
+        else:
+            status, message = "error", "Timed out waiting for the running crawl"
+        print(f"[crawl_multi_worker] {run_id} not started: {message}")
+        try:
+            redis_client.hset(f"{REDIS_KEY_PREFIX}{run_id}", mapping={
+                "status": status,
+                "message": message,
+                "finish_ts": str(int(time.time()))
+            })
+        except Exception:
+            pass
+        # SSE clients only stop on a terminal event
+        emit_event(redis_client, run_id, "run_error", error=message)
+        return
+    if redis_client is not None:
+        try:
+            # only now is this the run the status endpoint should report
+            redis_client.set(REDIS_KEY_LATEST, run_id, ex=RUN_METADATA_TTL)
+        except Exception:
+            pass
     try:
         res = crawl_multi_profiles(run_id, redis_client)
         print("[crawl_multi_worker result]", res)
@@ -521,17 +690,55 @@ def crawl_multi_worker(app, run_id):
                 })
             except Exception:
                 pass
+            emit_event(redis_client, run_id, "run_error", error=str(e))
     finally:
-        try:
-            if redis_client is not None:
-                redis_client.delete(REDIS_KEY_LOCK)
-        except Exception as e:
-            print("[redis delete error]", e)
+        if lock is not None:
+            lock.release()
+
+def enqueue_crawl_run(run_id: str, redis_client, replicas: int = None, keywords: list = None) -> int:
+    if keywords is None:
+        keywords = get_all_keywords() or []
+    if SCHEDULER_ENABLED:
+        # whichever worker finishes the run records or releases these
+        RunResults(run_id, redis_client).track([(k.get("keyword") or "").strip() for k in keywords])
+    total_jobs = RedisJobQueue(redis_client).enqueue_run(run_id, keywords, replicas or KEYWORD_REPLICAS)
+    run_key = f"{REDIS_KEY_PREFIX}{run_id}"
+    redis_client.hset(run_key, mapping={
+        "status": "queued" if total_jobs else "done",
+        "total_keywords": str(total_jobs),
+        "processed_keywords": "0",
+        "progress": "0" if total_jobs else "100",
+        "message": f"Queued {total_jobs} jobs" if total_jobs else "Không có keyword nào"
+    })
+    redis_client.expire(run_key, RUN_METADATA_TTL)
+    return total_jobs
+
+def dispatch_scheduled_run(redis_client, keywords: list):
+    run_id = uuid.uuid4().hex
+    if CRAWL_EXECUTOR == "queue":
+        enqueue_crawl_run(run_id, redis_client, keywords=keywords)
+        if redis_client is not None:
+            redis_client.set(REDIS_KEY_LATEST, run_id, ex=RUN_METADATA_TTL)
+        return {"status": "queued", "run_id": run_id}
+    # local mode: the scheduler thread runs the crawl itself, so ticks never overlap;
+    # a manual run holding the lock just means this tick is skipped
+    lock = RunLock(redis_client, REDIS_KEY_LOCK, run_id, REDIS_TTL_LOCK) if redis_client is not None else None
+    if lock is not None and not lock.acquire():
+        print(f"[scheduler] skipped, crawl {lock.holder()} is running")
+        release_keywords([k["keyword"] for k in keywords])
+        return {"status": "skipped"}
+    try:
+        res = crawl_multi_profiles(run_id, redis_client, keywords=keywords)
+    finally:
+        if lock is not None:
+            lock.release()
+    print("[scheduler run result]", res)
+    return res
 
 # ---- API endpoints ----
 @router.post("/api/crawl")
-def api_start_crawl(request: Request, background_tasks: BackgroundTasks):
-    redis_client = getattr(request.app.state, "redis", None)
+async def api_start_crawl(request: Request):
+    redis_client = getattr(request.app.state, "aredis", None)
     if redis_client is None:
         return JSONResponse({"error": "Redis chưa cấu hình"}, status_code=500)
 
@@ -547,41 +754,107 @@ def api_start_crawl(request: Request, background_tasks: BackgroundTasks):
         "message": "Accepted"
     }
     try:
-        redis_client.hset(run_key, mapping=meta)
+        await redis_client.hset(run_key, mapping=meta)
         # redis_client.expire(run_key, RUN_METADATA_TTL)
-        redis_client.set(REDIS_KEY_LATEST, run_id, ex=RUN_METADATA_TTL)
+        if CRAWL_EXECUTOR == "queue":
+            # local runs become "latest" once they hold the crawl lock (crawl_multi_worker)
+            await redis_client.set(REDIS_KEY_LATEST, run_id, ex=RUN_METADATA_TTL)
     except Exception as e:
-        try:
-            redis_client.delete(REDIS_KEY_LOCK)
-        except Exception:
-            pass
         print("[redis hset error]", e)
         return JSONResponse({"error": "Redis error"}, status_code=500)
 
-    background_tasks.add_task(crawl_multi_worker, request.app, run_id)
-    return JSONResponse({"status": "accepted", "run_id": run_id}, status_code=202)
+    if CRAWL_EXECUTOR == "queue":
+        try:
+            total_jobs = await run_in_threadpool(enqueue_crawl_run, run_id, request.app.state.redis)
+        except Exception as e:
+            print("[redis enqueue error]", e)
+            return JSONResponse({"error": "Redis error"}, status_code=500)
+        return JSONResponse({"status": "queued", "run_id": run_id, "jobs": total_jobs}, status_code=202)
+
+    running = await redis_client.get(REDIS_KEY_LOCK)
+    if running:
+        if CRAWL_LOCK_MODE == "reject":
+            await redis_client.hset(run_key, mapping={"status": "rejected", "message": f"Crawl {running} đang chạy"})
+            return JSONResponse({"error": "Crawl đang chạy", "running_run_id": running}, status_code=409)
+        await redis_client.hset(run_key, mapping={"status": "waiting", "message": f"Waiting for crawl {running}"})
+
+    crawl_executor.submit(crawl_multi_worker, request.app, run_id)
+    return JSONResponse({"status": "waiting" if running else "accepted", "run_id": run_id}, status_code=202)
+
+@router.get("/api/crawl/driver_pool")
+def api_driver_pool_stats():
+    return driver_pool.stats()
+
+@router.get("/api/crawl/clones")
+def api_clone_stats():
+    return profile_cloner.stats()
+
+@router.get("/api/crawl/proxies")
+def api_proxy_stats():
+    return proxy_pool.stats()
+
+@router.get("/api/crawl/bandwidth")
+def api_bandwidth_stats():
+    return page_bytes_stats()
+
+@router.get("/api/crawl/uploads")
+def api_upload_stats():
+    stats = r2_uploader.stats()
+    stats["dedup"] = screenshot_dedup.stats()
+    stats["processing"] = screenshot_processor.stats()
+    return stats
+
+@router.get("/api/crawl/governor")
+async def api_governor_stats(request: Request):
+    stats = await run_in_threadpool(governor.stats)
+    redis_client = getattr(request.app.state, "aredis", None)
+    if redis_client is not None:
+        stats["lock_holder"] = await redis_client.get(REDIS_KEY_LOCK)
+    return stats
+
+@router.get("/api/crawl/cache")
+def api_cache_stats():
+    return {"keywords": keywords_cache.stats(), "profiles": profiles_cache.stats()}
+
+@router.get("/api/crawl/writer")
+def api_writer_stats():
+    return ad_writer.stats()
+
+@router.get("/api/crawl/{run_id}/events")
+async def api_crawl_events(run_id: str, request: Request, last_event_id: str = None):
+    redis_client = getattr(request.app.state, "aredis", None)
+    if redis_client is None:
+        return JSONResponse({"error": "Redis chưa cấu hình"}, status_code=500)
+
+    # browsers resend Last-Event-ID on reconnect; the query param lets curl/dashboards resume too
+    resume_from = request.headers.get("last-event-id") or last_event_id or "0"
+    return StreamingResponse(
+        stream_events(redis_client, run_id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/api/crawl_status")
-def api_crawl_status(request: Request):
-    redis_client = getattr(request.app.state, "redis", None)
+async def api_crawl_status(request: Request):
+    redis_client = getattr(request.app.state, "aredis", None)
     if redis_client is None:
         return JSONResponse({"status": "unknown", "error": "Redis not configured"}, status_code=500)
 
     try:
-        run_id = redis_client.get(REDIS_KEY_LATEST)
+        run_id = await redis_client.get(REDIS_KEY_LATEST)
     except Exception as e:
         print("[redis get latest error]", e)
         return JSONResponse({"status": "unknown", "error": "redis_error"}, status_code=500)
 
     if not run_id:
-        lock = redis_client.get(REDIS_KEY_LOCK)
+        lock = await redis_client.get(REDIS_KEY_LOCK)
         if lock:
             return {"status": "running", "message": "Running (no run_id available)"}
         return {"status": "idle"}
 
     run_key = f"{REDIS_KEY_PREFIX}{run_id}"
     try:
-        data = redis_client.hgetall(run_key) or {}
+        data = await redis_client.hgetall(run_key) or {}
     except Exception as e:
         print("[redis hgetall error]", e)
         return JSONResponse({"status": "unknown", "error": "redis_error"}, status_code=500)
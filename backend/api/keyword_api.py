@@ -1,12 +1,31 @@
-from fastapi import APIRouter, HTTPException
+import codecs
+import csv
+import io
+import json
+from typing import Optional
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from bson import ObjectId
-from models.mongo_client import get_mongo_client
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from models.mongo_client import get_async_db
+from models.versioned_cache import bump_version_async
 
 router = APIRouter()
-client = get_mongo_client()
-db = client["test"]
-keyword_collection = db["keywords"]
+
+DUPLICATE_KEY = 11000
+
+def normalize_keyword(value) -> str:
+    # create, update and import all store the same form, so the unique index dedupes across them
+    return " ".join(str(value or "").split())
+
+def keyword_collection():
+    return get_async_db()["keywords"]
+
+async def keywords_changed(request: Request):
+    await bump_version_async(getattr(request.app.state, "aredis", None), "keywords")
 
 class KeywordRequest(BaseModel):
     keyword: str
@@ -19,51 +38,213 @@ class DeleteKeywordRequest(BaseModel):
     keyword_id: str
 
 @router.get("/")
-def list_keywords():
-    keywords = list(keyword_collection.find({}, {"_id": 1, "keyword": 1}))
+async def list_keywords():
+    keywords = await keyword_collection().find({}, {"_id": 1, "keyword": 1}).to_list(None)
     for kw in keywords:
         kw["_id"] = str(kw["_id"])
     return keywords
 
 @router.post("/create")
-def create_keyword(data: KeywordRequest):
-    keyword = data.keyword.strip()
+async def create_keyword(data: KeywordRequest, request: Request):
+    keyword = normalize_keyword(data.keyword)
     if not keyword:
         raise HTTPException(status_code=400, detail="Keyword không được để trống")
 
-    if keyword_collection.find_one({"keyword": keyword}):
+    if await keyword_collection().find_one({"keyword": keyword}):
         raise HTTPException(status_code=409, detail="Keyword đã tồn tại")
 
-    keyword_collection.insert_one({"keyword": keyword})
+    try:
+        await keyword_collection().insert_one({"keyword": keyword})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Keyword đã tồn tại")
+    await keywords_changed(request)
     return {"message": "Thêm từ khoá thành công", "keyword": keyword}
 
 @router.put("/update")
-def update_keyword(data: UpdateKeywordRequest):
+async def update_keyword(data: UpdateKeywordRequest, request: Request):
     keyword_id = data.keyword_id
-    new_keyword = data.new_keyword.strip()
+    new_keyword = normalize_keyword(data.new_keyword)
 
     if not new_keyword:
         raise HTTPException(status_code=400, detail="Từ khoá mới không được để trống")
 
-    if keyword_collection.find_one({"keyword": new_keyword}):
+    if await keyword_collection().find_one({"keyword": new_keyword}):
         raise HTTPException(status_code=409, detail="Từ khoá mới đã tồn tại")
 
-    result = keyword_collection.update_one(
-        {"_id": ObjectId(keyword_id)},
-        {"$set": {"keyword": new_keyword}}
-    )
+    try:
+        result = await keyword_collection().update_one(
+            {"_id": ObjectId(keyword_id)},
+            {"$set": {"keyword": new_keyword}}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Từ khoá mới đã tồn tại")
 
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Không tìm thấy từ khoá hoặc không có gì thay đổi")
 
+    await keywords_changed(request)
     return {"message": "Đã cập nhật từ khoá thành công", "new_keyword": new_keyword}
 
 @router.post("/delete")
-def delete_keyword(data: DeleteKeywordRequest):
+async def delete_keyword(data: DeleteKeywordRequest, request: Request):
     keyword_id = data.keyword_id
 
-    result = keyword_collection.delete_one({"_id": ObjectId(keyword_id)})
+    result = await keyword_collection().delete_one({"_id": ObjectId(keyword_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Không tìm thấy từ khoá")
 
+    await keywords_changed(request)
     return {"message": "Đã xoá từ khoá thành công"}
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+def parse_active(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+async def iter_upload_lines(file: UploadFile, chunk_size: int = 64 * 1024):
+    # decode incrementally so a large upload is never held in memory as one string
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_import_rows(file: UploadFile, fmt: str):
+    # yields (row number, raw keyword, active or None, parse error or None)
+    header = None
+    row = 0
+    async for line in iter_upload_lines(file):
+        if not line.strip():
+            continue
+        row += 1
+        if fmt == "ndjson":
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                yield row, None, None, f"JSON không hợp lệ: {e}"
+                continue
+            if isinstance(obj, str):
+                yield row, obj, None, None
+            elif isinstance(obj, dict):
+                yield row, obj.get("keyword"), parse_active(obj.get("active")), None
+            else:
+                yield row, None, None, "Dòng phải là object hoặc string"
+            continue
+
+        cells = next(csv.reader([line]))
+        if header is None:
+            lowered = [c.strip().lower() for c in cells]
+            if lowered[0] == "keyword":
+                header = lowered
+                row -= 1
+                continue
+            # no header row: columns are positional and this line is already data
+            header = ["keyword", "active"]
+        values = dict(zip(header, cells))
+        yield row, values.get("keyword"), parse_active(values.get("active")), None
+
+async def upsert_keyword_batch(batch: list, results: list):
+    ops = []
+    for item in batch:
+        update = {"$setOnInsert": {"keyword": item["keyword"]}}
+        if item["active"] is not None:
+            update["$set"] = {"active": item["active"]}
+        else:
+            update["$setOnInsert"]["active"] = True
+        ops.append(UpdateOne({"keyword": item["keyword"]}, update, upsert=True))
+
+    upserted = {}
+    failed = {}
+    try:
+        res = await keyword_collection().bulk_write(ops, ordered=False)
+        upserted = res.upserted_ids
+    except BulkWriteError as e:
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        for err in e.details.get("writeErrors", []):
+            # a concurrent upsert inserting the same keyword first: it exists now
+            if err.get("code") != DUPLICATE_KEY:
+                failed[err["index"]] = err.get("errmsg", "write error")
+
+    for i, item in enumerate(batch):
+        if i in failed:
+            results.append({"row": item["row"], "keyword": item["keyword"], "status": "error", "error": failed[i]})
+        elif i in upserted:
+            results.append({"row": item["row"], "keyword": item["keyword"], "status": "inserted", "id": str(upserted[i])})
+        else:
+            results.append({"row": item["row"], "keyword": item["keyword"], "status": "existing"})
+
+@router.post("/import")
+async def import_keywords(request: Request, file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")):
+    name = (file.filename or "").lower()
+    fmt = format or ("ndjson" if name.endswith((".ndjson", ".jsonl", ".json")) else "csv")
+
+    results = []
+    seen = {}
+    batch = []
+    async for row, raw, active, error in iter_import_rows(file, fmt):
+        keyword = normalize_keyword(raw) if error is None else ""
+        if error or not keyword:
+            results.append({"row": row, "keyword": raw, "status": "invalid", "error": error or "Keyword trống"})
+            continue
+        if keyword in seen:
+            results.append({"row": row, "keyword": keyword, "status": "duplicate", "first_row": seen[keyword]})
+            continue
+        seen[keyword] = row
+        batch.append({"row": row, "keyword": keyword, "active": active})
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await upsert_keyword_batch(batch, results)
+            batch = []
+    if batch:
+        await upsert_keyword_batch(batch, results)
+    if seen:
+        await keywords_changed(request)
+
+    results.sort(key=lambda r: r["row"])
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return {"message": "Đã nhập từ khoá", "format": fmt, "total": len(results), "summary": summary, "rows": results}
+
+async def export_rows(fmt: str):
+    cursor = keyword_collection().find({}, {"keyword": 1, "active": 1}).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    if fmt == "csv":
+        yield "keyword,active\r\n"
+    out = io.StringIO()
+    writer = csv.writer(out)
+    count = 0
+    async for doc in cursor:
+        active = doc.get("active", True) is not False
+        if fmt == "csv":
+            writer.writerow([doc.get("keyword", ""), "true" if active else "false"])
+        else:
+            out.write(json.dumps({"id": str(doc["_id"]), "keyword": doc.get("keyword", ""), "active": active}, ensure_ascii=False) + "\n")
+        count += 1
+        # flush once per cursor batch instead of once per document
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+@router.get("/export")
+async def export_keywords(format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="keywords.{format}"'},
+    )
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 from bson import ObjectId
-from models.mongo_client import get_mongo_client
+from models.mongo_client import get_async_db
+from models.versioned_cache import bump_version_async
 
 router = APIRouter()
-client = get_mongo_client()
-db = client["test"]
-profile_collection = db["profiles"]
+
+def profile_collection():
+    return get_async_db()["profiles"]
+
+async def profiles_changed(request: Request):
+    await bump_version_async(getattr(request.app.state, "aredis", None), "profiles")
 
 class ProfileRequest(BaseModel):
     name: str
@@ -21,32 +25,33 @@ class DeleteProfileRequest(BaseModel):
     profile_id: str
 
 @router.get("/")
-def get_profiles():
-    profiles = list(profile_collection.find())
+async def get_profiles():
+    profiles = await profile_collection().find().to_list(None)
     for p in profiles:
         p["_id"] = str(p["_id"])
     return profiles
 
 @router.post("/create")
-def create_profile(data: ProfileRequest):
-    if profile_collection.find_one({"name": data.name}):
+async def create_profile(data: ProfileRequest, request: Request):
+    if await profile_collection().find_one({"name": data.name}):
         raise HTTPException(status_code=409, detail="Profile đã tồn tại")
 
-    profile_collection.insert_one(data.dict())
+    await profile_collection().insert_one(data.dict())
+    await profiles_changed(request)
     return {"message": "Đã thêm profiles thành công", "name": data.name}
 
 @router.put("/update")
-def update_profile(data: UpdateProfileRequest):
+async def update_profile(data: UpdateProfileRequest, request: Request):
     try:
         profile_id = data.profile_id
         new_data = data.updated_data
 
         if "name" in new_data:
-            existing = profile_collection.find_one({"name": new_data["name"]})
+            existing = await profile_collection().find_one({"name": new_data["name"]})
             if existing and str(existing["_id"]) != profile_id:
                 raise HTTPException(status_code=409, detail="Tên profiles đã tồn tại")
 
-        result = profile_collection.update_one(
+        result = await profile_collection().update_one(
             {"_id": ObjectId(profile_id)},
             {"$set": new_data}
         )
@@ -54,17 +59,19 @@ def update_profile(data: UpdateProfileRequest):
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Không tìm thấy hoặc không có gì thay đổi")
 
+        await profiles_changed(request)
         return {"message": "Cập nhật profiles thành công"}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/delete")
-def delete_profile(profile_id: str = Query(...)):
+async def delete_profile(request: Request, profile_id: str = Query(...)):
     try:
-        result = profile_collection.delete_one({"_id": ObjectId(profile_id)})
+        result = await profile_collection().delete_one({"_id": ObjectId(profile_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Không tìm thấy profiles")
+        await profiles_changed(request)
         return {"message": "Xoá profiles thành công"}
 
     except Exception as e:
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
-from models.mongo_client import get_mongo_client
-from passlib.hash import bcrypt
-from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from models.mongo_client import get_async_db
+from services.auth import (
+    SESSION_TTL, bearer_token, create_session, current_user, delete_session, hash_password, verify_password,
+)
 
 router = APIRouter()
-client = get_mongo_client()
-db = client["test"]
-users_collection = db["users"]
+
+def users_collection():
+    return get_async_db()["users"]
 
 class RegisterRequest(BaseModel):
     username: str
@@ -18,22 +20,45 @@ class LoginRequest(BaseModel):
     password: str
 
 @router.post("/register")
-def register_user(data: RegisterRequest):
-    if users_collection.find_one({"username": data.username}):
+async def register_user(data: RegisterRequest):
+    if await users_collection().find_one({"username": data.username}, {"_id": 1}):
         raise HTTPException(status_code=409, detail="Username đã tồn tại")
 
-    hashed_password = bcrypt.hash(data.password)
-    users_collection.insert_one({
-        "username": data.username,
-        "password": hashed_password
-    })
+    hashed_password = await hash_password(data.password)
+    try:
+        await users_collection().insert_one({
+            "username": data.username,
+            "password": hashed_password
+        })
+    except DuplicateKeyError:
+        # lost a race with a concurrent register; the unique index decides
+        raise HTTPException(status_code=409, detail="Username đã tồn tại")
 
     return {"message": "Đăng ký thành công"}
 
 @router.post("/login")
-def login_user(data: LoginRequest):
-    user = users_collection.find_one({"username": data.username})
-    if not user or not bcrypt.verify(data.password, user["password"]):
+async def login_user(data: LoginRequest, request: Request):
+    user = await users_collection().find_one({"username": data.username})
+    if not user or not await verify_password(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Sai tài khoản hoặc mật khẩu")
 
-    return {"message": "Đăng nhập thành công", "user_id": str(user["_id"])}
+    redis_client = getattr(request.app.state, "aredis", None)
+    if redis_client is None:
+        raise HTTPException(status_code=500, detail="Redis chưa cấu hình")
+    token = await create_session(redis_client, user)
+
+    return {
+        "message": "Đăng nhập thành công",
+        "user_id": str(user["_id"]),
+        "token": token,
+        "expires_in": SESSION_TTL,
+    }
+
+@router.post("/logout")
+async def logout_user(request: Request, session: dict = Depends(current_user)):
+    await delete_session(request.app.state.aredis, bearer_token(request))
+    return {"message": "Đã đăng xuất"}
+
+@router.get("/me")
+async def get_me(session: dict = Depends(current_user)):
+    return {"user_id": session["user_id"], "username": session["username"]}
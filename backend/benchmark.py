@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+import psutil
+
+# Offline crawl benchmark: `python -m benchmark --keywords 40 --profiles 2`
+# Everything the crawler talks to is served locally so runs are comparable across commits.
+# The default in-memory stores need the dev requirements: `pip install -r requirements-dev.txt`.
+
+
+def serp_html(query: str, ads: int) -> str:
+    q = html.escape(query)
+    seed = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    blocks = []
+    for i in range(ads):
+        shop = f"shop{int(seed[i * 2:i * 2 + 4], 16) % 500}.example.com"
+        landing = quote(f"https://{shop}/p/{seed[:8]}?gclid={uuid.uuid4().hex}", safe="")
+        blocks.append(
+            f'<div data-text-ad="1" style="height:110px;border:1px solid #ddd;margin:8px 0">'
+            f'<span>Sponsored</span>'
+            f'<a href="https://www.google.com/aclk?sa=l&adurl={landing}"><h3>{q} at {shop}</h3></a>'
+            f'<span data-dtld="{shop}">{shop}</span>'
+            f'<div>Fast delivery on {q}. Best prices, free returns.</div></div>'
+        )
+    organic = "".join(
+        f'<div class="g" style="height:90px"><a href="https://site{i}.example.org/"><h3>{q} result {i}</h3></a></div>'
+        for i in range(10)
+    )
+    return (
+        f"<!doctype html><html><head><title>{q} - Google Search</title></head><body>"
+        f'<div id="center_col"><div id="tads">{"".join(blocks)}</div>'
+        f'<div id="search"><div id="rso">{organic}</div></div></div></body></html>'
+    )
+
+
+class FakeSerpHandler(BaseHTTPRequestHandler):
+    # also answers absolute-form requests, so the stub proxy can point browsers back at it
+    protocol_version = "HTTP/1.1"
+    ads_per_page = 3
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self._send(404, b"not found", "text/plain")
+            return
+        query = parse_qs(url.query).get("q", [""])[0]
+        time.sleep(self.latency)
+        self._send(200, serp_html(query, self.ads_per_page).encode("utf-8"), "text/html; charset=utf-8")
+
+    def do_CONNECT(self):
+        self._send(405, b"", "text/plain")
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    objects = {}
+    lock = threading.Lock()
+
+    def do_PUT(self):
+        body = self._read_body()
+        time.sleep(self.latency)
+        with self.lock:
+            self.objects[self.path] = len(body)
+        self.send_response(200)
+        self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        with self.lock:
+            found = self.path in self.objects
+        self.send_response(200 if found else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            # aws-chunked payloads with trailing checksums; sizes are all we keep
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def log_message(self, *args):
+        pass
+
+
+class StubProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    upstream = ("127.0.0.1", 0)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps({
+            "ip": self.upstream[0],
+            "port": str(self.upstream[1]),
+            "username": "bench",
+            "password": "bench",
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"bench-{handler.__name__}", daemon=True).start()
+    return server
+
+
+class RssSampler:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="bench-rss", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            # this process plus every chromedriver/Chrome it spawned
+            total = 0
+            for proc in [me] + me.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            self.peak_bytes = max(self.peak_bytes, total)
+            self._stop.wait(self.interval)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def missing_memory_backends(args) -> list:
+    missing = []
+    if args.mongo == "memory":
+        try:
+            import mongomock  # noqa: F401
+        except ImportError:
+            missing.append("mongomock")
+    if args.redis == "memory":
+        try:
+            import fakeredis  # noqa: F401
+            import lupa  # noqa: F401  (RunLock and progress reporting run Lua)
+        except ImportError:
+            missing.append("fakeredis[lua]")
+    return missing
+
+
+def memory_mongo_client():
+    import mongomock
+    from types import SimpleNamespace
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        # mongomock's bulk builder predates pymongo's UpdateOne(sort=...); apply ops one by one
+        upserted = {}
+        for i, op in enumerate(requests):
+            res = self.update_one(op._filter, op._doc, upsert=op._upsert)
+            if res.upserted_id is not None:
+                upserted[i] = res.upserted_id
+        return SimpleNamespace(upserted_ids=upserted)
+
+    # process-wide on purpose: the benchmark is its own process and every collection needs it
+    mongomock.collection.Collection.bulk_write = bulk_write
+    return mongomock.MongoClient()
+
+
+def configure_environment(args, workdir: str, serp, s3, proxy_api):
+    env = {
+        "SERP_BASE_URL": f"http://127.0.0.1:{serp.server_port}",
+        "API_PROXY_URL": f"http://127.0.0.1:{proxy_api.server_port}/proxy" if args.proxy else "",
+        "R2_ACCESS_KEY_ID": "bench",
+        "R2_SECRET_ACCESS_KEY": "bench",
+        "R2_BUCKET_NAME": "bench",
+        "R2_ENDPOINT_URL": f"http://127.0.0.1:{s3.server_port}",
+        "PATH_PROFILE": os.path.join(workdir, "profiles"),
+        "PATH_PROFILE_CLONE": os.path.join(workdir, "clones"),
+        "PROFILE_REQUESTS_PER_MINUTE": str(args.rpm),
+        "PACING_JITTER": "0",
+        "PROXY_REFRESH_INTERVAL": "0.2",
+        "PROXY_ACQUIRE_WAIT": "5" if args.proxy else "0",
+        "CHROME_HEADLESS": "0" if args.headed else "1",
+        "CRAWL_DISTRIBUTION": args.distribution,
+        "SERP_ARCHIVE_ENABLED": "0",
+        "SCHEDULER_ENABLED": "0",
+        "MONGO_URI": args.mongo if args.mongo != "memory" else "mongodb://unused",
+        "REDIS_URL": args.redis if args.redis != "memory" else "",
+    }
+    if args.threads:
+        env["THREAD_MAX"] = str(args.threads)
+    if args.chrome_version:
+        env["CHROME_VERSION_MAIN"] = str(args.chrome_version)
+    # set before any app module is imported: they read their config at import time
+    os.environ.update(env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline crawl throughput benchmark")
+    parser.add_argument("--keywords", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=2)
+    parser.add_argument("--ads", type=int, default=3, help="ads on every fake SERP")
+    parser.add_argument("--serp-latency", type=float, default=0.2, help="seconds per SERP response")
+    parser.add_argument("--s3-latency", type=float, default=0.05, help="seconds per object PUT")
+    parser.add_argument("--proxy-latency", type=float, default=0.05, help="seconds per proxy API call")
+    parser.add_argument("--no-proxy", dest="proxy", action="store_false", help="skip the stub proxy API")
+    parser.add_argument("--rpm", type=float, default=600, help="per-profile request budget")
+    parser.add_argument("--threads", type=int, help="THREAD_MAX override")
+    parser.add_argument("--distribution", choices=["shard", "full"], default="shard")
+    parser.add_argument("--mongo", default="memory", help="'memory' (mongomock) or a MongoDB URI")
+    parser.add_argument("--redis", default="memory", help="'memory' (fakeredis) or a Redis URL")
+    parser.add_argument("--chrome-version", type=int, help="CHROME_VERSION_MAIN override")
+    parser.add_argument("--headed", action="store_true")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    missing = missing_memory_backends(args)
+    if missing:
+        parser.error(
+            f"in-memory stores need {', '.join(missing)}: pip install -r requirements-dev.txt, "
+            "or point --mongo/--redis at real servers"
+        )
+
+    workdir = tempfile.mkdtemp(prefix="crawl-bench-")
+    FakeSerpHandler.ads_per_page = args.ads
+    FakeSerpHandler.latency = args.serp_latency
+    FakeS3Handler.latency = args.s3_latency
+    StubProxyHandler.latency = args.proxy_latency
+    serp = serve(FakeSerpHandler)
+    s3 = serve(FakeS3Handler)
+    StubProxyHandler.upstream = ("127.0.0.1", serp.server_port)
+    proxy_api = serve(StubProxyHandler)
+    configure_environment(args, workdir, serp, s3, proxy_api)
+
+    if args.mongo == "memory":
+        import models.mongo_client
+        models.mongo_client._client = memory_mongo_client()
+    if args.redis == "memory":
+        import fakeredis
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    else:
+        import redis
+        redis_client = redis.from_url(args.redis, decode_responses=True)
+
+    from models.mongo_client import get_mongo_client
+    from api.crawlAds_api import crawl_multi_profiles
+    from services.ad_writer import ad_writer
+    from services.driver_pool import driver_pool
+    from services.metrics import add_stage_listener
+    from services.r2_uploader import r2_uploader
+    from services.screenshot_processing import screenshot_processor
+
+    db = get_mongo_client()["test"]
+    bench_tag = uuid.uuid4().hex[:8]
+    keywords = [f"bench {bench_tag} keyword {i}" for i in range(args.keywords)]
+    profiles = [f"bench-{bench_tag}-{i}" for i in range(args.profiles)]
+    db["keywords"].insert_many([{"keyword": k, "active": True} for k in keywords])
+    db["profiles"].insert_many([{"name": p, "device_type": "laptop"} for p in profiles])
+    for p in profiles:
+        os.makedirs(os.path.join(workdir, "profiles", p), exist_ok=True)
+
+    samples = defaultdict(list)
+    samples_lock = threading.Lock()
+
+    def on_stage(stage, elapsed):
+        with samples_lock:
+            samples[stage].append(elapsed)
+
+    add_stage_listener(on_stage)
+    rss = RssSampler().start()
+    print(f"[BENCH] {args.keywords} keywords x {args.profiles} profiles, {args.ads} ads/page, workdir {workdir}")
+
+    started = time.time()
+    try:
+        res = crawl_multi_profiles(uuid.uuid4().hex, redis_client)
+        crawl_seconds = time.time() - started
+        ad_writer.flush()
+        screenshot_processor.close()
+        r2_uploader.wait_idle(timeout=120)
+        total_seconds = time.time() - started
+    finally:
+        driver_pool.close_all()
+        rss.stop()
+        if args.mongo != "memory":
+            db["keywords"].delete_many({"keyword": {"$in": keywords}})
+            db["profiles"].delete_many({"name": {"$in": profiles}})
+        for server in (serp, s3, proxy_api):
+            server.shutdown()
+
+    results = res.get("results", [])
+    keywords_done = sum(r.get("keywords_processed", 0) for r in results)
+    ads = sum(r.get("ads_collected", 0) for r in results)
+    report = {
+        "status": res.get("status"),
+        "crawl_seconds": round(crawl_seconds, 2),
+        "total_seconds": round(total_seconds, 2),
+        "keywords": keywords_done,
+        "keywords_per_min": round(keywords_done / crawl_seconds * 60, 2) if crawl_seconds else 0,
+        "ads": ads,
+        "ads_per_sec": round(ads / crawl_seconds, 3) if crawl_seconds else 0,
+        "ads_stored": db["ads"].count_documents({"keyword": {"$in": keywords}}),
+        "objects_uploaded": len(FakeS3Handler.objects),
+        "peak_rss_mb": round(rss.peak_bytes / 2**20, 1),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+            }
+            for stage, values in sorted(samples.items())
+        },
+    }
+
+    print(f"\nstatus            {report['status']}")
+    print(f"keywords          {keywords_done} in {crawl_seconds:.1f}s ({report['keywords_per_min']}/min)")
+    print(f"ads               {ads} ({report['ads_per_sec']}/s), {report['ads_stored']} stored, {report['objects_uploaded']} uploaded")
+    print(f"peak RSS          {report['peak_rss_mb']} MB")
+    print(f"\n{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<16}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+
+import redis
+from dotenv import load_dotenv
+
+from api.crawlAds_api import crawl_ads_internal, dispatch_scheduled_run, PATH_PROFILE, MAX_THREADS
+from models.profile_model import get_valid_profiles
+from services.driver_pool import driver_pool
+from services.proxy_pool import proxy_pool
+from services.r2_uploader import r2_uploader
+from services.ad_writer import ad_writer
+from services.screenshot_processing import screenshot_processor
+from services.governor import governor
+from services.metrics import ACTIVE_BROWSERS, METRICS_PORT, POOLED_BROWSERS, QUEUE_DEPTH, start_metrics_server
+from services.scheduler import SCHEDULER_ENABLED, AdaptiveScheduler, finish_run_results
+from services.job_queue import RedisJobQueue, RedisKeywordSource, JOB_VISIBILITY_TIMEOUT
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 2))
+
+stop_event = threading.Event()
+
+
+def local_profiles():
+    return get_valid_profiles(PATH_PROFILE)
+
+
+def profile_loop(slot: int, profiles: list, redis_client, job_queue: RedisJobQueue):
+    source = RedisKeywordSource(job_queue, stop_event)
+    i = 0
+    while not stop_event.is_set():
+        profile = dict(profiles[i % len(profiles)])
+        i += 1
+        profile_name = profile.get("name", "").strip()
+        if not source.has_work_for(profile_name):
+            stop_event.wait(WORKER_POLL_INTERVAL)
+            continue
+        # slots beyond what the host can currently take park here
+        if not governor.enter(stop_event):
+            break
+        try:
+            print(f"[WORKER {slot}] {profile_name} picking up jobs")
+            res = crawl_ads_internal(profile, None, redis_client, source)
+        finally:
+            governor.leave()
+        print(f"[WORKER {slot}] {res}")
+        if res.get("status") == "busy":
+            stop_event.wait(WORKER_POLL_INTERVAL)
+
+
+def reaper_loop(job_queue: RedisJobQueue, interval: float):
+    while not stop_event.is_set():
+        try:
+            job_queue.requeue_expired()
+        except Exception as e:
+            print("[WORKER reaper error]", e)
+        stop_event.wait(interval)
+
+
+def heartbeat_loop(job_queue: RedisJobQueue, interval: float, done: threading.Event):
+    # a keyword can outlive the visibility timeout (slow proxy, long ad wait); keep it ours,
+    # including while the slots finish their current keyword on shutdown
+    while not done.wait(interval):
+        try:
+            job_queue.touch_held()
+        except Exception as e:
+            print("[WORKER heartbeat error]", e)
+
+
+def metrics_loop(job_queue: RedisJobQueue, interval: float):
+    # gauges are sampled; counters and histograms are updated by the crawl threads directly
+    while not stop_event.is_set():
+        try:
+            ACTIVE_BROWSERS.set(governor.active)
+            POOLED_BROWSERS.set(driver_pool.stats()["size"])
+            QUEUE_DEPTH.labels("r2_upload").set(r2_uploader.stats()["queue_depth"])
+            QUEUE_DEPTH.labels("ad_writer").set(ad_writer.stats()["pending"])
+            QUEUE_DEPTH.labels("jobs_pending").set(job_queue.pending_count())
+            QUEUE_DEPTH.labels("jobs_in_flight").set(job_queue.in_flight_count())
+        except Exception as e:
+            print("[WORKER metrics error]", e)
+        stop_event.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl worker pulling keyword jobs from Redis")
+    parser.add_argument("--threads", type=int, default=MAX_THREADS)
+    parser.add_argument("--visibility-timeout", type=int, default=JOB_VISIBILITY_TIMEOUT)
+    parser.add_argument("--scheduler", action="store_true", help="also run the adaptive scheduler (enqueues due keywords)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Prometheus port for this worker, 0 to disable")
+    args = parser.parse_args()
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+    redis_client.ping()
+    job_queue = RedisJobQueue(
+        redis_client, visibility_timeout=args.visibility_timeout,
+        on_run_done=finish_run_results if SCHEDULER_ENABLED else None,
+    )
+
+    profiles = local_profiles()
+    if not profiles:
+        print(f"[WORKER {worker_id}] Không có profile hợp lệ")
+        return
+
+    # prefetch starts now so the first profiles don't fall back to crawling without a proxy
+    proxy_pool.start()
+    if start_metrics_server(args.metrics_port):
+        threading.Thread(target=metrics_loop, args=(job_queue, 5), daemon=True).start()
+    num_workers = max(1, min(args.threads, len(profiles)))
+    print(f"[WORKER {worker_id}] started with {num_workers} threads, {len(profiles)} profiles")
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+
+    slots_done = threading.Event()
+    threading.Thread(
+        target=heartbeat_loop, args=(job_queue, max(1, args.visibility_timeout / 3), slots_done), daemon=True
+    ).start()
+    threads = [threading.Thread(target=reaper_loop, args=(job_queue, max(5, args.visibility_timeout / 4)), daemon=True)]
+    for slot in range(num_workers):
+        # each slot owns a disjoint slice so one profile never runs twice at once
+        threads.append(threading.Thread(
+            target=profile_loop,
+            args=(slot, profiles[slot::num_workers], redis_client, job_queue),
+            daemon=True,
+        ))
+    for t in threads:
+        t.start()
+    if args.scheduler:
+        AdaptiveScheduler(redis_client, lambda keywords: dispatch_scheduled_run(redis_client, keywords)).start()
+
+    while not stop_event.is_set():
+        time.sleep(1)
+    print(f"[WORKER {worker_id}] stopping, waiting for current keywords")
+    for t in threads[1:]:
+        t.join()
+    slots_done.set()
+    driver_pool.close_all()
+    print(f"[WORKER {worker_id}] driver pool", driver_pool.stats())
+    ad_writer.close()
+    screenshot_processor.close()
+    r2_uploader.wait_idle(timeout=60)
+    print(f"[WORKER {worker_id}] uploads", r2_uploader.stats())
+
+
+if __name__ == "__main__":
+    main()
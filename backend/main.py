@@ -1,6 +1,11 @@
 import os
+import time
+from contextlib import asynccontextmanager
+
 import redis
-from fastapi import FastAPI
+import redis.asyncio as aioredis
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -10,22 +15,27 @@ from api.user_api import router as user_router
 from api.profile_api import router as profile_router
 from api.keyword_api import router as keyword_router
 from api.crawlAds_api import router as crawl_router
+from services.driver_pool import driver_pool
+from services.r2_uploader import r2_uploader
+from services.ad_writer import ad_writer
+from services.screenshot_processing import screenshot_processor
+from models.mongo_client import close_mongo_client, open_async_mongo_client, close_async_mongo_client
+from models.ads_model import ensure_ad_indexes
+from models.user_model import ensure_user_indexes
+from models.keyword_model import ensure_keyword_indexes
+from services.auth import shutdown_hash_pool
+from services.serp_archive import SERP_ARCHIVE_ENABLED, ensure_archive_indexes
+from services.proxy_pool import proxy_pool
+from services.scheduler import SCHEDULER_ENABLED, AdaptiveScheduler
+from api.crawlAds_api import crawl_executor, dispatch_scheduled_run
+from services.governor import governor
+from services.job_queue import RedisJobQueue
+from services.metrics import ACTIVE_BROWSERS, HTTP_REQUEST_SECONDS, POOLED_BROWSERS, QUEUE_DEPTH, render_metrics
 
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL")
 
-app = FastAPI(title="My Crawler API")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("startup")
 def startup():
     try:
         app.state.redis = redis.from_url(REDIS_URL, decode_responses=True)
@@ -33,8 +43,29 @@ def startup():
         print("[startup] redis connected")
     except Exception as e:
         print("[startup] redis connect failed:", e)
+    proxy_pool.start()
+    if SCHEDULER_ENABLED:
+        redis_client = getattr(app.state, "redis", None)
+        app.state.scheduler = AdaptiveScheduler(
+            redis_client, lambda keywords: dispatch_scheduled_run(redis_client, keywords)
+        ).start()
+    try:
+        ensure_ad_indexes()
+        if SERP_ARCHIVE_ENABLED:
+            ensure_archive_indexes()
+        print("[startup] ads indexes ready")
+    except Exception as e:
+        print("[startup] ads index error:", e)
+    try:
+        ensure_user_indexes()
+    except Exception as e:
+        # existing duplicate usernames have to be cleaned up by hand first
+        print("[startup] users index error:", e)
+    try:
+        ensure_keyword_indexes()
+    except Exception as e:
+        print("[startup] keywords index error:", e)
 
-@app.on_event("shutdown")
 def shutdown():
     try:
         client = getattr(app.state, "redis", None)
@@ -43,6 +74,56 @@ def shutdown():
             print("[shutdown] redis closed")
     except Exception as e:
         print("[shutdown] redis close error:", e)
+    crawl_executor.shutdown(wait=False, cancel_futures=True)
+    driver_pool.close_all()
+    print("[shutdown] driver pool closed", driver_pool.stats())
+    ad_writer.close()
+    screenshot_processor.close()
+    r2_uploader.wait_idle(timeout=30)
+    print("[shutdown] uploads", r2_uploader.stats())
+    shutdown_hash_pool()
+    close_mongo_client()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # async clients serve the request path; the sync ones stay with the crawl threads
+    open_async_mongo_client()
+    app.state.aredis = aioredis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+    await run_in_threadpool(startup)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(shutdown)
+        if app.state.aredis is not None:
+            await app.state.aredis.aclose()
+        close_async_mongo_client()
+
+app = FastAPI(title="My Crawler API", lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.middleware("http")
+async def observe_http_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by router tag, not raw path, so ids in URLs don't explode cardinality
+        route = request.scope.get("route")
+        if route is None:
+            router = "unmatched"
+        else:
+            router = route.tags[0] if getattr(route, "tags", None) else route.path
+        HTTP_REQUEST_SECONDS.labels(router, request.method, str(status)).observe(time.perf_counter() - started)
 
 # mount routers
 app.include_router(ads_router, prefix="/api/ads", tags=["Ads"])
@@ -50,8 +131,25 @@ app.include_router(user_router, prefix="/api/user", tags=["User"])
 app.include_router(profile_router, prefix="/api/profiles", tags=["Profiles"])
 app.include_router(keyword_router, prefix="/api/keywords", tags=["Keywords"])
 
-app.include_router(crawl_router)
+app.include_router(crawl_router, tags=["Crawl"])
 
 @app.get("/")
 def root():
     return {"ok": True, "msg": "API running"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    ACTIVE_BROWSERS.set(governor.active)
+    POOLED_BROWSERS.set(driver_pool.stats()["size"])
+    QUEUE_DEPTH.labels("r2_upload").set(r2_uploader.stats()["queue_depth"])
+    QUEUE_DEPTH.labels("ad_writer").set(ad_writer.stats()["pending"])
+    redis_client = getattr(app.state, "redis", None)
+    if redis_client is not None:
+        try:
+            job_queue = RedisJobQueue(redis_client)
+            QUEUE_DEPTH.labels("jobs_pending").set(job_queue.pending_count())
+            QUEUE_DEPTH.labels("jobs_in_flight").set(job_queue.in_flight_count())
+        except Exception as e:
+            print("[metrics] redis error", e)
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,8 +1,27 @@
-from mongo_client import get_mongo_client
+from models.mongo_client import get_mongo_client
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 client = get_mongo_client()
 db = client["test"]
 ads_collection = db["ads"]
 
 def get_all_keywords():
-    return list(ads_collection.find())
\ No newline at end of file
+    return list(ads_collection.find())
+
+def ensure_ad_indexes():
+    # keyset pagination sorts on (timestamp, _id); each filter gets its own prefix
+    page_order = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+    ads_collection.create_indexes([
+        IndexModel(page_order, name="ts_id"),
+        # legacy docs have no ad_key, so uniqueness only applies where it exists
+        IndexModel(
+            [("ad_key", ASCENDING)],
+            name="ad_key_unique",
+            unique=True,
+            partialFilterExpression={"ad_key": {"$exists": True}},
+        ),
+        IndexModel([("keyword", ASCENDING)] + page_order, name="keyword_ts_id"),
+        IndexModel([("domain", ASCENDING)] + page_order, name="domain_ts_id"),
+        IndexModel([("advertiser", ASCENDING)] + page_order, name="advertiser_ts_id"),
+        IndexModel([("profile_name", ASCENDING)] + page_order, name="profile_ts_id"),
+    ])
@@ -1,5 +1,7 @@
 from models.mongo_client import get_mongo_client
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from models.versioned_cache import VersionedCache
 
 client = get_mongo_client()
 db = client["test"]
@@ -12,6 +14,43 @@ def serialize_keyword(doc):
         "active": doc.get("active", True)
     }
 
+def ensure_keyword_indexes():
+    # bulk import upserts on keyword; the unique index is what makes that race-free
+    keywords_collection.create_indexes([
+        IndexModel([("keyword", ASCENDING)], name="keyword_unique", unique=True),
+    ])
+
+def load_all_keywords():
+    docs = keywords_collection.find({}, {"keyword": 1, "active": 1})
+    return [serialize_keyword(doc) for doc in docs]
+
+keywords_cache = VersionedCache("keywords", load_all_keywords)
+
 def get_all_keywords():
-    docs = keywords_collection.find()
+    return keywords_cache.get()
+
+def get_due_keywords(now):
+    query = {
+        "active": {"$ne": False},
+        "$or": [{"next_due": {"$lte": now}}, {"next_due": {"$exists": False}}],
+    }
+    docs = list(keywords_collection.find(query, {"keyword": 1, "active": 1, "priority": 1, "next_due": 1}))
+    # never-scheduled keywords first, then by priority, then most overdue
+    docs.sort(key=lambda d: (
+        "next_due" in d,
+        -(d.get("priority") or 0),
+        d.get("next_due") or now,
+    ))
     return [serialize_keyword(doc) for doc in docs]
+
+def get_keyword_schedule(keyword):
+    return keywords_collection.find_one(
+        {"keyword": keyword},
+        {"crawl_interval": 1, "priority": 1, "ads_signature": 1, "next_due": 1}
+    )
+
+def update_keyword_schedule(keyword, fields: dict):
+    keywords_collection.update_one({"keyword": keyword}, {"$set": fields})
+
+def postpone_keywords(keywords: list, until):
+    keywords_collection.update_many({"keyword": {"$in": keywords}}, {"$set": {"next_due": until}})
@@ -1,11 +1,71 @@
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 2))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", 5 * 60 * 1000))
+
+_client = None
+_client_lock = threading.Lock()
+
 def get_mongo_client():
-    mongo_uri = os.getenv("MONGO_URI")
-    if not mongo_uri:
-        raise Exception("MONGO_URI không tồn tại trong môi trường")
-    return MongoClient(mongo_uri)
+    # MongoClient is thread-safe and pools connections itself; every module shares one
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                mongo_uri = os.getenv("MONGO_URI")
+                if not mongo_uri:
+                    raise Exception("MONGO_URI không tồn tại trong môi trường")
+                _client = MongoClient(
+                    mongo_uri,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                    retryWrites=True,
+                    retryReads=True,
+                    connect=False,
+                )
+    return _client
+
+def close_mongo_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+_async_client = None
+
+def open_async_mongo_client():
+    # Motor binds to the running event loop, so this is called from the app lifespan
+    global _async_client
+    if _async_client is None:
+        mongo_uri = os.getenv("MONGO_URI")
+        if not mongo_uri:
+            raise Exception("MONGO_URI không tồn tại trong môi trường")
+        _async_client = AsyncIOMotorClient(
+            mongo_uri,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+            retryWrites=True,
+            retryReads=True,
+        )
+    return _async_client
+
+def get_async_db():
+    if _async_client is None:
+        raise Exception("Async Mongo client chưa khởi tạo")
+    return _async_client["test"]
+
+def close_async_mongo_client():
+    global _async_client
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
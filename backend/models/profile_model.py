@@ -1,10 +1,18 @@
+import os
+import threading
+import time
+
 from models.mongo_client import get_mongo_client
+from models.versioned_cache import VersionedCache, bump_version
 from datetime import datetime
 
 client = get_mongo_client()
 db = client["test"]
 profiles_collection = db["profiles"]
 
+# profile dirs can be copied in without any DB write, so existence is re-checked on a timer
+PROFILE_PATH_CHECK_TTL = float(os.getenv("PROFILE_PATH_CHECK_TTL", 60))
+
 def save_profile_to_db(profile_name, user_data_dir, profile_directory):
 
     existing = profiles_collection.find_one({"profile_name": profile_name})
@@ -18,9 +26,33 @@ def save_profile_to_db(profile_name, user_data_dir, profile_directory):
         "profile_directory": profile_directory,
         "created_at": datetime.now()
     })
+    bump_version("profiles")
     print(f"✅ Đã lưu profile '{profile_name}' vào MongoDB.")
 def get_profile_by_name(name):
     return profiles_collection.find_one({"name": name})
 
+def load_all_profiles():
+    return list(profiles_collection.find())
+
+profiles_cache = VersionedCache("profiles", load_all_profiles)
+
 def get_all_profiles():
-    return list(profiles_collection.find())
\ No newline at end of file
+    return profiles_cache.get()
+
+_path_checks = {}
+_path_checks_lock = threading.Lock()
+
+def profile_dir_exists(root: str, name: str) -> bool:
+    path = f"{root}/{name}"
+    now = time.time()
+    with _path_checks_lock:
+        hit = _path_checks.get(path)
+    if hit is not None and now - hit[1] < PROFILE_PATH_CHECK_TTL:
+        return hit[0]
+    exists = os.path.exists(path)
+    with _path_checks_lock:
+        _path_checks[path] = (exists, now)
+    return exists
+
+def get_valid_profiles(root: str) -> list:
+    return [p for p in get_all_profiles() if profile_dir_exists(root, p.get("name", "").strip())]
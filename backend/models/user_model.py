@@ -0,0 +1,12 @@
+from models.mongo_client import get_mongo_client
+from pymongo import ASCENDING, IndexModel
+
+client = get_mongo_client()
+db = client["test"]
+users_collection = db["users"]
+
+def ensure_user_indexes():
+    # login looks users up by name; uniqueness also closes the register race
+    users_collection.create_indexes([
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ])
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY_CACHE_VERSION = os.getenv("REDIS_KEY_CACHE_VERSION", "cache:version:")
+# without Redis there is no way to hear about writes, so fall back to a short TTL
+CACHE_FALLBACK_TTL = float(os.getenv("CACHE_FALLBACK_TTL", 30))
+
+_redis = None
+_redis_failed = False
+
+
+def _client():
+    global _redis, _redis_failed
+    if _redis is None and not _redis_failed and REDIS_URL:
+        try:
+            _redis = redis.from_url(REDIS_URL, decode_responses=True)
+        except Exception as e:
+            print("[CACHE] redis unavailable, TTL only", e)
+            _redis_failed = True
+    return _redis
+
+
+def version_key(name: str) -> str:
+    return f"{REDIS_KEY_CACHE_VERSION}{name}"
+
+
+def bump_version(name: str):
+    client = _client()
+    if client is not None:
+        try:
+            client.incr(version_key(name))
+        except Exception as e:
+            print(f"[CACHE] bump {name} failed", e)
+
+
+async def bump_version_async(redis_client, name: str):
+    # called from the API after create/update/delete; every process reloads on its next read
+    if redis_client is not None:
+        try:
+            await redis_client.incr(version_key(name))
+        except Exception as e:
+            print(f"[CACHE] bump {name} failed", e)
+
+
+class VersionedCache:
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._stats = {"hits": 0, "loads": 0}
+
+    def current_version(self):
+        client = _client()
+        if client is None:
+            return None
+        try:
+            return client.get(version_key(self.name)) or "0"
+        except Exception as e:
+            print(f"[CACHE] version check {self.name} failed", e)
+            return None
+
+    def get(self) -> list:
+        version = self.current_version()
+        with self._lock:
+            fresh = self._data is not None and (
+                version == self._version if version is not None
+                else time.time() - self._loaded_at < CACHE_FALLBACK_TTL
+            )
+            if fresh:
+                self._stats["hits"] += 1
+                data = self._data
+            else:
+                data = self._data = self.loader()
+                self._version = version
+                self._loaded_at = time.time()
+                self._stats["loads"] += 1
+        # callers annotate the dicts they get (profiles do); never hand out the cached ones
+        return [dict(d) for d in data]
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["version"] = self._version
+            stats["size"] = len(self._data) if self._data is not None else 0
+        return stats
@@ -0,0 +1,96 @@
+import argparse
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from services.serp_archive import archive_collection, load_page
+from services.serp_extract import extract_ads_from_html, extract_real_link_and_domain, make_ad_key
+
+load_dotenv()
+
+
+def extract_entry(entry: dict) -> tuple:
+    # runs in a worker process: decompress + parse is all CPU, so it scales with cores
+    try:
+        html = load_page(entry["digest"])
+    except Exception as e:
+        return entry["_id"], [], f"load error: {e}"
+    docs = []
+    for ad in extract_ads_from_html(html):
+        if not ad.get("href"):
+            continue
+        link, domain = extract_real_link_and_domain(ad["href"])
+        if not (link and domain):
+            continue
+        docs.append({
+            "ad_key": make_ad_key(entry["keyword"], link, domain),
+            "profile_name": entry.get("profile_name"),
+            "keyword": entry["keyword"],
+            "link": link,
+            "domain": domain,
+            "advertiser": ad.get("advertiser") or domain,
+            "screenshot_path": "",
+            "timestamp": entry["timestamp"],
+        })
+    return entry["_id"], docs, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run ad extraction over archived SERPs")
+    parser.add_argument("--run-id", action="append", help="limit to these runs (repeatable)")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--all", action="store_true", help="include pages where the live crawl already found ads")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--write", action="store_true", help="upsert recovered ads (default: dry run)")
+    args = parser.parse_args()
+
+    query = {}
+    if args.run_id:
+        query["run_id"] = {"$in": args.run_id}
+    if args.since or args.until:
+        query["timestamp"] = {k: v for k, v in (("$gte", args.since), ("$lte", args.until)) if v}
+    if not args.all:
+        # pages the live extractor got nothing from are the ones a parser fix can recover
+        query["ads"] = 0
+    query["reextracted_at"] = {"$exists": False}
+
+    entries = list(archive_collection().find(
+        query, {"digest": 1, "keyword": 1, "profile_name": 1, "timestamp": 1}
+    ))
+    print(f"[REEXTRACT] {len(entries)} archived pages, {args.workers} workers")
+    if not entries:
+        return
+
+    writer = None
+    if args.write:
+        from services.ad_writer import AdWriter
+        writer = AdWriter(replay=True)
+
+    totals = Counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for entry_id, docs, error in pool.map(extract_entry, entries, chunksize=16):
+            totals["pages"] += 1
+            if error:
+                totals["errors"] += 1
+                print(f"[REEXTRACT] {entry_id}: {error}")
+                continue
+            totals["ads"] += len(docs)
+            if writer is not None:
+                writer.add(docs)
+                archive_collection().update_one(
+                    {"_id": entry_id},
+                    {"$set": {"reextracted_at": datetime.now(), "reextracted_ads": len(docs)}}
+                )
+
+    if writer is not None:
+        writer.close()
+        print("[REEXTRACT] writer", writer.stats())
+    print(f"[REEXTRACT] done: {dict(totals)}{'' if args.write else ' (dry run)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from models.mongo_client import get_mongo_client
+from services.metrics import observe_stage
+
+load_dotenv()
+
+AD_WRITER_BATCH_SIZE = int(os.getenv("AD_WRITER_BATCH_SIZE", 200))
+AD_WRITER_FLUSH_INTERVAL = float(os.getenv("AD_WRITER_FLUSH_INTERVAL", 2))
+AD_WRITER_RETRIES = int(os.getenv("AD_WRITER_RETRIES", 5))
+
+DUPLICATE_KEY = 11000
+
+
+class AdWriter:
+    def __init__(self, collection=None, batch_size: int = AD_WRITER_BATCH_SIZE,
+                 flush_interval: float = AD_WRITER_FLUSH_INTERVAL, retries: int = AD_WRITER_RETRIES,
+                 replay: bool = False):
+        # replay: docs re-extracted from archived pages, whose sightings may already be counted
+        self._collection = collection
+        self.replay = replay
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._callbacks = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {"buffered": 0, "written": 0, "failed": 0, "flushes": 0, "retries": 0}
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = get_mongo_client()["test"]["ads"]
+        return self._collection
+
+    def add(self, docs: list, on_written=None):
+        if not docs:
+            return
+        self._ensure_started()
+        with self._lock:
+            self._buffer.extend(docs)
+            if on_written:
+                self._callbacks.append((on_written, docs))
+            self._stats["buffered"] += len(docs)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                docs, self._buffer = self._buffer, []
+                callbacks, self._callbacks = self._callbacks, []
+            if not docs:
+                return 0
+            written = self._write(docs)
+            for cb, cb_docs in callbacks:
+                try:
+                    cb(cb_docs)
+                except Exception as e:
+                    print("[AdWriter callback error]", e)
+            return written
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._buffer)
+        return stats
+
+    @staticmethod
+    def _upserts(docs: list, replay: bool = False) -> list:
+        # one op per ad identity, however many times it was seen in this batch
+        grouped = {}
+        for doc in docs:
+            g = grouped.setdefault(doc["ad_key"], {"doc": doc, "count": 0, "profiles": [],
+                                                   "first": doc["timestamp"], "last": doc["timestamp"]})
+            g["doc"] = doc
+            g["count"] += 1
+            g["first"] = min(g["first"], doc["timestamp"])
+            g["last"] = max(g["last"], doc["timestamp"])
+            if doc.get("profile_name") not in g["profiles"]:
+                g["profiles"].append(doc.get("profile_name"))
+
+        ops = []
+        for key, g in grouped.items():
+            doc = g["doc"]
+            update = {
+                "$setOnInsert": {
+                    "keyword": doc["keyword"],
+                    "link": doc["link"],
+                    "domain": doc["domain"],
+                    "screenshot_path": doc.get("screenshot_path", ""),
+                    "screenshot_uploaded": False,
+                },
+                "$set": {
+                    "advertiser": doc.get("advertiser", ""),
+                    "profile_name": doc.get("profile_name"),
+                },
+                # concurrent profiles and batched flushes land out of order; $max/$min never move back
+                "$max": {"last_seen": g["last"], "timestamp": g["last"]},
+                "$min": {"first_seen": g["first"]},
+                "$inc": {"seen_count": g["count"]},
+                "$addToSet": {"profiles": {"$each": g["profiles"]}},
+            }
+            if replay:
+                # only fill in what the live crawl missed: no recount, and live fields win
+                update["$setOnInsert"].update(update.pop("$set"))
+                update["$setOnInsert"]["seen_count"] = g["count"]
+                del update["$inc"]
+            ops.append(UpdateOne({"ad_key": key}, update, upsert=True))
+        return ops
+
+    def _write(self, docs: list) -> int:
+        ops = self._upserts(docs, self.replay)
+        for attempt in range(self.retries):
+            try:
+                # unordered: one bad op does not stop the rest of the batch
+                with observe_stage("mongo_insert"):
+                    self.collection.bulk_write(ops, ordered=False)
+                self._count(written=len(docs))
+                return len(docs)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                # two writers upserting the same new ad race on the unique index;
+                # the loser simply retries as an update
+                dup = [ops[err["index"]] for err in errors if err.get("code") == DUPLICATE_KEY]
+                real = [err for err in errors if err.get("code") != DUPLICATE_KEY]
+                if real:
+                    print(f"[AdWriter] {len(real)} ops rejected: {real[0].get('errmsg')}")
+                    self._count(failed=len(real))
+                if not dup:
+                    self._count(written=len(docs) - len(real))
+                    return len(docs) - len(real)
+                ops = dup
+            except ConnectionFailure as e:
+                self._count(retries=1)
+                print(f"[AdWriter] transient error (attempt {attempt + 1}): {e}")
+                time.sleep(min(30, 0.5 * (2 ** attempt)))
+            except Exception as e:
+                print("[AdWriter] insert error", e)
+                break
+        self._count(failed=len(docs))
+        return 0
+
+    def _count(self, written: int = 0, failed: int = 0, retries: int = 0):
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["failed"] += failed
+            self._stats["retries"] += retries
+            if written or failed:
+                self._stats["flushes"] += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="ad-writer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("[AdWriter] flush error", e)
+
+
+ad_writer = AdWriter()
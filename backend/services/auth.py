@@ -0,0 +1,122 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from passlib.hash import bcrypt
+
+load_dotenv()
+
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# logins beyond this wait instead of piling work onto the pool
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", AUTH_HASH_WORKERS * 4))
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL = int(os.getenv("SESSION_TTL", 7 * 24 * 60 * 60))
+REDIS_KEY_SESSION = os.getenv("REDIS_KEY_SESSION", "session:")
+
+if not SESSION_SECRET:
+    print("[AUTH] SESSION_SECRET not set, sessions will not survive a restart")
+    SESSION_SECRET = secrets.token_urlsafe(32)
+
+_serializer = URLSafeTimedSerializer(SESSION_SECRET, salt="session")
+_pool = None
+_pending = None
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.verify(password, hashed)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the API process has crawl/uploader threads that may hold locks
+        _pool = ProcessPoolExecutor(max_workers=AUTH_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _run_hash(fn, *args):
+    # bcrypt is CPU-bound and holds the GIL long enough to hurt; run it in another process
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(AUTH_HASH_MAX_PENDING)
+    async with _pending:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run_hash(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await _run_hash(_verify, password, hashed)
+    except ValueError:
+        return False
+
+
+def shutdown_hash_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def create_session(redis_client, user: dict) -> str:
+    session_id = secrets.token_urlsafe(24)
+    session = {"user_id": str(user["_id"]), "username": user["username"], "created_at": int(time.time())}
+    await redis_client.set(f"{REDIS_KEY_SESSION}{session_id}", json.dumps(session), ex=SESSION_TTL)
+    return _serializer.dumps(session_id)
+
+
+def _session_id(token: str):
+    # the signature check rejects forged/garbled tokens without a Redis round-trip
+    try:
+        return _serializer.loads(token, max_age=SESSION_TTL)
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+async def get_session(redis_client, token: str):
+    session_id = _session_id(token)
+    if not session_id:
+        return None
+    key = f"{REDIS_KEY_SESSION}{session_id}"
+    raw = await redis_client.get(key)
+    if not raw:
+        return None
+    return json.loads(raw)
+
+
+async def delete_session(redis_client, token: str):
+    session_id = _session_id(token)
+    if session_id:
+        await redis_client.delete(f"{REDIS_KEY_SESSION}{session_id}")
+
+
+def bearer_token(request: Request):
+    header = request.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+async def current_user(request: Request) -> dict:
+    redis_client = getattr(request.app.state, "aredis", None)
+    token = bearer_token(request)
+    if redis_client is None or not token:
+        raise HTTPException(status_code=401, detail="Chưa đăng nhập")
+    session = await get_session(redis_client, token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Phiên đăng nhập không hợp lệ hoặc đã hết hạn")
+    return session
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_KEY_EVENTS = os.getenv("REDIS_KEY_EVENTS", "crawl:events:")
+CRAWL_EVENTS_MAXLEN = int(os.getenv("CRAWL_EVENTS_MAXLEN", 5000))
+RUN_METADATA_TTL = int(os.getenv("RUN_METADATA_TTL", 60 * 60 * 24))
+
+TERMINAL_EVENTS = {"run_done", "run_error"}
+
+
+def events_key(run_id: str) -> str:
+    return f"{REDIS_KEY_EVENTS}{run_id}"
+
+
+def emit_event(redis_client, run_id: str, event_type: str, **data):
+    if redis_client is None or run_id is None:
+        return
+    try:
+        data["ts"] = time.time()
+        key = events_key(run_id)
+        pipe = redis_client.pipeline(transaction=False)
+        # approximate trimming keeps XADD O(1)
+        pipe.xadd(key, {"type": event_type, "data": json.dumps(data, default=str)},
+                  maxlen=CRAWL_EVENTS_MAXLEN, approximate=True)
+        pipe.expire(key, RUN_METADATA_TTL)
+        pipe.execute()
+    except Exception as e:
+        print("[event emit error]", e)
+
+
+def format_sse(event_id: str, fields: dict) -> str:
+    return f"id: {event_id}\nevent: {fields.get('type', 'message')}\ndata: {fields.get('data', '{}')}\n\n"
+
+
+def _id_tuple(event_id: str):
+    ms, _, seq = str(event_id).partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return 0, 0
+
+
+async def _already_finished(redis_client, key: str, last_id: str) -> bool:
+    # a client resuming after run_done/run_error would otherwise get pings forever
+    last = await redis_client.xrevrange(key, count=1)
+    if not last:
+        return False
+    event_id, fields = last[0]
+    return fields.get("type") in TERMINAL_EVENTS and _id_tuple(event_id) <= _id_tuple(last_id)
+
+
+async def stream_events(redis_client, run_id: str, last_event_id: str = "0", block_ms: int = 15000):
+    # redis_client is a redis.asyncio client: a blocked XREAD must not pin a worker thread
+    key = events_key(run_id)
+    last_id = last_event_id or "0"
+    yield "retry: 3000\n\n"
+    if await _already_finished(redis_client, key, last_id):
+        return
+    while True:
+        res = await redis_client.xread({key: last_id}, count=100, block=block_ms)
+        if not res:
+            # a stream we have read from that is gone has expired with its run
+            if last_id != "0" and not await redis_client.exists(key):
+                return
+            # comment line keeps proxies from closing the connection and detects gone clients
+            yield ": ping\n\n"
+            continue
+        for _, entries in res:
+            for event_id, fields in entries:
+                last_id = event_id
+                yield format_sse(event_id, fields)
+                if fields.get("type") in TERMINAL_EVENTS:
+                    return
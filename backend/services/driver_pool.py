@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from services.metrics import observe_stage
+
+load_dotenv()
+
+DRIVER_POOL_ENABLED = os.getenv("DRIVER_POOL_ENABLED", "1") == "1"
+DRIVER_IDLE_TIMEOUT = int(os.getenv("DRIVER_IDLE_TIMEOUT", 10 * 60))
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", 50))
+DRIVER_POOL_MAX_SIZE = int(os.getenv("DRIVER_POOL_MAX_SIZE", 4))
+
+
+class DriverPool:
+    def __init__(self, enabled: bool = DRIVER_POOL_ENABLED, idle_timeout: int = DRIVER_IDLE_TIMEOUT,
+                 max_uses: int = DRIVER_MAX_USES, max_size: int = DRIVER_POOL_MAX_SIZE):
+        self.enabled = enabled
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._janitor = None
+        self._stats = {
+            "launches": 0,
+            "reuses": 0,
+            "evictions": 0,
+            "proxy_relaunches": 0,
+            "launch_seconds_total": 0.0,
+        }
+
+    def checkout(self, profile_name: str, launch, launch_key=None):
+        # launch_key identifies what the browser was started with (its proxy); Chrome cannot
+        # switch proxy after launch, so a different key is a miss and the driver is relaunched
+        self._start_janitor()
+        self.evict_idle()
+        with self._lock:
+            entry = self._entries.get(profile_name)
+            if entry and entry["in_use"]:
+                raise Exception(f"Profile {profile_name} đang được sử dụng")
+            if entry:
+                entry["in_use"] = True
+
+        if entry:
+            if entry["launch_key"] != launch_key:
+                print(f"[POOL] Proxy changed for {profile_name}, relaunching")
+                with self._lock:
+                    self._stats["proxy_relaunches"] += 1
+            elif entry["uses"] < self.max_uses and self._is_healthy(entry["driver"]):
+                with self._lock:
+                    self._stats["reuses"] += 1
+                print(f"[POOL] Reuse driver for {profile_name} (use {entry['uses'] + 1})")
+                return entry["driver"], True
+            self._evict(profile_name, entry)
+
+        self._make_room()
+        started = time.time()
+        with observe_stage("driver_launch"):
+            driver = launch()
+        elapsed = time.time() - started
+        with self._lock:
+            self._stats["launches"] += 1
+            self._stats["launch_seconds_total"] += elapsed
+            if self.enabled:
+                self._entries[profile_name] = {
+                    "driver": driver,
+                    "launch_key": launch_key,
+                    "uses": 0,
+                    "in_use": True,
+                    "last_used": time.time(),
+                }
+        print(f"[POOL] Launched driver for {profile_name} in {elapsed:.1f}s")
+        return driver, False
+
+    def checkin(self, profile_name: str, driver, healthy: bool = True):
+        with self._lock:
+            entry = self._entries.get(profile_name)
+            if entry is not None and entry["driver"] is not driver:
+                entry = None
+            if entry is not None:
+                entry["uses"] += 1
+                entry["last_used"] = time.time()
+                entry["in_use"] = False
+                keep = healthy and entry["uses"] < self.max_uses
+            else:
+                keep = False
+        if entry is not None and keep:
+            return
+        if entry is not None:
+            self._evict(profile_name, entry)
+        else:
+            self._quit(driver)
+
+    def rebind(self, driver, user_agent: str = None) -> bool:
+        # only the user agent can change on a live browser; the proxy is fixed by checkout()
+        if not user_agent:
+            return False
+        try:
+            driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+            return True
+        except Exception as e:
+            print("[POOL] user agent override error", e)
+            return False
+
+    def launch_key(self, profile_name: str):
+        with self._lock:
+            entry = self._entries.get(profile_name)
+            return entry["launch_key"] if entry else None
+
+    def evict_idle(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                (name, e) for name, e in self._entries.items()
+                if not e["in_use"] and now - e["last_used"] > self.idle_timeout
+            ]
+        for name, entry in expired:
+            print(f"[POOL] Idle timeout for {name}")
+            self._evict(name, entry)
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.items())
+        for name, entry in entries:
+            self._evict(name, entry)
+
+    def profile_names(self) -> set:
+        with self._lock:
+            return set(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["in_use"] = sum(1 for e in self._entries.values() if e["in_use"])
+        avg_launch = stats["launch_seconds_total"] / stats["launches"] if stats["launches"] else 0.0
+        stats["avg_launch_seconds"] = round(avg_launch, 2)
+        stats["launch_seconds_saved"] = round(avg_launch * stats["reuses"], 2)
+        stats["launch_seconds_total"] = round(stats["launch_seconds_total"], 2)
+        return stats
+
+    def _start_janitor(self):
+        # idle browsers must be reaped even when no further run comes in
+        if not self.enabled or self._janitor is not None:
+            return
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._janitor_loop, daemon=True)
+        self._janitor.start()
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(max(5, min(60, self.idle_timeout / 2)))
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print("[POOL] janitor error", e)
+
+    def _make_room(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            idle = sorted(
+                ((name, e) for name, e in self._entries.items() if not e["in_use"]),
+                key=lambda item: item[1]["last_used"],
+            )
+            overflow = len(self._entries) - self.max_size + 1
+            victims = idle[:max(0, overflow)]
+        for name, entry in victims:
+            print(f"[POOL] Evict LRU driver {name}")
+            self._evict(name, entry)
+
+    def _evict(self, profile_name: str, entry: dict):
+        with self._lock:
+            if self._entries.get(profile_name) is entry:
+                del self._entries[profile_name]
+                self._stats["evictions"] += 1
+        self._quit(entry["driver"])
+
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1 and bool(driver.window_handles)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            if driver:
+                driver.quit()
+        except Exception:
+            pass
+
+
+driver_pool = DriverPool()
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+
+import psutil
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GOVERNOR_MIN_WORKERS = int(os.getenv("GOVERNOR_MIN_WORKERS", 1))
+GOVERNOR_MAX_WORKERS = int(os.getenv("THREAD_MAX", os.cpu_count() or 2))
+# memory kept free for the OS, Mongo/Redis clients and the API itself
+GOVERNOR_MEM_RESERVE_MB = int(os.getenv("GOVERNOR_MEM_RESERVE_MB", 1024))
+# assumed Chrome footprint until one has actually been measured
+GOVERNOR_CHROME_RSS_MB = int(os.getenv("GOVERNOR_CHROME_RSS_MB", 600))
+GOVERNOR_LOAD_HIGH = float(os.getenv("GOVERNOR_LOAD_HIGH", 0.9))
+GOVERNOR_LOAD_LOW = float(os.getenv("GOVERNOR_LOAD_LOW", 0.6))
+GOVERNOR_SAMPLE_INTERVAL = float(os.getenv("GOVERNOR_SAMPLE_INTERVAL", 5))
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class RunLock:
+    def __init__(self, redis_client, key: str, owner: str, ttl: int):
+        self.redis = redis_client
+        self.key = key
+        self.owner = owner
+        self.ttl = ttl
+        self._release = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        self._renew = redis_client.register_script(RENEW_LOCK_SCRIPT)
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self, wait: float = 0, poll: float = 2) -> bool:
+        deadline = time.time() + wait
+        while True:
+            if self.redis.set(self.key, self.owner, nx=True, ex=self.ttl):
+                self._heartbeat = threading.Thread(target=self._renew_loop, name=f"lock-{self.owner}", daemon=True)
+                self._heartbeat.start()
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(poll)
+
+    def holder(self):
+        return self.redis.get(self.key)
+
+    def release(self):
+        self._stop.set()
+        try:
+            self._release(keys=[self.key], args=[self.owner])
+        except Exception as e:
+            print("[LOCK] release error", e)
+
+    def _renew_loop(self):
+        # short TTL + heartbeat: a crashed API frees the lock within one TTL
+        while not self._stop.wait(max(1, self.ttl / 3)):
+            try:
+                if not self._renew(keys=[self.key], args=[self.owner, self.ttl]):
+                    print(f"[LOCK] lost {self.key}")
+                    return
+            except Exception as e:
+                print("[LOCK] renew error", e)
+
+
+class ConcurrencyGovernor:
+    def __init__(self, min_workers: int = GOVERNOR_MIN_WORKERS, max_workers: int = GOVERNOR_MAX_WORKERS,
+                 mem_reserve_mb: int = GOVERNOR_MEM_RESERVE_MB, chrome_rss_mb: int = GOVERNOR_CHROME_RSS_MB,
+                 load_high: float = GOVERNOR_LOAD_HIGH, load_low: float = GOVERNOR_LOAD_LOW,
+                 sample_interval: float = GOVERNOR_SAMPLE_INTERVAL):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.mem_reserve_mb = mem_reserve_mb
+        self.chrome_rss_mb = chrome_rss_mb
+        self.load_high = load_high
+        self.load_low = load_low
+        self.sample_interval = sample_interval
+        self.active = 0
+        self._lock = threading.Lock()
+        self._sample = None
+        self._sampled_at = 0.0
+        self._last_target = self.min_workers
+        self._planned_for = None
+        self._yielding = set()
+
+    def sample(self) -> dict:
+        now = time.time()
+        if self._sample is not None and now - self._sampled_at < self.sample_interval:
+            return self._sample
+
+        mem = psutil.virtual_memory()
+        try:
+            load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+        except OSError:
+            load_per_cpu = psutil.cpu_percent(interval=None) / 100
+
+        chrome_rss = 0
+        browsers = 0
+        try:
+            for proc in psutil.Process().children(recursive=True):
+                try:
+                    if "chrom" not in proc.name().lower() or proc.name().lower().startswith("chromedriver"):
+                        continue
+                    chrome_rss += proc.memory_info().rss
+                    # renderers/GPU/utility processes are children of the browser process
+                    parent = proc.parent()
+                    if parent is None or "chrom" not in parent.name().lower() or parent.name().lower().startswith("chromedriver"):
+                        browsers += 1
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+        except psutil.Error as e:
+            print("[GOVERNOR] process scan error", e)
+
+        per_chrome_mb = chrome_rss / browsers / 2**20 if browsers else self.chrome_rss_mb
+        self._sample = {
+            "available_mb": round(mem.available / 2**20),
+            "load_per_cpu": round(load_per_cpu, 2),
+            "chrome_browsers": browsers,
+            "chrome_rss_mb": round(chrome_rss / 2**20),
+            "per_chrome_mb": round(per_chrome_mb),
+        }
+        self._sampled_at = now
+        return self._sample
+
+    def target(self, active: int = None) -> int:
+        active = self.active if active is None else active
+        s = self.sample()
+        if s is self._planned_for:
+            return self._last_target
+        # headroom is fixed for the whole sample: browsers admitted after it was taken count
+        # against the memory it measured, and CPU ramps at most one browser per sample
+        self._planned_for = s
+        per_chrome = max(s["per_chrome_mb"], 1)
+        mem_capacity = active + int((s["available_mb"] - self.mem_reserve_mb) // per_chrome)
+        if s["load_per_cpu"] > self.load_high:
+            cpu_capacity = active - 1
+        elif s["load_per_cpu"] < self.load_low:
+            cpu_capacity = active + 1
+        else:
+            cpu_capacity = active
+        target = max(self.min_workers, min(self.max_workers, mem_capacity, cpu_capacity))
+        if target != self._last_target:
+            print(f"[GOVERNOR] target {self._last_target} -> {target} ({s})")
+            self._last_target = target
+        return target
+
+    def try_enter(self, force: bool = False) -> bool:
+        with self._lock:
+            if force or self.active < self.target(self.active):
+                self.active += 1
+                return True
+            return False
+
+    def enter(self, stop_event: threading.Event):
+        while not self.try_enter():
+            if stop_event.wait(self.sample_interval):
+                return False
+        return True
+
+    def should_yield(self) -> bool:
+        # asked between keywords by a running profile; over target, one profile per excess slot
+        # stops so ramp-down also applies to profiles that would otherwise run until the queue is empty
+        me = threading.get_ident()
+        with self._lock:
+            if me in self._yielding:
+                return True
+            if self.active - len(self._yielding) > self.target(self.active):
+                self._yielding.add(me)
+                return True
+            return False
+
+    def leave(self):
+        with self._lock:
+            self.active = max(0, self.active - 1)
+            self._yielding.discard(threading.get_ident())
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "target": self._last_target,
+            "min_workers": self.min_workers,
+            "max_workers": self.max_workers,
+            "sample": self.sample(),
+        }
+
+
+governor = ConcurrencyGovernor()
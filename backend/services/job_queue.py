@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from services.crawl_events import emit_event
+
+load_dotenv()
+
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "crawl:status:")
+REDIS_KEY_JOBS = os.getenv("REDIS_KEY_JOBS", "crawl:jobs:")
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# pop one job id and mark it in-flight until the visibility deadline, atomically
+CLAIM_SCRIPT = """
+local id = redis.call('RPOP', KEYS[1])
+if not id then return nil end
+redis.call('ZADD', KEYS[2], ARGV[1], id)
+return {id, redis.call('HGET', KEYS[3], id)}
+"""
+
+
+class RedisJobQueue:
+    def __init__(self, redis_client, prefix: str = REDIS_KEY_JOBS,
+                 visibility_timeout: int = JOB_VISIBILITY_TIMEOUT, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 on_run_done=None):
+        self.redis = redis_client
+        # called as on_run_done(redis_client, run_id) by whichever worker finishes a run
+        self.on_run_done = on_run_done
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.pending_key = f"{prefix}pending"
+        self.processing_key = f"{prefix}processing"
+        self.data_key = f"{prefix}data"
+        self.attempts_key = f"{prefix}attempts"
+        self.dead_key = f"{prefix}dead"
+        self.remaining_prefix = f"{prefix}remaining:"
+        self._claim = redis_client.register_script(CLAIM_SCRIPT)
+        # jobs this process is crawling right now, kept visible by touch_held()
+        self._held = set()
+        self._held_lock = threading.Lock()
+
+    def enqueue_run(self, run_id: str, keywords: list, replicas: int = 1) -> int:
+        jobs = {}
+        seen = set()
+        for kw in keywords:
+            keyword = (kw.get("keyword") or "").strip()
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            for r in range(max(1, replicas)):
+                job_id = f"{run_id}:{len(jobs)}"
+                jobs[job_id] = json.dumps({"run_id": run_id, "keyword": keyword, "replica": r})
+        if not jobs:
+            return 0
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self.data_key, mapping=jobs)
+        pipe.set(f"{self.remaining_prefix}{run_id}", len(jobs))
+        pipe.lpush(self.pending_key, *jobs.keys())
+        pipe.execute()
+        return len(jobs)
+
+    def claim(self):
+        res = self._claim(
+            keys=[self.pending_key, self.processing_key, self.data_key],
+            args=[time.time() + self.visibility_timeout],
+        )
+        if not res:
+            return None
+        job_id, payload = res
+        if not payload:
+            self.redis.zrem(self.processing_key, job_id)
+            return None
+        job = json.loads(payload)
+        job["_job_id"] = job_id
+        with self._held_lock:
+            self._held.add(job_id)
+        return job
+
+    def touch(self, job_id: str) -> bool:
+        return bool(self.redis.zadd(self.processing_key, {job_id: time.time() + self.visibility_timeout}, xx=True, ch=True))
+
+    def touch_held(self) -> int:
+        with self._held_lock:
+            held = list(self._held)
+        lost = [job_id for job_id in held if not self.touch(job_id)]
+        for job_id in lost:
+            # reclaimed by the reaper already; the ack will be refused anyway
+            print(f"[JOBS] lost visibility on {job_id}")
+            self._drop_held(job_id)
+        return len(held) - len(lost)
+
+    def _drop_held(self, job_id: str):
+        with self._held_lock:
+            self._held.discard(job_id)
+
+    def ack(self, job_id: str, run_id: str) -> bool:
+        self._drop_held(job_id)
+        # zrem only succeeds for the holder that still owns the job
+        if not self.redis.zrem(self.processing_key, job_id):
+            return False
+        pipe = self.redis.pipeline()
+        pipe.hdel(self.data_key, job_id)
+        pipe.hdel(self.attempts_key, job_id)
+        pipe.decr(f"{self.remaining_prefix}{run_id}")
+        left = pipe.execute()[-1]
+        if left <= 0:
+            self._finish_run(run_id)
+        return True
+
+    def requeue_expired(self) -> int:
+        expired = self.redis.zrangebyscore(self.processing_key, "-inf", time.time(), start=0, num=100)
+        requeued = 0
+        for job_id in expired:
+            if not self.redis.zrem(self.processing_key, job_id):
+                continue
+            if self._requeue(job_id):
+                requeued += 1
+        if requeued:
+            print(f"[JOBS] requeued {requeued} expired jobs")
+        return requeued
+
+    def retry(self, job_id: str) -> bool:
+        # failed in the crawl loop: hand it back now instead of waiting for the visibility timeout
+        self._drop_held(job_id)
+        if not self.redis.zrem(self.processing_key, job_id):
+            return False
+        return self._requeue(job_id)
+
+    def _requeue(self, job_id: str) -> bool:
+        attempts = self.redis.hincrby(self.attempts_key, job_id, 1)
+        if attempts >= self.max_attempts:
+            payload = self.redis.hget(self.data_key, job_id)
+            print(f"[JOBS] {job_id} dead after {attempts} attempts")
+            pipe = self.redis.pipeline()
+            pipe.lpush(self.dead_key, payload or job_id)
+            pipe.hdel(self.data_key, job_id)
+            pipe.hdel(self.attempts_key, job_id)
+            pipe.execute()
+            run_id = job_id.rsplit(":", 1)[0]
+            if self.redis.decr(f"{self.remaining_prefix}{run_id}") <= 0:
+                self._finish_run(run_id)
+            return False
+        # retried jobs go to the pop end so they run next
+        self.redis.rpush(self.pending_key, job_id)
+        return True
+
+    def pending_count(self) -> int:
+        return int(self.redis.llen(self.pending_key) or 0)
+
+    def in_flight_count(self) -> int:
+        return int(self.redis.zcard(self.processing_key) or 0)
+
+    def _finish_run(self, run_id: str):
+        self.redis.delete(f"{self.remaining_prefix}{run_id}")
+        self.redis.hset(f"{REDIS_KEY_PREFIX}{run_id}", mapping={
+            "status": "done",
+            "finish_ts": str(int(time.time())),
+            "progress": "100",
+            "message": "All jobs finished"
+        })
+        emit_event(self.redis, run_id, "run_done")
+        if self.on_run_done is not None:
+            try:
+                self.on_run_done(self.redis, run_id)
+            except Exception as e:
+                print(f"[JOBS] run {run_id} finish hook error", e)
+
+
+# same interface as KeywordQueue, backed by the shared Redis job queue
+class RedisKeywordSource:
+    total = 0
+
+    def __init__(self, job_queue: RedisJobQueue, stop_event=None):
+        self.job_queue = job_queue
+        self.stop_event = stop_event
+
+    def has_work_for(self, profile_name: str) -> bool:
+        return self.job_queue.pending_count() > 0
+
+    def next_for(self, profile_name: str):
+        if self.stop_event is not None and self.stop_event.is_set():
+            return None
+        job = self.job_queue.claim()
+        if job:
+            self.job_queue.redis.hset(f"{REDIS_KEY_PREFIX}{job['run_id']}", "status", "running")
+        return job
+
+    def done(self, kw: dict):
+        self.job_queue.ack(kw["_job_id"], kw["run_id"])
+
+    def retry(self, kw: dict) -> bool:
+        return self.job_queue.retry(kw["_job_id"])
@@ -0,0 +1,68 @@
+import os
+import threading
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+KEYWORD_MAX_ATTEMPTS = int(os.getenv("KEYWORD_MAX_ATTEMPTS", 3))
+
+
+class KeywordQueue:
+    def __init__(self, keywords: list, replicas: int = 1, max_profiles: int = None,
+                 max_attempts: int = KEYWORD_MAX_ATTEMPTS):
+        replicas = max(1, int(replicas or 1))
+        if max_profiles:
+            replicas = min(replicas, max_profiles)
+        self.replicas = replicas
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending = deque()
+        seen = set()
+        for kw in keywords:
+            keyword = (kw.get("keyword") or "").strip()
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            self._pending.append({"kw": kw, "remaining": replicas, "taken_by": set(), "failures": 0})
+        self._items = {item["kw"]["keyword"].strip(): item for item in self._pending}
+        self.total = len(self._pending) * replicas
+
+    def next_for(self, profile_name: str):
+        with self._lock:
+            for item in self._pending:
+                if profile_name in item["taken_by"]:
+                    continue
+                item["taken_by"].add(profile_name)
+                item["remaining"] -= 1
+                if item["remaining"] <= 0:
+                    self._pending.remove(item)
+                return item["kw"]
+            return None
+
+    def done(self, kw: dict):
+        pass
+
+    def retry(self, kw: dict) -> bool:
+        # the failing profile stays in taken_by, so another profile picks the keyword up
+        with self._lock:
+            item = self._items.get((kw.get("keyword") or "").strip())
+            if item is None:
+                return False
+            item["failures"] += 1
+            if item["failures"] >= self.max_attempts:
+                print(f"[QUEUE] giving up on {item['kw']['keyword']} after {item['failures']} attempts")
+                return False
+            item["remaining"] += 1
+            if item not in self._pending:
+                self._pending.appendleft(item)
+            return True
+
+    def has_work_for(self, profile_name: str) -> bool:
+        with self._lock:
+            return any(profile_name not in item["taken_by"] for item in self._pending)
+
+    def remaining(self) -> int:
+        with self._lock:
+            return sum(item["remaining"] for item in self._pending)
@@ -0,0 +1,75 @@
+import os
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+
+load_dotenv()
+
+# crawl_worker processes serve their own /metrics here; the API exposes only its own process
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+
+# seconds; covers a cached CDP call (~10ms) up to a cold Chrome launch behind a slow proxy
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+CRAWL_STAGE_SECONDS = Histogram(
+    "crawl_stage_seconds", "Time spent per crawl stage",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+CRAWL_KEYWORDS = Counter("crawl_keywords_total", "Keywords processed", ["status"])
+CRAWL_ADS = Counter("crawl_ads_total", "Ads extracted")
+CRAWL_ERRORS = Counter("crawl_errors_total", "Crawl errors by exception type", ["type"])
+CRAWL_TIMEOUTS = Counter("crawl_timeouts_total", "Timeouts by crawl stage", ["stage"])
+ACTIVE_BROWSERS = Gauge("crawl_active_browsers", "Browsers currently crawling")
+POOLED_BROWSERS = Gauge("crawl_pooled_browsers", "Browsers held by the driver pool")
+QUEUE_DEPTH = Gauge("crawl_queue_depth", "Items waiting per queue", ["queue"])
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["router", "method", "status"],
+)
+
+
+# raw per-stage samples for in-process consumers (the benchmark needs exact percentiles)
+_stage_listeners = []
+
+
+def add_stage_listener(listener):
+    _stage_listeners.append(listener)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if "Timeout" in type(e).__name__:
+            CRAWL_TIMEOUTS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        CRAWL_STAGE_SECONDS.labels(stage).observe(elapsed)
+        for listener in _stage_listeners:
+            listener(stage, elapsed)
+
+
+def record_error(e: Exception):
+    CRAWL_ERRORS.labels(type(e).__name__).inc()
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> bool:
+    if not port:
+        return False
+    try:
+        start_http_server(port)
+        print(f"[METRICS] serving on :{port}")
+        return True
+    except OSError as e:
+        print(f"[METRICS] port {port} unavailable", e)
+        return False
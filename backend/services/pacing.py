@@ -0,0 +1,72 @@
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+from selenium.webdriver.support.ui import WebDriverWait
+
+load_dotenv()
+
+PROFILE_REQUESTS_PER_MINUTE = float(os.getenv("PROFILE_REQUESTS_PER_MINUTE", 8))
+PROFILE_REQUEST_BURST = float(os.getenv("PROFILE_REQUEST_BURST", 1))
+PACING_JITTER = float(os.getenv("PACING_JITTER", 0.25))
+PAGE_READY_TIMEOUT = float(os.getenv("PAGE_READY_TIMEOUT", 15))
+
+# the SERP is usable once any results container (or the captcha page) is in the DOM
+READY_SCRIPT = """
+if (document.readyState === 'loading') return null;
+if (document.querySelector('#captcha-form, form[action*="sorry"]')) return 'captcha';
+if (document.querySelector('#tads, #bottomads, #search, #rso, #center_col, #botstuff')) return 'results';
+return null;
+"""
+
+
+class RateBudget:
+    def __init__(self, per_minute: float = PROFILE_REQUESTS_PER_MINUTE, burst: float = PROFILE_REQUEST_BURST,
+                 jitter: float = PACING_JITTER):
+        self.configure(per_minute, burst, jitter)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, per_minute: float, burst: float = None, jitter: float = None):
+        self.rate = max(0.01, float(per_minute)) / 60.0
+        self.burst = max(1.0, float(burst if burst is not None else getattr(self, "burst", 1)))
+        self.jitter = max(0.0, float(jitter if jitter is not None else getattr(self, "jitter", 0)))
+
+    def acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            # the token is spent now; the sleep below pays for it
+            self._tokens -= 1
+        # jitter keeps the request spacing from looking machine-regular
+        wait += random.uniform(0, self.jitter / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_rate_budget(profile: dict) -> RateBudget:
+    name = profile.get("name", "").strip()
+    per_minute = profile.get("requests_per_minute") or PROFILE_REQUESTS_PER_MINUTE
+    with _budgets_lock:
+        budget = _budgets.get(name)
+        if budget is None:
+            budget = _budgets[name] = RateBudget(per_minute)
+        elif budget.rate != float(per_minute) / 60.0:
+            budget.configure(per_minute)
+        return budget
+
+
+def wait_for_serp(driver, timeout: float = PAGE_READY_TIMEOUT) -> str:
+    return WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+        lambda d: d.execute_script(READY_SCRIPT)
+    )
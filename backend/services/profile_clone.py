@@ -0,0 +1,317 @@
+import errno
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PATH_PROFILE = os.getenv("PATH_PROFILE")
+PATH_PROFILE_CLONE = os.getenv("PATH_PROFILE_CLONE")
+# auto: hardlink immutable files, reflink (or copy) the rest
+PROFILE_CLONE_STRATEGY = os.getenv("PROFILE_CLONE_STRATEGY", "auto")
+CLONE_SYNC_INTERVAL = int(os.getenv("CLONE_SYNC_INTERVAL", 60 * 60))
+CLONE_CACHE_MAX_BYTES = int(os.getenv("CLONE_CACHE_MAX_MB", 20 * 1024)) * 1024 * 1024
+
+MANIFEST_NAME = ".clone_manifest.json"
+FICLONE = 0x40049409
+
+LOCK_FILES = {"SingletonCookie", "SingletonLock", "SingletonSocket", "SingletonLazyLock", "lockfile"}
+# regenerable caches, never worth copying
+SKIP_DIRS = {
+    "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache", "GraphiteDawnCache",
+    "DawnCache", "DawnGraphiteCache", "CacheStorage", "ScriptCache", "Crashpad", "BrowserMetrics",
+    "Crash Reports", "component_crx_cache", "extensions_crx_cache",
+}
+# component data Chrome only ever replaces wholesale, safe to share by hardlink
+IMMUTABLE_DIRS = {
+    "Extensions", "WidevineCdm", "Safe Browsing", "Dictionaries", "OptimizationGuidePredictionModels",
+    "ZxcvbnData", "hyphen-data", "CertificateRevocation", "Crowd Deny", "FirstPartySetsPreloaded",
+    "MEIPreload", "OnDeviceHeadSuggestModel", "PKIMetadata", "SSLErrorAssistant", "Subresource Filter",
+    "TrustTokenKeyCommitments", "FileTypePolicies", "OriginTrials", "AutofillStates", "TpcdMetadata",
+}
+IMMUTABLE_SUFFIXES = (".pak", ".so", ".crx", ".bdic")
+
+
+def reflink(src: str, dst: str) -> bool:
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EBADF):
+                return False
+            raise
+    shutil.copystat(src, dst)
+    return True
+
+
+class ProfileCloner:
+    def __init__(self, master_root: str = PATH_PROFILE, clone_base: str = PATH_PROFILE_CLONE,
+                 strategy: str = PROFILE_CLONE_STRATEGY, sync_interval: int = CLONE_SYNC_INTERVAL,
+                 max_bytes: int = CLONE_CACHE_MAX_BYTES):
+        self.master_root = master_root
+        self.clone_base = clone_base
+        self.strategy = strategy
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._profile_locks = {}
+        # refcount per clone plus an flock fd that tells other processes (API, workers) it is in use
+        self._in_use = {}
+        self._lock_fds = {}
+        self._reflink_ok = strategy in ("auto", "reflink")
+        self._stats = {"created": 0, "synced": 0, "linked": 0, "reflinked": 0, "copied": 0, "evicted": 0}
+
+    def get_clone(self, profile_name: str) -> str:
+        if not profile_name:
+            raise Exception("Profile name empty")
+        clone_root = os.path.join(self.clone_base, profile_name)
+        with self._profile_lock(profile_name):
+            with self._lock:
+                self._in_use[profile_name] = self._in_use.get(profile_name, 0) + 1
+            try:
+                # exclusive while (re)building, shared afterwards for as long as the clone is in use
+                fd = self._file_lock(profile_name)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._prepare(profile_name, clone_root)
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            except Exception:
+                self._drop_use(profile_name)
+                raise
+        return clone_root
+
+    def _prepare(self, profile_name: str, clone_root: str):
+        manifest = self._read_manifest(clone_root)
+        if manifest is None and os.path.isdir(clone_root):
+            # clone made by the old full copytree: adopt it as in sync with the master
+            print(f"[CLONE] Adopt existing clone for {profile_name}")
+            self._sync(profile_name, clone_root, {}, adopt=True)
+        elif manifest is None:
+            print(f"[CLONE] Create clone for {profile_name} ({self.strategy})")
+            started = time.time()
+            self._sync(profile_name, clone_root, {})
+            with self._lock:
+                self._stats["created"] += 1
+            print(f"[CLONE] {profile_name} ready in {time.time() - started:.1f}s")
+        elif time.time() - manifest.get("synced_at", 0) > self.sync_interval:
+            print(f"[CLONE] Sync clone for {profile_name}")
+            self._sync(profile_name, clone_root, manifest.get("files", {}))
+            with self._lock:
+                self._stats["synced"] += 1
+        else:
+            print(f"[CLONE] Reuse clone for {profile_name}")
+            manifest["last_used"] = time.time()
+            self._write_manifest(clone_root, manifest)
+        self._remove_locks(clone_root)
+
+    def release(self, profile_name: str, protected=()):
+        with self._profile_lock(profile_name):
+            # a pooled browser still has the clone open: keep the flock so other processes leave it be
+            self._drop_use(profile_name, keep_lock=profile_name in protected)
+        self.evict(protected)
+
+    def evict(self, protected=()):
+        if not self.max_bytes or not self.clone_base or not os.path.isdir(self.clone_base):
+            return
+        clones = []
+        for name in os.listdir(self.clone_base):
+            root = os.path.join(self.clone_base, name)
+            manifest = self._read_manifest(root)
+            if manifest is None:
+                continue
+            clones.append((manifest.get("last_used", 0), name, root, manifest.get("bytes", 0)))
+        total = sum(c[3] for c in clones)
+        for last_used, name, root, size in sorted(clones):
+            if total <= self.max_bytes:
+                break
+            if name in protected or not self._evict_one(name, root, size):
+                continue
+            total -= size
+
+    def _evict_one(self, name: str, root: str, size: int) -> bool:
+        # same lock get_clone holds, so a clone is never removed while being handed out
+        profile_lock = self._profile_lock(name)
+        if not profile_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                if self._in_use.get(name):
+                    return False
+                kept = self._lock_fds.pop(name, None)
+            if kept is not None:
+                # flock held for a browser that has since left the pool
+                os.close(kept)
+            fd = os.open(self._lock_path(name), os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                # any other process using (or building) this clone holds the flock
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            try:
+                print(f"[CLONE] Evict {name} ({size / 1024 / 1024:.0f} MB)")
+                shutil.rmtree(root, ignore_errors=True)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._stats["evicted"] += 1
+            return True
+        finally:
+            profile_lock.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = sorted(self._in_use)
+        total = 0
+        if self.clone_base and os.path.isdir(self.clone_base):
+            for name in os.listdir(self.clone_base):
+                manifest = self._read_manifest(os.path.join(self.clone_base, name)) or {}
+                total += manifest.get("bytes", 0)
+        stats["cache_bytes"] = total
+        stats["cache_max_bytes"] = self.max_bytes
+        return stats
+
+    def _lock_path(self, profile_name: str) -> str:
+        # beside the clone dir, so rmtree never removes a lock someone is waiting on
+        return os.path.join(self.clone_base, f".{profile_name}.lock")
+
+    def _file_lock(self, profile_name: str) -> int:
+        with self._lock:
+            fd = self._lock_fds.get(profile_name)
+            if fd is None:
+                os.makedirs(self.clone_base, exist_ok=True)
+                fd = os.open(self._lock_path(profile_name), os.O_CREAT | os.O_RDWR, 0o644)
+                self._lock_fds[profile_name] = fd
+            return fd
+
+    def _drop_use(self, profile_name: str, keep_lock: bool = False):
+        with self._lock:
+            left = self._in_use.get(profile_name, 0) - 1
+            if left > 0:
+                self._in_use[profile_name] = left
+                return
+            self._in_use.pop(profile_name, None)
+            if keep_lock:
+                return
+            fd = self._lock_fds.pop(profile_name, None)
+        if fd is not None:
+            os.close(fd)
+
+    def _profile_lock(self, profile_name: str):
+        with self._lock:
+            return self._profile_locks.setdefault(profile_name, threading.Lock())
+
+    def _iter_master(self, profile_name: str):
+        for dirpath, dirnames, filenames in os.walk(self.master_root):
+            rel_dir = os.path.relpath(dirpath, self.master_root)
+            keep = []
+            for d in dirnames:
+                if d in SKIP_DIRS:
+                    continue
+                # other profiles in the same user-data dir are not needed by this clone
+                if rel_dir == "." and d != profile_name and os.path.exists(os.path.join(dirpath, d, "Preferences")):
+                    continue
+                keep.append(d)
+            dirnames[:] = keep
+            for f in filenames:
+                if f in LOCK_FILES or f.startswith("Singleton"):
+                    continue
+                full = os.path.join(dirpath, f)
+                if os.path.islink(full):
+                    continue
+                yield os.path.normpath(os.path.join(rel_dir, f)), full
+
+    def _sync(self, profile_name: str, clone_root: str, previous: dict, adopt: bool = False):
+        files = {}
+        total = 0
+        for rel, src in self._iter_master(profile_name):
+            try:
+                st = os.stat(src)
+            except OSError:
+                continue
+            sig = [st.st_size, st.st_mtime_ns]
+            files[rel] = sig
+            total += st.st_size
+            dst = os.path.join(clone_root, rel)
+            # only files the master changed since the last sync are refreshed,
+            # so clone-local state (cookies, history) is otherwise left alone
+            if adopt or (previous.get(rel) == sig and os.path.exists(dst)):
+                continue
+            self._place(src, dst, rel)
+
+        for rel in set(previous) - set(files):
+            try:
+                os.remove(os.path.join(clone_root, rel))
+            except OSError:
+                pass
+
+        now = time.time()
+        self._write_manifest(clone_root, {"synced_at": now, "last_used": now, "bytes": total, "files": files})
+
+    def _place(self, src: str, dst: str, rel: str):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.clone-tmp"
+        # write beside and rename, never through an existing (possibly hardlinked) file
+        if self.strategy in ("auto", "hardlink") and self._is_immutable(rel):
+            try:
+                os.link(src, tmp)
+                os.replace(tmp, dst)
+                self._count("linked")
+                return
+            except OSError:
+                pass
+        if self._reflink_ok:
+            try:
+                if reflink(src, tmp):
+                    os.replace(tmp, dst)
+                    self._count("reflinked")
+                    return
+                self._reflink_ok = False
+            except OSError:
+                pass
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+        self._count("copied")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _is_immutable(rel: str) -> bool:
+        parts = rel.split(os.sep)
+        return any(p in IMMUTABLE_DIRS for p in parts[:-1]) or parts[-1].endswith(IMMUTABLE_SUFFIXES)
+
+    @staticmethod
+    def _remove_locks(clone_root: str):
+        for name in LOCK_FILES:
+            p = os.path.join(clone_root, name)
+            if os.path.lexists(p):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _read_manifest(clone_root: str):
+        try:
+            with open(os.path.join(clone_root, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_manifest(clone_root: str, manifest: dict):
+        os.makedirs(clone_root, exist_ok=True)
+        tmp = os.path.join(clone_root, MANIFEST_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(clone_root, MANIFEST_NAME))
+
+
+profile_cloner = ProfileCloner()
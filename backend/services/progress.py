@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "crawl:status:")
+PROGRESS_COALESCE_SECONDS = float(os.getenv("PROGRESS_COALESCE_SECONDS", 1))
+
+# increment, percentage and message in one round-trip, atomic against other profiles
+PROGRESS_SCRIPT = """
+local proc = redis.call('HINCRBY', KEYS[1], 'processed_keywords', ARGV[1])
+local tot = 0
+local raw = redis.call('HGET', KEYS[1], 'total_keywords')
+if raw then tot = tonumber(raw) or 0 end
+if tot < 1 then tot = tonumber(ARGV[2]) or 0 end
+if tot < 1 then tot = 1 end
+local pct = math.floor(proc * 100 / tot)
+if pct > 100 then pct = 100 end
+redis.call('HSET', KEYS[1], 'progress', pct, 'message', ARGV[3] .. ': processed ' .. proc .. '/' .. tot)
+return {proc, tot, pct}
+"""
+
+
+class ProgressReporter:
+    def __init__(self, redis_client, coalesce_seconds: float = PROGRESS_COALESCE_SECONDS):
+        self.redis = redis_client
+        self.coalesce_seconds = coalesce_seconds
+        self._script = redis_client.register_script(PROGRESS_SCRIPT)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = 0.0
+
+    def increment(self, run_id: str, profile_name: str, total_hint: int = 0, n: int = 1):
+        with self._lock:
+            count, _, _ = self._pending.get(run_id, (0, None, 0))
+            self._pending[run_id] = (count + n, profile_name, total_hint)
+            due = time.time() - self._last_flush >= self.coalesce_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        for run_id, (count, profile_name, total_hint) in pending.items():
+            try:
+                self._script(
+                    keys=[f"{REDIS_KEY_PREFIX}{run_id}"],
+                    args=[count, total_hint, profile_name or ""],
+                )
+            except Exception as e:
+                print("[progress update error]", e)
+
+
+_reporters = {}
+_reporters_lock = threading.Lock()
+
+
+def get_progress_reporter(redis_client) -> ProgressReporter:
+    with _reporters_lock:
+        reporter = _reporters.get(id(redis_client))
+        if reporter is None or reporter.redis is not redis_client:
+            reporter = ProgressReporter(redis_client)
+            _reporters[id(redis_client)] = reporter
+        return reporter
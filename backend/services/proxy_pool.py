@@ -0,0 +1,250 @@
+import os
+import socket
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_PROXY_URL = os.getenv("API_PROXY_URL")
+PROXY_POOL_SIZE = int(os.getenv("PROXY_POOL_SIZE", 4))
+PROXY_REFRESH_INTERVAL = float(os.getenv("PROXY_REFRESH_INTERVAL", 5))
+PROXY_PROBE_TIMEOUT = float(os.getenv("PROXY_PROBE_TIMEOUT", 3))
+PROXY_COOLDOWN = int(os.getenv("PROXY_COOLDOWN", 120))
+PROXY_MAX_FAILURES = int(os.getenv("PROXY_MAX_FAILURES", 3))
+PROXY_MAX_AGE = int(os.getenv("PROXY_MAX_AGE", 15 * 60))
+PROXY_ACQUIRE_WAIT = float(os.getenv("PROXY_ACQUIRE_WAIT", 0))
+# until the first prefetch has come back, acquire() waits this long instead of falling back
+PROXY_WARMUP_WAIT = float(os.getenv("PROXY_WARMUP_WAIT", 20))
+
+NO_PROXY = (None, None, None, None)
+
+
+def get_proxy_from_api():
+    try:
+        r = requests.get(API_PROXY_URL, timeout=10)
+        text = r.text.strip()
+
+        if ":" in text and len(text.split(":")) == 4:
+            return tuple(text.split(":"))
+
+        data = r.json()
+        px = data.get("proxyhttp")
+        if px and len(px.split(":")) == 4:
+            return tuple(px.split(":"))
+
+        return (
+            data.get("ip"),
+            data.get("port"),
+            data.get("username"),
+            data.get("password"),
+        )
+    except Exception as e:
+        print("[Proxy Error]", e)
+        return NO_PROXY
+
+
+def probe_proxy(host: str, port, timeout: float = PROXY_PROBE_TIMEOUT):
+    started = time.time()
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return time.time() - started
+    except (OSError, ValueError):
+        return None
+
+
+class ProxyPool:
+    def __init__(self, size: int = PROXY_POOL_SIZE, refresh_interval: float = PROXY_REFRESH_INTERVAL,
+                 cooldown: int = PROXY_COOLDOWN, max_failures: int = PROXY_MAX_FAILURES,
+                 max_age: int = PROXY_MAX_AGE, warmup_wait: float = PROXY_WARMUP_WAIT,
+                 fetch=get_proxy_from_api, probe=probe_proxy, source_url: str = API_PROXY_URL):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.max_age = max_age
+        self.warmup_wait = warmup_wait
+        self.source_url = source_url
+        self._fetch = fetch
+        self._probe = probe
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._proxies = {}
+        self._thread = None
+        self._warm = False
+        self._stats = {"fetched": 0, "loop_errors": 0, "fetch_errors": 0, "probe_failures": 0, "evicted": 0, "served": 0, "empty": 0}
+
+    def start(self):
+        if self._thread is not None or not self.source_url:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._prefetch_loop, name="proxy-prefetch", daemon=True)
+        self._thread.start()
+
+    def acquire(self, profile_name: str = "", wait: float = PROXY_ACQUIRE_WAIT, prefer: str = None):
+        # prefer: the proxy a pooled browser was launched with, kept while it stays healthy
+        self.start()
+        started = time.time()
+        with self._lock:
+            while True:
+                best = self._best(prefer)
+                if best is not None:
+                    break
+                # before the first prefetch has come back an empty pool means "not yet", not "none"
+                deadline = started + wait
+                if not self._warm and self._thread is not None:
+                    deadline = max(deadline, started + self.warmup_wait)
+                if time.time() >= deadline:
+                    break
+                self._ready.wait(timeout=max(0.05, deadline - time.time()))
+            if best is None:
+                self._stats["empty"] += 1
+                print(f"[{profile_name}] NO PROXY (pool empty, fallback)")
+                return NO_PROXY
+            best["in_use"] += 1
+            self._stats["served"] += 1
+            return best["proxy"]
+
+    def release(self, proxy: tuple, ok: bool, latency: float = None):
+        if not proxy or not proxy[0]:
+            return
+        with self._lock:
+            entry = self._proxies.get(self._key(proxy))
+            if entry is None:
+                return
+            entry["in_use"] = max(0, entry["in_use"] - 1)
+            self._record(entry, ok, latency)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._proxies)
+            stats["proxies"] = [
+                {
+                    "proxy": key,
+                    "score": round(self._score(e), 3),
+                    "latency_ms": round(e["latency"] * 1000) if e["latency"] is not None else None,
+                    "success_rate": round(e["success_rate"], 3),
+                    "in_use": e["in_use"],
+                    "cooling_down": e["cooldown_until"] > now,
+                }
+                for key, e in self._proxies.items()
+            ]
+        return stats
+
+    @staticmethod
+    def _key(proxy: tuple) -> str:
+        return f"{proxy[0]}:{proxy[1]}"
+
+    @staticmethod
+    def _score(entry: dict) -> float:
+        latency = entry["latency"] if entry["latency"] is not None else PROXY_PROBE_TIMEOUT
+        return entry["success_rate"] / (1.0 + latency)
+
+    def _record(self, entry: dict, ok: bool, latency: float = None):
+        # exponentially weighted so a proxy that goes bad drops quickly
+        entry["success_rate"] = 0.7 * entry["success_rate"] + 0.3 * (1.0 if ok else 0.0)
+        if latency is not None:
+            entry["latency"] = latency if entry["latency"] is None else 0.7 * entry["latency"] + 0.3 * latency
+        if ok:
+            entry["consecutive_failures"] = 0
+            return
+        entry["consecutive_failures"] += 1
+        entry["cooldown_until"] = time.time() + self.cooldown
+        if entry["consecutive_failures"] >= self.max_failures:
+            self._proxies.pop(self._key(entry["proxy"]), None)
+            self._stats["evicted"] += 1
+
+    def _best(self, prefer: str = None):
+        now = time.time()
+        for key in [k for k, e in self._proxies.items() if now - e["added_at"] > self.max_age and not e["in_use"]]:
+            del self._proxies[key]
+            self._stats["evicted"] += 1
+        candidates = [e for e in self._proxies.values() if e["cooldown_until"] <= now]
+        if not candidates:
+            return None
+        preferred = self._proxies.get(prefer) if prefer else None
+        if preferred is not None and preferred in candidates:
+            return preferred
+        # spread profiles over proxies first, then prefer the best score
+        return min(candidates, key=lambda e: (e["in_use"], -self._score(e)))
+
+    def _healthy_count(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for e in self._proxies.values() if e["cooldown_until"] <= now)
+
+    def _prefetch_loop(self):
+        backoff = self.refresh_interval
+        while True:
+            try:
+                backoff = self._prefetch_once(backoff)
+            except Exception as e:
+                # one bad response must not leave the process without proxies for good
+                print("[PROXY] prefetch error", e)
+                with self._lock:
+                    self._stats["loop_errors"] += 1
+                backoff = min(60, backoff * 2)
+            finally:
+                self._mark_warm()
+            time.sleep(backoff)
+
+    def _prefetch_once(self, backoff: float) -> float:
+        if self._healthy_count() >= self.size:
+            self._revalidate()
+            return self.refresh_interval
+        proxy = self._fetch()
+        if not (proxy and proxy[0] and proxy[1]):
+            with self._lock:
+                self._stats["fetch_errors"] += 1
+            return min(60, backoff * 2)
+        self._add(tuple(proxy))
+        return self.refresh_interval
+
+    def _mark_warm(self):
+        with self._lock:
+            if not self._warm:
+                self._warm = True
+                self._ready.notify_all()
+
+    def _add(self, proxy: tuple):
+        latency = self._probe(proxy[0], proxy[1])
+        with self._lock:
+            self._stats["fetched"] += 1
+            if latency is None:
+                self._stats["probe_failures"] += 1
+                return
+            key = self._key(proxy)
+            entry = self._proxies.get(key)
+            if entry is None:
+                entry = {
+                    "proxy": proxy,
+                    "latency": latency,
+                    "success_rate": 1.0,
+                    "consecutive_failures": 0,
+                    "cooldown_until": 0,
+                    "in_use": 0,
+                    "added_at": time.time(),
+                }
+                self._proxies[key] = entry
+            else:
+                entry["proxy"] = proxy
+                self._record(entry, True, latency)
+            self._ready.notify_all()
+
+    def _revalidate(self):
+        with self._lock:
+            idle = [e for e in self._proxies.values() if not e["in_use"]]
+        for entry in idle:
+            latency = self._probe(entry["proxy"][0], entry["proxy"][1])
+            with self._lock:
+                if self._proxies.get(self._key(entry["proxy"])) is entry:
+                    self._record(entry, latency is not None, latency)
+
+
+proxy_pool = ProxyPool()
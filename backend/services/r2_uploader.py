@@ -0,0 +1,196 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import boto3
+from botocore.client import Config
+from dotenv import load_dotenv
+
+from services.metrics import observe_stage
+
+load_dotenv()
+
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
+R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
+
+R2_UPLOAD_WORKERS = int(os.getenv("R2_UPLOAD_WORKERS", 4))
+R2_UPLOAD_QUEUE_SIZE = int(os.getenv("R2_UPLOAD_QUEUE_SIZE", 200))
+R2_UPLOAD_RETRIES = int(os.getenv("R2_UPLOAD_RETRIES", 3))
+R2_KEY_PREFIX = os.getenv("R2_KEY_PREFIX", "screenshots")
+# files that never made it to R2 are moved here (oldest trimmed past the cap); empty = delete them
+R2_DEAD_LETTER_DIR = os.getenv("R2_DEAD_LETTER_DIR", "upload_failed")
+R2_DEAD_LETTER_MAX_FILES = int(os.getenv("R2_DEAD_LETTER_MAX_FILES", 500))
+
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+_s3 = None
+_s3_lock = threading.Lock()
+
+
+def r2_configured() -> bool:
+    return all([R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_ENDPOINT_URL])
+
+
+def get_s3_client():
+    # boto3 clients are thread-safe; one client keeps one connection pool warm
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                _s3 = boto3.client(
+                    "s3",
+                    aws_access_key_id=R2_ACCESS_KEY_ID,
+                    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                    endpoint_url=R2_ENDPOINT_URL,
+                    config=Config(
+                        signature_version="s3v4",
+                        s3={"addressing_style": "path"},
+                        max_pool_connections=max(10, R2_UPLOAD_WORKERS * 2),
+                        retries={"max_attempts": 2, "mode": "standard"},
+                    ),
+                    region_name="auto",
+                )
+    return _s3
+
+
+def content_key(local_path: str, prefix: str = R2_KEY_PREFIX) -> str:
+    h = hashlib.sha256()
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    ext = os.path.splitext(local_path)[1].lower() or ".png"
+    return f"{prefix}/{digest[:2]}/{digest}{ext}"
+
+
+def upload_to_r2(local_path: str, remote_path: str) -> bool:
+    if not r2_configured():
+        return False
+    try:
+        ext = os.path.splitext(local_path)[1].lower()
+        extra = {"ContentType": CONTENT_TYPES[ext]} if ext in CONTENT_TYPES else None
+        with observe_stage("r2_upload"):
+            get_s3_client().upload_file(local_path, R2_BUCKET_NAME, remote_path, ExtraArgs=extra)
+        return True
+    except Exception as e:
+        print("[R2 Upload Error]", e)
+        return False
+
+
+class R2Uploader:
+    def __init__(self, workers: int = R2_UPLOAD_WORKERS, queue_size: int = R2_UPLOAD_QUEUE_SIZE,
+                 retries: int = R2_UPLOAD_RETRIES, dead_letter_dir: str = R2_DEAD_LETTER_DIR,
+                 dead_letter_max: int = R2_DEAD_LETTER_MAX_FILES):
+        self.workers = workers
+        self.retries = retries
+        self.dead_letter_dir = dead_letter_dir
+        self.dead_letter_max = dead_letter_max
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=500)
+        self._stats = {"enqueued": 0, "uploaded": 0, "failed": 0, "retries": 0, "dead_lettered": 0, "discarded": 0}
+
+    def submit(self, local_path: str, on_done=None, key: str = None, keep_local: bool = False) -> str:
+        key = key or content_key(local_path)
+        self._ensure_started()
+        # blocks when the queue is full so a slow bucket applies backpressure
+        self._queue.put((local_path, key, on_done, keep_local))
+        with self._lock:
+            self._stats["enqueued"] += 1
+        return key
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        end = time.time() + timeout if timeout else None
+        while self._queue.unfinished_tasks:
+            if end and time.time() > end:
+                return False
+            time.sleep(0.2)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+            lat = sorted(self._latencies)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["latency_avg_ms"] = round(sum(lat) / len(lat) * 1000, 1) if lat else 0.0
+        stats["latency_p95_ms"] = round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1) if lat else 0.0
+        return stats
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"r2-upload-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            local_path, key, on_done, keep_local = self._queue.get()
+            with self._lock:
+                self._in_flight += 1
+            try:
+                started = time.time()
+                ok = False
+                for attempt in range(self.retries):
+                    if upload_to_r2(local_path, key):
+                        ok = True
+                        break
+                    if not r2_configured():
+                        break
+                    with self._lock:
+                        self._stats["retries"] += 1
+                    time.sleep(min(30, 0.5 * (2 ** attempt)))
+                with self._lock:
+                    self._stats["uploaded" if ok else "failed"] += 1
+                    if ok:
+                        self._latencies.append(time.time() - started)
+                if on_done:
+                    try:
+                        on_done(key if ok else None)
+                    except Exception as e:
+                        print("[R2 Upload callback error]", e)
+                if ok and not keep_local:
+                    try:
+                        os.remove(local_path)
+                    except OSError:
+                        pass
+                elif not ok and not keep_local:
+                    self._dead_letter(local_path)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                self._queue.task_done()
+
+    def _dead_letter(self, local_path: str):
+        # nothing else cleans the screenshot dir any more; failures must not fill the disk
+        try:
+            if not self.dead_letter_dir or self.dead_letter_max <= 0:
+                os.remove(local_path)
+                with self._lock:
+                    self._stats["discarded"] += 1
+                return
+            os.makedirs(self.dead_letter_dir, exist_ok=True)
+            os.replace(local_path, os.path.join(self.dead_letter_dir, os.path.basename(local_path)))
+            with self._lock:
+                self._stats["dead_lettered"] += 1
+                entries = sorted(os.scandir(self.dead_letter_dir), key=lambda e: e.stat().st_mtime)
+                for entry in entries[:max(0, len(entries) - self.dead_letter_max)]:
+                    os.remove(entry.path)
+                    self._stats["discarded"] += 1
+        except OSError as e:
+            print("[R2 dead letter error]", e)
+
+
+r2_uploader = R2Uploader()
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIGHTWEIGHT_BROWSING = os.getenv("LIGHTWEIGHT_BROWSING", "0") == "1"
+
+# fonts, media and trackers are never part of an ad block; images stay so shopping ads still render
+DEFAULT_BLOCKED_URLS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg",
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net/pagead/viewthroughconversion*",
+    "*youtube.com/*", "*ytimg.com/*", "*googlevideo.com/*",
+    "*maps.googleapis.com/*", "*maps.gstatic.com/*",
+    "*/gen_204*", "*/client_204*", "*/log?*",
+]
+BLOCKED_URL_PATTERNS = [
+    p.strip() for p in os.getenv("BLOCKED_URL_PATTERNS", "").split(",") if p.strip()
+] or DEFAULT_BLOCKED_URLS
+
+PAGE_BYTES_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0];
+var total = nav ? (nav.transferSize || 0) : 0;
+var res = performance.getEntriesByType('resource');
+for (var i = 0; i < res.length; i++) total += res[i].transferSize || 0;
+return [total, res.length];
+"""
+
+# Chrome has to be launched with this capability for driver.get_log("performance") to work
+PERFORMANCE_LOGGING_PREFS = {"performance": "ALL"}
+
+_lock = threading.Lock()
+# "cdp": encodedDataLength of every finished request; "resource_timing" is a lower bound, since
+# cross-origin responses without Timing-Allow-Origin report a transferSize of 0
+_stats = {"pages": 0, "bytes": 0, "requests": 0, "blocked": 0, "pages_cdp": 0, "pages_resource_timing": 0}
+
+
+def apply_resource_blocking(driver, enabled: bool = LIGHTWEIGHT_BROWSING, patterns: list = None):
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": (patterns or BLOCKED_URL_PATTERNS) if enabled else []})
+        return True
+    except Exception as e:
+        print("[BLOCK] setBlockedURLs error", e)
+        return False
+
+
+def network_bytes_from_log(entries: list):
+    total = 0
+    requests = 0
+    blocked = 0
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        if method == "Network.loadingFinished":
+            total += int(message.get("params", {}).get("encodedDataLength") or 0)
+            requests += 1
+        elif method == "Network.loadingFailed" and message.get("params", {}).get("blockedReason"):
+            blocked += 1
+    return total, requests, blocked
+
+
+def record_page_bytes(driver) -> int:
+    # drains the performance log, so each call covers what loaded since the previous one
+    blocked = 0
+    try:
+        total, requests, blocked = network_bytes_from_log(driver.get_log("performance"))
+        source = "pages_cdp"
+    except Exception:
+        try:
+            total, requests = driver.execute_script(PAGE_BYTES_SCRIPT)
+            source = "pages_resource_timing"
+        except Exception:
+            return 0
+    with _lock:
+        _stats["pages"] += 1
+        _stats[source] += 1
+        _stats["bytes"] += int(total or 0)
+        _stats["requests"] += int(requests or 0)
+        _stats["blocked"] += blocked
+    return int(total or 0)
+
+
+def page_bytes_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    stats["lightweight"] = LIGHTWEIGHT_BROWSING
+    stats["avg_bytes_per_page"] = round(stats["bytes"] / stats["pages"]) if stats["pages"] else 0
+    stats["lower_bound"] = stats["pages_resource_timing"] > 0
+    return stats
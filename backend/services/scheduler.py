@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from models.keyword_model import get_due_keywords, get_keyword_schedule, update_keyword_schedule, postpone_keywords
+from services.governor import RunLock
+
+load_dotenv()
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "0") == "1"
+SCHEDULER_CONFIG = os.getenv("SCHEDULER_CONFIG")
+SCHEDULER_MAX_INTERVAL = int(os.getenv("SCHEDULER_MAX_INTERVAL", 6 * 60 * 60))
+# dispatched keywords stay leased until record_keyword_result reschedules them, or this runs out
+SCHEDULER_LEASE = max(SCHEDULER_MAX_INTERVAL, int(os.getenv("SCHEDULER_LEASE", 0)))
+REDIS_KEY_SCHEDULER = os.getenv("REDIS_KEY_SCHEDULER", "crawl:scheduler:leader")
+REDIS_KEY_SCHEDULE_RESULTS = os.getenv("REDIS_KEY_SCHEDULE_RESULTS", "crawl:schedule:")
+SCHEDULER_LEADER_TTL = int(os.getenv("SCHEDULER_LEADER_TTL", 60))
+
+UNIT_SECONDS = {"seconds": 1, "minutes": 60, "hours": 3600, "days": 86400}
+
+
+def config_path() -> str:
+    if SCHEDULER_CONFIG:
+        return SCHEDULER_CONFIG
+    for candidate in ("scheduler_config.json", os.path.join("..", "scheduler_config.json")):
+        if os.path.exists(candidate):
+            return candidate
+    return "scheduler_config.json"
+
+
+def load_interval_seconds(path: str = None) -> int:
+    try:
+        with open(path or config_path(), "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        return max(1, int(float(cfg.get("interval", 1)) * UNIT_SECONDS.get(cfg.get("unit", "minutes"), 60)))
+    except (OSError, ValueError) as e:
+        print("[SCHEDULER] config error, using 60s", e)
+        return 60
+
+
+def ads_signature(ad_keys) -> str:
+    return hashlib.sha1("|".join(sorted(ad_keys)).encode("utf-8")).hexdigest()
+
+
+def record_keyword_result(keyword: str, ad_keys, base_interval: int = None):
+    base_interval = base_interval or load_interval_seconds()
+    doc = get_keyword_schedule(keyword) or {}
+    interval = doc.get("crawl_interval") or base_interval
+    priority = doc.get("priority") or 0
+    signature = ads_signature(ad_keys) if ad_keys else ""
+
+    if not ad_keys:
+        # nothing to watch: back off hard
+        interval *= 2
+        priority = 0
+    elif signature != doc.get("ads_signature"):
+        # the ad set moved: come back sooner
+        interval /= 2
+        priority = min(10, priority + 1)
+    else:
+        interval *= 2
+        priority = max(0, priority - 1)
+
+    interval = max(base_interval, min(SCHEDULER_MAX_INTERVAL, interval))
+    now = datetime.now()
+    update_keyword_schedule(keyword, {
+        "crawl_interval": interval,
+        "priority": priority,
+        "ads_signature": signature,
+        "last_crawled": now,
+        "next_due": now + timedelta(seconds=interval * random.uniform(0.9, 1.1)),
+    })
+
+
+def release_keywords(keywords: list):
+    # the crawl failed: make the keywords due again instead of leaving them leased
+    if keywords:
+        postpone_keywords(keywords, datetime.now())
+
+
+class RunResults:
+    # one schedule update per keyword per run, however many profiles or replicas crawled it;
+    # backed by Redis when the replicas run on other worker hosts
+    def __init__(self, run_id: str, redis_client=None, ttl: int = SCHEDULER_LEASE):
+        self.run_id = run_id
+        self.redis = redis_client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keywords = set()
+        self._ok = set()
+        self._ads = {}
+
+    def _key(self, suffix: str) -> str:
+        return f"{REDIS_KEY_SCHEDULE_RESULTS}{self.run_id}:{suffix}"
+
+    def track(self, keywords: list):
+        # the run's keyword list, so keywords that never report back are released too
+        keywords = [k for k in keywords if k]
+        if not keywords:
+            return
+        if self.redis is None:
+            with self._lock:
+                self._keywords.update(keywords)
+            return
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._key("keywords"), *keywords)
+        pipe.expire(self._key("keywords"), self.ttl)
+        pipe.execute()
+
+    def add(self, keyword: str, ad_keys):
+        # ad_keys is None when this attempt failed for good
+        if self.redis is None:
+            with self._lock:
+                self._keywords.add(keyword)
+                if ad_keys is not None:
+                    self._ok.add(keyword)
+                    self._ads.setdefault(keyword, set()).update(ad_keys)
+            return
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._key("keywords"), keyword)
+        pipe.expire(self._key("keywords"), self.ttl)
+        if ad_keys is not None:
+            pipe.sadd(self._key("ok"), keyword)
+            pipe.expire(self._key("ok"), self.ttl)
+            if ad_keys:
+                pipe.sadd(self._key(f"ads:{keyword}"), *ad_keys)
+                pipe.expire(self._key(f"ads:{keyword}"), self.ttl)
+        pipe.execute()
+
+    def finish(self, keywords: list = None) -> dict:
+        if self.redis is None:
+            with self._lock:
+                seen, ok, ads = set(self._keywords), set(self._ok), {k: set(v) for k, v in self._ads.items()}
+        else:
+            seen, ok = self.redis.smembers(self._key("keywords")), self.redis.smembers(self._key("ok"))
+            ads = {k: self.redis.smembers(self._key(f"ads:{k}")) for k in ok}
+            self.redis.delete(self._key("keywords"), self._key("ok"), *[self._key(f"ads:{k}") for k in ok])
+        seen.update(k for k in keywords or [] if k)
+
+        failed = sorted(seen - ok)
+        for keyword in ok:
+            try:
+                record_keyword_result(keyword, ads.get(keyword, set()))
+            except Exception as e:
+                print(f"[SCHEDULER] result {keyword} failed", e)
+        try:
+            release_keywords(failed)
+        except Exception as e:
+            print("[SCHEDULER] release failed", e)
+        return {"recorded": len(ok), "released": len(failed)}
+
+
+def finish_run_results(redis_client, run_id: str):
+    RunResults(run_id, redis_client).finish()
+
+
+class AdaptiveScheduler:
+    def __init__(self, redis_client, dispatch, path: str = None, lease: int = SCHEDULER_LEASE,
+                 leader_ttl: int = SCHEDULER_LEADER_TTL):
+        self.redis = redis_client
+        self.dispatch = dispatch
+        self.path = path or config_path()
+        self.lease = lease
+        self.leader_ttl = leader_ttl
+        self.instance_id = f"{os.uname().nodename}:{os.getpid()}:{id(self)}"
+        self._leader = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_tick = None
+        self.last_dispatched = 0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._loop, name="crawl-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[SCHEDULER] started, config {self.path}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._leader is not None:
+            self._leader.release()
+            self._leader = None
+
+    def tick(self) -> int:
+        now = datetime.now()
+        due = get_due_keywords(now)
+        self.last_tick = now
+        if not due:
+            return 0
+        keywords = [k["keyword"] for k in due]
+        # a run can sit behind the crawl lock or in the job queue for many ticks; the lease
+        # keeps it from being dispatched again until its keywords report back
+        postpone_keywords(keywords, now + timedelta(seconds=self.lease))
+        print(f"[SCHEDULER] dispatching {len(due)} due keywords")
+        self.dispatch(due)
+        self.last_dispatched = len(due)
+        return len(due)
+
+    def _is_leader(self) -> bool:
+        # only one API/worker process schedules; the lease is renewed by the RunLock heartbeat,
+        # so a local-mode tick that blocks for a whole crawl does not hand leadership away
+        if self.redis is None:
+            return True
+        try:
+            if self._leader is not None and self._leader.holder() == self.instance_id:
+                return True
+            lock = RunLock(self.redis, REDIS_KEY_SCHEDULER, self.instance_id, self.leader_ttl)
+            if lock.acquire():
+                self._leader = lock
+                print(f"[SCHEDULER] {self.instance_id} is leader")
+                return True
+        except Exception as e:
+            print("[SCHEDULER] leader check error", e)
+        return False
+
+    def _loop(self):
+        while not self._stop.is_set():
+            tick_seconds = load_interval_seconds(self.path)
+            started = time.time()
+            if self._is_leader():
+                try:
+                    self.tick()
+                except Exception as e:
+                    print("[SCHEDULER] tick error", e)
+            self._stop.wait(max(1, tick_seconds - (time.time() - started)))
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+import redis
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY_PHASH = os.getenv("REDIS_KEY_PHASH", "crawl:phash:")
+PHASH_TTL = int(os.getenv("PHASH_TTL", 7 * 24 * 60 * 60))
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 4))
+PHASH_CACHE_SIZE = int(os.getenv("PHASH_CACHE_SIZE", 20000))
+
+
+def dhash(path: str, size: int = 8) -> str:
+    # difference hash: compare each pixel with its right neighbour on a (size+1) x size thumbnail
+    with Image.open(path) as img:
+        small = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+        px = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+class ScreenshotDedup:
+    def __init__(self, max_distance: int = PHASH_MAX_DISTANCE, cache_size: int = PHASH_CACHE_SIZE):
+        self.max_distance = max_distance
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._redis = None
+        self._redis_failed = False
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def lookup(self, ad_key: str, phash: str):
+        entry = self._get(ad_key)
+        if entry and hamming(entry[0], phash) <= self.max_distance:
+            self._count("hits")
+            return entry[1]
+        self._count("misses")
+        return None
+
+    def remember(self, ad_key: str, phash: str, object_key: str):
+        self._put(ad_key, (phash, object_key))
+        r = self._client()
+        if r is None:
+            return
+        try:
+            name = f"{REDIS_KEY_PHASH}{ad_key}"
+            pipe = r.pipeline()
+            pipe.hset(name, mapping={"hash": phash, "key": object_key})
+            pipe.expire(name, PHASH_TTL)
+            pipe.execute()
+        except Exception as e:
+            print("[PHASH] redis write error", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached"] = len(self._cache)
+        seen = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / seen, 3) if seen else 0.0
+        return stats
+
+    def _get(self, ad_key: str):
+        with self._lock:
+            entry = self._cache.get(ad_key)
+            if entry:
+                self._cache.move_to_end(ad_key)
+                return entry
+        # other workers may have stored this creative already
+        r = self._client()
+        if r is None:
+            return None
+        try:
+            data = r.hgetall(f"{REDIS_KEY_PHASH}{ad_key}")
+        except Exception:
+            self._count("errors")
+            return None
+        if not data.get("hash") or not data.get("key"):
+            return None
+        entry = (data["hash"], data["key"])
+        self._put(ad_key, entry)
+        return entry
+
+    def _put(self, ad_key: str, entry: tuple):
+        with self._lock:
+            self._cache[ad_key] = entry
+            self._cache.move_to_end(ad_key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _client(self):
+        if self._redis is None and not self._redis_failed and REDIS_URL:
+            try:
+                self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+            except Exception as e:
+                print("[PHASH] redis unavailable, in-memory only", e)
+                self._redis_failed = True
+        return self._redis
+
+
+screenshot_dedup = ScreenshotDedup()
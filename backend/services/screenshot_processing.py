@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from PIL import Image
+
+from services.screenshot_dedup import dhash
+
+load_dotenv()
+
+SCREENSHOT_PROCESSING = os.getenv("SCREENSHOT_PROCESSING", "1") == "1"
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "webp").lower()
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", 80))
+SCREENSHOT_MAX_WIDTH = int(os.getenv("SCREENSHOT_MAX_WIDTH", 800))
+# 0 disables the thumbnail variant
+SCREENSHOT_THUMBNAIL_WIDTH = int(os.getenv("SCREENSHOT_THUMBNAIL_WIDTH", 0))
+SCREENSHOT_PROCESS_WORKERS = int(os.getenv("SCREENSHOT_PROCESS_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg", "jpg": ".jpg", "png": ".png"}
+
+
+def crop_to_rect(img: Image.Image, rect: dict) -> Image.Image:
+    # rect is in CSS pixels of the page; the fallback viewport shot is taken unscrolled.
+    # a rect capture_clip would not clip (collapsed block) would crop the shot to a sliver
+    if not rect or rect.get("width", 0) < 1 or rect.get("height", 0) <= 8:
+        return img
+    left = max(0, int(rect.get("x", 0)))
+    top = max(0, int(rect.get("y", 0)))
+    right = min(img.width, int(rect.get("x", 0) + rect.get("width", 0)))
+    bottom = min(img.height, int(rect.get("y", 0) + rect.get("height", 0)))
+    if right - left < 1 or bottom - top < 1:
+        return img
+    return img.crop((left, top, right, bottom))
+
+
+def encode(img: Image.Image, path: str, fmt: str, quality: int):
+    if fmt in ("jpeg", "jpg"):
+        img.convert("RGB").save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(path, "WEBP", quality=quality, method=4)
+    else:
+        img.save(path, "PNG", optimize=True)
+
+
+def resized(img: Image.Image, max_width: int) -> Image.Image:
+    if not max_width or img.width <= max_width:
+        return img
+    height = max(1, round(img.height * max_width / img.width))
+    return img.resize((max_width, height), Image.LANCZOS)
+
+
+def process_screenshot(path: str, rect: dict = None, fmt: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY,
+                       max_width: int = SCREENSHOT_MAX_WIDTH, thumbnail_width: int = SCREENSHOT_THUMBNAIL_WIDTH) -> dict:
+    # runs in a worker process: decode, resample and encode are all CPU
+    base, _ = os.path.splitext(path)
+    ext = EXTENSIONS.get(fmt, ".webp")
+    out_path = f"{base}{ext}" if f"{base}{ext}" != path else f"{base}.out{ext}"
+    bytes_in = os.path.getsize(path)
+    with Image.open(path) as src:
+        full = src.convert("RGBA" if src.mode in ("RGBA", "LA", "P") else "RGB")
+    cropped = crop_to_rect(full, rect)
+    img = resized(cropped, max_width)
+    encode(img, out_path, fmt, quality)
+
+    thumb_path = None
+    if thumbnail_width and img.width > thumbnail_width:
+        thumb_path = f"{base}.thumb{ext}"
+        encode(resized(img, thumbnail_width), thumb_path, fmt, quality)
+
+    bytes_out = os.path.getsize(out_path)
+    if bytes_out >= bytes_in and cropped is full:
+        # flat PNGs can beat a lossy encode; never make a file bigger for nothing
+        os.remove(out_path)
+        out_path, bytes_out = path, bytes_in
+    else:
+        os.remove(path)
+    return {
+        "path": out_path,
+        "thumbnail": thumb_path,
+        "phash": dhash(out_path),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+    }
+
+
+class ScreenshotProcessor:
+    def __init__(self, enabled: bool = SCREENSHOT_PROCESSING, workers: int = SCREENSHOT_PROCESS_WORKERS):
+        self.enabled = enabled
+        self.workers = workers
+        self._pool = None
+        # completions run here, not on the process pool's result-handling thread
+        self._finisher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="screenshot-finish")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = {}
+        self._handoffs = 0
+        self._stats = {"processed": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def submit(self, path: str, rect: dict = None):
+        if not self.enabled:
+            return
+        future = self._get_pool().submit(process_screenshot, path, rect)
+        with self._lock:
+            self._pending[path] = future
+        future.add_done_callback(self._count)
+
+    def when_ready(self, path: str, then):
+        # then(result) gets {"path", "thumbnail", "phash"}; unprocessed files pass through as-is
+        with self._lock:
+            future = self._pending.pop(path, None)
+        if future is None:
+            then({"path": path, "thumbnail": None, "phash": None})
+            return
+        with self._lock:
+            self._handoffs += 1
+        future.add_done_callback(lambda f: self._finisher.submit(self._finish, f, path, then))
+
+    def close(self, wait: bool = True, timeout: float = 60):
+        # let queued crops finish and hand their files to the uploader before the pools go away
+        deadline = time.time() + timeout
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            try:
+                future.result(timeout=max(0, deadline - time.time()))
+            except Exception:
+                pass
+        with self._idle:
+            while self._handoffs and time.time() < deadline:
+                self._idle.wait(timeout=max(0.05, deadline - time.time()))
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+        self._finisher.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        stats["ratio"] = round(stats["bytes_in"] / stats["bytes_out"], 2) if stats["bytes_out"] else None
+        return stats
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the crawler is full of threads holding locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _count(self, future):
+        with self._lock:
+            if future.exception() is not None:
+                self._stats["failed"] += 1
+                return
+            res = future.result()
+            self._stats["processed"] += 1
+            self._stats["bytes_in"] += res["bytes_in"]
+            self._stats["bytes_out"] += res["bytes_out"]
+
+    def _finish(self, future, path: str, then):
+        try:
+            result = future.result()
+        except Exception as e:
+            # keep the original capture rather than losing the screenshot
+            print("[SCREENSHOT] processing error", path, e)
+            result = {"path": path, "thumbnail": None, "phash": None}
+        try:
+            then(result)
+        except Exception as e:
+            print("[SCREENSHOT] upload handoff error", e)
+        finally:
+            with self._idle:
+                self._handoffs -= 1
+                self._idle.notify_all()
+
+
+screenshot_processor = ScreenshotProcessor()
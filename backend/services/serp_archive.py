@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+import zstandard
+from dotenv import load_dotenv
+
+from models.mongo_client import get_mongo_client
+from services.r2_uploader import R2_BUCKET_NAME, get_s3_client, r2_uploader
+
+load_dotenv()
+
+SERP_ARCHIVE_ENABLED = os.getenv("SERP_ARCHIVE_ENABLED", "0") == "1"
+SERP_ARCHIVE_DIR = os.getenv("SERP_ARCHIVE_DIR", "serp_archive")
+# local: keep compressed pages on disk, r2: ship them to the bucket and drop the local copy
+SERP_ARCHIVE_BACKEND = os.getenv("SERP_ARCHIVE_BACKEND", "local")
+SERP_ARCHIVE_LEVEL = int(os.getenv("SERP_ARCHIVE_LEVEL", 10))
+SERP_ARCHIVE_PREFIX = "serp"
+
+_local = threading.local()
+
+
+def _compressor():
+    # zstd contexts are not thread-safe; one per crawl thread
+    if not hasattr(_local, "cctx"):
+        _local.cctx = zstandard.ZstdCompressor(level=SERP_ARCHIVE_LEVEL)
+    return _local.cctx
+
+
+def archive_collection():
+    return get_mongo_client()["test"]["serp_archive"]
+
+
+def ensure_archive_indexes():
+    archive_collection().create_index([("run_id", 1), ("keyword", 1), ("profile_name", 1)], name="run_kw_profile")
+    archive_collection().create_index([("timestamp", -1)], name="ts")
+    archive_collection().create_index([("digest", 1)], name="digest")
+
+
+def object_key(digest: str) -> str:
+    return f"{SERP_ARCHIVE_PREFIX}/{digest[:2]}/{digest}.html.zst"
+
+
+def local_path(digest: str) -> str:
+    return os.path.join(SERP_ARCHIVE_DIR, object_key(digest))
+
+
+def in_r2(digest: str) -> bool:
+    return archive_collection().find_one({"digest": digest, "backend": "r2"}, {"_id": 1}) is not None
+
+
+def is_archived(digest: str, path: str) -> bool:
+    if os.path.exists(path):
+        return True
+    # the r2 backend drops the local copy once the upload is confirmed, so the index remembers it
+    return SERP_ARCHIVE_BACKEND == "r2" and in_r2(digest)
+
+
+def _uploaded(digest: str, path: str, key):
+    if not key:
+        # the page stays local (and loadable); it is not handed to the screenshot dead-letter dir
+        print(f"[SERP archive] upload of {digest} failed, kept at {path}")
+        return
+    archive_collection().update_many({"digest": digest}, {"$set": {"backend": "r2"}})
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def archive_page(html: str, run_id: str, keyword: str, profile_name: str, ads: int = 0) -> str:
+    raw = html.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    path = local_path(digest)
+    # content-addressed: an identical page is stored once however often it is seen
+    if not is_archived(digest, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_compressor().compress(raw))
+        os.replace(tmp, path)
+        if SERP_ARCHIVE_BACKEND == "r2":
+            r2_uploader.submit(
+                path, key=object_key(digest), keep_local=True,
+                on_done=lambda key: _uploaded(digest, path, key),
+            )
+
+    archive_collection().insert_one({
+        "run_id": run_id,
+        "keyword": keyword,
+        "profile_name": profile_name,
+        "digest": digest,
+        "size": len(raw),
+        # only a confirmed upload makes a digest r2-backed
+        "backend": "r2" if SERP_ARCHIVE_BACKEND == "r2" and in_r2(digest) else "local",
+        "ads": ads,
+        "timestamp": datetime.now(),
+    })
+    return digest
+
+
+def load_page(digest: str) -> str:
+    path = local_path(digest)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        obj = get_s3_client().get_object(Bucket=R2_BUCKET_NAME, Key=object_key(digest))
+        data = obj["Body"].read()
+    return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+from urllib.parse import urljoin, urlparse, parse_qs, parse_qsl, urlencode
+
+import lxml.html
+
+AD_LABELS = ["Quảng cáo", "Sponsored", "Được tài trợ"]
+AD_BLOCK_XPATH = "//span[" + " or ".join(f"text()='{label}'" for label in AD_LABELS) + "]/ancestor::div[@data-text-ad]"
+
+# everything the crawler needs from every ad block, in one round-trip to chromedriver
+EXTRACT_ADS_SCRIPT = """
+var xpath = arguments[0];
+var snap = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var out = [];
+var seen = new Set();
+for (var i = 0; i < snap.snapshotLength; i++) {
+  var el = snap.snapshotItem(i);
+  if (seen.has(el)) continue;
+  seen.add(el);
+  var href = null;
+  var anchors = el.querySelectorAll('a[href]');
+  for (var j = 0; j < anchors.length; j++) {
+    if (anchors[j].href && anchors[j].href.indexOf('http') === 0) { href = anchors[j].href; break; }
+  }
+  var adv = el.querySelector('span[data-dtld]');
+  var r = el.getBoundingClientRect();
+  out.push({
+    href: href,
+    advertiser: adv ? (adv.innerText || adv.textContent || '').trim() : '',
+    data_text_ad: el.getAttribute('data-text-ad'),
+    rect: {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height}
+  });
+}
+return out;
+"""
+
+
+def extract_real_link_and_domain(href: str):
+    if "google.com/aclk" in href or "google.com/url" in href:
+        qs = parse_qs(urlparse(href).query)
+        real = qs.get("adurl", qs.get("q", [href]))[0]
+        return real, urlparse(real).netloc.replace("www.", "")
+    return href, urlparse(href).netloc.replace("www.", "")
+
+TRACKING_PARAMS = {"gclid", "gbraid", "wbraid", "gad_source", "gad_campaignid", "fbclid", "msclkid", "srsltid"}
+
+def normalize_link(link: str) -> str:
+    u = urlparse(link)
+    host = u.netloc.lower().replace("www.", "")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(u.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    path = u.path.rstrip("/")
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else "")
+
+def make_ad_key(keyword: str, link: str, domain: str) -> str:
+    # same keyword + same landing page (minus click tracking) is the same ad
+    raw = f"{keyword.strip().lower()}|{domain.lower()}|{normalize_link(link)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def extract_ads(driver) -> list:
+    return driver.execute_script(EXTRACT_ADS_SCRIPT, AD_BLOCK_XPATH) or []
+
+
+def capture_clip(driver, rect: dict, path: str) -> bool:
+    # clip in document coordinates; captureBeyondViewport avoids scrolling each block into view
+    if not rect or rect.get("width", 0) < 1 or rect.get("height", 0) <= 8:
+        return False
+    res = driver.execute_cdp_cmd("Page.captureScreenshot", {
+        "format": "png",
+        "captureBeyondViewport": True,
+        "clip": {
+            "x": rect["x"],
+            "y": rect["y"],
+            "width": rect["width"],
+            "height": rect["height"],
+            "scale": 1,
+        },
+    })
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(res["data"]))
+    return True
+
+
+def extract_ads_from_html(html: str, base_url: str = "https://www.google.com/") -> list:
+    # offline twin of EXTRACT_ADS_SCRIPT for archived page_source; no layout, so no rect
+    tree = lxml.html.fromstring(html)
+    out = []
+    for el in tree.xpath(AD_BLOCK_XPATH):
+        href = None
+        for a in el.xpath(".//a[@href]"):
+            candidate = urljoin(base_url, a.get("href"))
+            if candidate.startswith("http"):
+                href = candidate
+                break
+        adv = el.xpath(".//span[@data-dtld]")
+        out.append({
+            "href": href,
+            "advertiser": adv[0].text_content().strip() if adv else "",
+            "data_text_ad": el.get("data-text-ad"),
+            "rect": None,
+        })
+    return out
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# modules import each other as top-level packages (`from services...`), like under `uvicorn main:app`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# model modules build their collections at import; connect=False means nothing is dialled
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import mongomock
+
+from services.ad_writer import AdWriter
+
+
+def ad(ts, profile="p1", key="k1"):
+    return {
+        "ad_key": key,
+        "profile_name": profile,
+        "keyword": "giày",
+        "link": "https://shop.example.com/",
+        "domain": "shop.example.com",
+        "advertiser": "shop",
+        "screenshot_path": "s.png",
+        "timestamp": ts,
+    }
+
+
+class FakeBulkCollection:
+    # mongomock's bulk_write lags pymongo; apply the UpdateOne ops one by one
+    def __init__(self):
+        self.inner = mongomock.MongoClient().db.ads
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.inner.update_one(op._filter, op._doc, upsert=op._upsert)
+
+
+def test_upsert_groups_sightings_per_ad():
+    now = datetime(2026, 1, 1, 12)
+    ops = AdWriter._upserts([ad(now, "p1"), ad(now + timedelta(minutes=1), "p2"), ad(now, "p1", key="k2")])
+    assert len(ops) == 2
+    update = ops[0]._doc
+    assert update["$inc"] == {"seen_count": 2}
+    assert update["$addToSet"] == {"profiles": {"$each": ["p1", "p2"]}}
+    assert update["$max"]["last_seen"] == now + timedelta(minutes=1)
+    assert update["$min"]["first_seen"] == now
+    assert "first_seen" not in update["$setOnInsert"]
+
+
+def test_out_of_order_writes_keep_first_and_last_seen():
+    collection = FakeBulkCollection()
+    writer = AdWriter(collection=collection)
+    early = datetime(2026, 1, 1, 12)
+    late = early + timedelta(hours=1)
+
+    writer._write([ad(late)])
+    writer._write([ad(early, "p2")])
+
+    doc = collection.inner.find_one({"ad_key": "k1"})
+    assert doc["first_seen"] == early
+    assert doc["last_seen"] == late
+    assert doc["timestamp"] == late
+    assert doc["seen_count"] == 2
+    assert sorted(doc["profiles"]) == ["p1", "p2"]
+
+
+def test_replay_neither_recounts_nor_moves_last_seen_back():
+    collection = FakeBulkCollection()
+    live = AdWriter(collection=collection)
+    replay = AdWriter(collection=collection, replay=True)
+    seen = datetime(2026, 1, 2, 12)
+    archived = seen - timedelta(days=1)
+
+    live._write([ad(seen)])
+    replay._write([ad(archived, "p2")])
+
+    doc = collection.inner.find_one({"ad_key": "k1"})
+    assert doc["seen_count"] == 1
+    assert doc["last_seen"] == seen
+    assert doc["first_seen"] == archived
+    assert doc["profile_name"] == "p1"
+
+
+def test_replay_inserts_ads_the_live_crawl_missed():
+    collection = FakeBulkCollection()
+    AdWriter(collection=collection, replay=True)._write([ad(datetime(2026, 1, 1), key="missed")])
+    doc = collection.inner.find_one({"ad_key": "missed"})
+    assert doc["seen_count"] == 1
+    assert doc["advertiser"] == "shop"
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from api import ads_api
+
+
+def list_ads(**kwargs):
+    params = dict(limit=50, cursor=None, keyword=None, domain=None, advertiser=None,
+                  profile_name=None, start=None, end=None, fields=None)
+    params.update(kwargs)
+    return asyncio.run(ads_api.get_all_ads(**params))
+
+
+@pytest.fixture
+def ads(monkeypatch):
+    collection = AsyncMongoMockClient()["test"]["ads"]
+    monkeypatch.setattr(ads_api, "ads_collection", lambda: collection)
+    base = datetime(2026, 1, 1, 12)
+    docs = []
+    for i in range(7):
+        # pairs share a timestamp, so paging has to break ties on _id
+        docs.append({"keyword": "giày" if i % 2 else "áo", "domain": f"shop{i}.vn", "timestamp": base + timedelta(minutes=i // 2)})
+    asyncio.run(collection.insert_many(docs))
+    return docs
+
+
+def test_pages_cover_every_ad_once_in_order(ads):
+    seen = []
+    cursor = None
+    while True:
+        page = list_ads(limit=3, cursor=cursor)
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 7
+    assert len({item["id"] for item in seen}) == 7
+    keys = [(item["timestamp"], item["id"]) for item in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_and_projection(ads):
+    page = list_ads(keyword="giày", fields="domain,unknown")
+    assert len(page["items"]) == 3
+    assert set(page["items"][0]) == {"id", "domain"}
+
+
+def test_bad_cursor_is_a_400(ads):
+    with pytest.raises(HTTPException) as e:
+        list_ads(cursor="not-a-cursor")
+    assert e.value.status_code == 400
+
+
+def test_cursor_round_trip():
+    ad = {"_id": "65a000000000000000000001", "timestamp": datetime(2026, 1, 1, 12, 0, 0, 123000)}
+    ts, oid = ads_api.decode_cursor(ads_api.encode_cursor(ad))
+    assert ts == ad["timestamp"]
+    assert str(oid) == ad["_id"]
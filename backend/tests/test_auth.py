@@ -0,0 +1,55 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+
+from services import auth
+from services.auth import create_session, delete_session, get_session, hash_password, verify_password
+
+
+@pytest.fixture
+def aredis():
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+USER = {"_id": "u1", "username": "alice"}
+
+
+def test_session_round_trip(aredis):
+    async def run():
+        token = await create_session(aredis, USER)
+        session = await get_session(aredis, token)
+        assert session["user_id"] == "u1"
+        assert session["username"] == "alice"
+        assert 0 < await aredis.ttl(f"{auth.REDIS_KEY_SESSION}{auth._session_id(token)}") <= auth.SESSION_TTL
+
+        await delete_session(aredis, token)
+        assert await get_session(aredis, token) is None
+    asyncio.run(run())
+
+
+def test_forged_or_expired_tokens_never_reach_redis(aredis, monkeypatch):
+    async def run():
+        token = await create_session(aredis, USER)
+        assert await get_session(aredis, token + "x") is None
+        assert await get_session(aredis, "not-a-token") is None
+        monkeypatch.setattr(auth, "SESSION_TTL", -1)
+        assert await get_session(aredis, token) is None
+        # deleting with a bad token is a no-op
+        await delete_session(aredis, "not-a-token")
+    asyncio.run(run())
+
+
+def test_hashing_runs_in_the_process_pool():
+    async def run():
+        hashed = await hash_password("s3cret")
+        assert hashed != "s3cret"
+        assert await verify_password("s3cret", hashed)
+        assert not await verify_password("wrong", hashed)
+        # a malformed stored hash is a failed login, not a 500
+        assert not await verify_password("s3cret", "not-a-bcrypt-hash")
+    try:
+        asyncio.run(run())
+    finally:
+        auth.shutdown_hash_pool()
+        auth._pending = None
@@ -0,0 +1,40 @@
+import argparse
+import sys
+
+import benchmark
+
+
+def test_missing_memory_backends_are_reported(monkeypatch):
+    monkeypatch.setitem(sys.modules, "mongomock", None)
+    monkeypatch.setitem(sys.modules, "lupa", None)
+    args = argparse.Namespace(mongo="memory", redis="memory")
+    assert benchmark.missing_memory_backends(args) == ["mongomock", "fakeredis[lua]"]
+
+
+def test_real_stores_need_no_dev_packages(monkeypatch):
+    monkeypatch.setitem(sys.modules, "mongomock", None)
+    monkeypatch.setitem(sys.modules, "fakeredis", None)
+    args = argparse.Namespace(mongo="mongodb://db", redis="redis://cache")
+    assert benchmark.missing_memory_backends(args) == []
+
+
+def test_memory_mongo_accepts_the_ad_writer_bulk_upserts(monkeypatch):
+    from datetime import datetime
+
+    import mongomock
+
+    from services.ad_writer import AdWriter
+
+    # memory_mongo_client patches the class for the benchmark process; undo it after this test
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", mongomock.collection.Collection.bulk_write)
+    collection = benchmark.memory_mongo_client()["test"]["ads"]
+    writer = AdWriter(collection=collection)
+    doc = {"ad_key": "k", "profile_name": "p", "keyword": "kw", "link": "l", "domain": "d", "timestamp": datetime.now()}
+    assert writer._write([doc, dict(doc)]) == 2
+    assert collection.find_one({"ad_key": "k"})["seen_count"] == 2
+
+
+def test_fake_serp_renders_the_requested_ads():
+    page = benchmark.serp_html("giày", 4)
+    assert page.count('data-text-ad="1"') == 4
+    assert "giày" in page
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from services.crawl_events import emit_event, events_key, format_sse, stream_events
+
+
+@pytest.fixture
+def clients():
+    server = fakeredis.FakeServer()
+    return (fakeredis.FakeRedis(server=server, decode_responses=True),
+            fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+
+
+def collect(aredis, last_event_id="0", limit=20):
+    async def run():
+        out = []
+        async for chunk in stream_events(aredis, "r1", last_event_id, block_ms=50):
+            out.append(chunk)
+            if len(out) >= limit:
+                break
+        return out
+    return asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_emit_event_appends_to_the_run_stream(clients):
+    redis_client, _ = clients
+    emit_event(redis_client, "r1", "ads_found", keyword="giày", count=2)
+    emit_event(None, "r1", "ignored")
+    emit_event(redis_client, None, "ignored")
+
+    [(event_id, fields)] = redis_client.xrange(events_key("r1"))
+    assert fields["type"] == "ads_found"
+    data = json.loads(fields["data"])
+    assert data["keyword"] == "giày" and data["count"] == 2 and "ts" in data
+    assert 0 < redis_client.ttl(events_key("r1"))
+
+
+def test_format_sse():
+    assert format_sse("1-0", {"type": "run_done", "data": "{}"}) == "id: 1-0\nevent: run_done\ndata: {}\n\n"
+
+
+def test_stream_replays_and_ends_on_the_terminal_event(clients):
+    redis_client, aredis = clients
+    emit_event(redis_client, "r1", "keyword_started", keyword="a")
+    emit_event(redis_client, "r1", "run_done")
+
+    chunks = collect(aredis)
+    assert chunks[0] == "retry: 3000\n\n"
+    assert [c.split("\n")[1] for c in chunks[1:]] == ["event: keyword_started", "event: run_done"]
+
+
+def test_resume_continues_after_the_last_seen_event(clients):
+    redis_client, aredis = clients
+    emit_event(redis_client, "r1", "keyword_started", keyword="a")
+    emit_event(redis_client, "r1", "keyword_finished", keyword="a")
+    emit_event(redis_client, "r1", "run_done")
+    first_id = redis_client.xrange(events_key("r1"))[0][0]
+
+    chunks = collect(aredis, first_id)
+    assert [c.split("\n")[1] for c in chunks[1:]] == ["event: keyword_finished", "event: run_done"]
+
+
+def test_resume_after_the_run_ended_closes_the_stream(clients):
+    redis_client, aredis = clients
+    emit_event(redis_client, "r1", "keyword_started")
+    emit_event(redis_client, "r1", "run_error", error="boom")
+    last_id = redis_client.xrange(events_key("r1"))[-1][0]
+
+    assert collect(aredis, last_id) == ["retry: 3000\n\n"]
+
+
+def test_stream_closes_when_the_run_expires(clients):
+    redis_client, aredis = clients
+    emit_event(redis_client, "r1", "keyword_started")
+    last_id = redis_client.xrange(events_key("r1"))[-1][0]
+    redis_client.delete(events_key("r1"))
+
+    assert collect(aredis, last_id) == ["retry: 3000\n\n"]
+
+
+def test_a_run_without_events_yet_keeps_pinging(clients):
+    _, aredis = clients
+    chunks = collect(aredis, limit=3)
+    assert chunks[1:] == [": ping\n\n", ": ping\n\n"]
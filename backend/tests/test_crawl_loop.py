@@ -0,0 +1,150 @@
+import fakeredis
+import pytest
+
+from api import crawlAds_api
+from services.keyword_queue import KeywordQueue
+from services.proxy_pool import NO_PROXY
+
+
+class FakeDriver:
+    def set_window_size(self, *size):
+        pass
+
+    def execute_script(self, script, *args):
+        return None
+
+    def get(self, url):
+        pass
+
+
+@pytest.fixture
+def crawl(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    checked_in = []
+    monkeypatch.setattr(crawlAds_api.profile_cloner, "get_clone", lambda name: str(tmp_path / name))
+    monkeypatch.setattr(crawlAds_api.profile_cloner, "release", lambda name, protected=None: None)
+    monkeypatch.setattr(crawlAds_api.proxy_pool, "acquire", lambda name, prefer=None: NO_PROXY)
+    monkeypatch.setattr(crawlAds_api.driver_pool, "checkout", lambda name, launch, launch_key=None: (FakeDriver(), False))
+    monkeypatch.setattr(crawlAds_api.driver_pool, "checkin", lambda name, driver, healthy=True: checked_in.append(healthy))
+    monkeypatch.setattr(crawlAds_api, "apply_resource_blocking", lambda driver, enabled: None)
+    monkeypatch.setattr(crawlAds_api, "record_page_bytes", lambda driver: 0)
+    monkeypatch.setattr(crawlAds_api, "extract_ads", lambda driver: [])
+    monkeypatch.setattr(crawlAds_api, "SERP_ARCHIVE_ENABLED", False)
+    monkeypatch.setattr(crawlAds_api, "SCHEDULER_ENABLED", False)
+    monkeypatch.setattr(crawlAds_api, "get_rate_budget", lambda profile: type("Budget", (), {"acquire": lambda self: None})())
+    return checked_in
+
+
+def keywords(n):
+    return [{"keyword": f"kw{i}"} for i in range(n)]
+
+
+def test_captcha_stops_the_profile_and_requeues(monkeypatch, crawl):
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", lambda driver: "captcha")
+    queue = KeywordQueue(keywords(5))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "bad"}, keyword_queue=queue)
+
+    assert res["status"] == "aborted"
+    assert res["keywords_processed"] == 1
+    assert crawl == [False]
+    # nothing was lost: every keyword is still there for a healthy profile
+    assert queue.remaining() == 5
+    assert queue.has_work_for("good")
+
+
+def test_consecutive_failures_stop_the_profile(monkeypatch, crawl):
+    def dead(driver):
+        raise Exception("net::ERR_PROXY_CONNECTION_FAILED")
+
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", dead)
+    queue = KeywordQueue(keywords(10))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "bad"}, keyword_queue=queue)
+
+    assert res["status"] == "aborted"
+    assert res["keywords_processed"] == crawlAds_api.CRAWL_MAX_CONSECUTIVE_FAILURES
+    assert queue.remaining() == 10
+
+
+def test_healthy_profile_drains_the_queue(monkeypatch, crawl):
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", lambda driver: "ready")
+    queue = KeywordQueue(keywords(4))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "good"}, keyword_queue=queue)
+
+    assert res["status"] == "done"
+    assert res["keywords_processed"] == 4
+    assert queue.remaining() == 0
+    assert crawl == [True]
+
+
+def test_profile_held_elsewhere_is_skipped(monkeypatch, crawl):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.set(f"{crawlAds_api.REDIS_KEY_PROFILE_LOCK}shared", "other-host:1:1")
+    queue = KeywordQueue(keywords(2))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "shared"}, redis_client=redis_client, keyword_queue=queue)
+
+    assert res["status"] == "busy"
+    assert queue.remaining() == 2
+    assert crawl == []
+
+
+def test_full_run_crawls_only_its_keywords_and_schedules_each_once(monkeypatch, crawl):
+    from services import scheduler
+
+    monkeypatch.setattr(crawlAds_api, "SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(crawlAds_api, "get_valid_profiles", lambda path: [{"name": "p1"}, {"name": "p2"}])
+    monkeypatch.setattr(crawlAds_api.governor, "max_workers", 2)
+    monkeypatch.setattr(crawlAds_api, "get_all_keywords", lambda: pytest.fail("a scheduled run must not load every keyword"))
+    searched = []
+    monkeypatch.setattr(FakeDriver, "get", lambda self, url: searched.append(url))
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", lambda driver: "ready" if "kw0" in searched[-1] else "captcha")
+    recorded, released = [], []
+    monkeypatch.setattr(scheduler, "record_keyword_result", lambda keyword, ad_keys: recorded.append(keyword))
+    monkeypatch.setattr(scheduler, "release_keywords", lambda keywords: released.extend(keywords))
+
+    res = crawlAds_api.crawl_multi_profiles("run1", distribution="full", keywords=keywords(3))
+
+    assert res["status"] == "done"
+    # both profiles crawl kw0, then stop on kw1's captcha; kw2 is never reached
+    assert len(searched) == 4
+    assert recorded == ["kw0"]
+    assert sorted(released) == ["kw1", "kw2"]
+
+
+def test_clip_error_falls_back_to_a_viewport_screenshot(monkeypatch, crawl):
+    saved, submitted, written = [], [], []
+
+    def broken_clip(driver, rect, path):
+        raise Exception("Page.captureScreenshot failed")
+
+    monkeypatch.setattr(FakeDriver, "save_screenshot", lambda self, path: saved.append(path), raising=False)
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", lambda driver: "ready")
+    rect = {"x": 0, "y": 100, "width": 600, "height": 120}
+    monkeypatch.setattr(crawlAds_api, "extract_ads", lambda driver: [{"href": "https://shop.vn/giay", "rect": rect}])
+    monkeypatch.setattr(crawlAds_api, "capture_clip", broken_clip)
+    monkeypatch.setattr(crawlAds_api.screenshot_processor, "submit", lambda path, rect=None: submitted.append((path, rect)))
+    monkeypatch.setattr(crawlAds_api.ad_writer, "add", lambda docs, on_written=None: written.extend(docs))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "good"}, keyword_queue=KeywordQueue(keywords(1)))
+
+    assert res["ads_collected"] == 1
+    assert saved == [written[0]["screenshot_path"]]
+    # the viewport shot is cropped to the ad block by the processor
+    assert submitted == [(saved[0], rect)]
+
+
+def test_keywords_without_ads_count_once(monkeypatch, crawl):
+    monkeypatch.setattr(crawlAds_api, "wait_for_serp", lambda driver: "ready")
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.hset(f"{crawlAds_api.REDIS_KEY_PREFIX}run1", "total_keywords", "3")
+    queue = KeywordQueue(keywords(3))
+
+    res = crawlAds_api.crawl_ads_internal({"name": "good"}, "run1", redis_client, queue)
+
+    assert res["keywords_processed"] == 3
+    status = redis_client.hgetall(f"{crawlAds_api.REDIS_KEY_PREFIX}run1")
+    assert status["processed_keywords"] == "3"
+    assert status["progress"] == "100"
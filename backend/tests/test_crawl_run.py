@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from api import crawlAds_api
+from services.crawl_events import events_key
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def app_with(redis_client):
+    return SimpleNamespace(state=SimpleNamespace(redis=redis_client))
+
+
+def last_event(redis_client, run_id):
+    return redis_client.xrange(events_key(run_id))[-1][1]["type"]
+
+
+def test_reject_mode_does_not_wait_for_the_lock(monkeypatch, redis_client):
+    monkeypatch.setattr(crawlAds_api, "CRAWL_LOCK_MODE", "reject")
+    redis_client.set(crawlAds_api.REDIS_KEY_LOCK, "running-run")
+    redis_client.set(crawlAds_api.REDIS_KEY_LATEST, "running-run")
+
+    crawlAds_api.crawl_multi_worker(app_with(redis_client), "second-run")
+
+    status = redis_client.hgetall(f"{crawlAds_api.REDIS_KEY_PREFIX}second-run")
+    assert status["status"] == "rejected"
+    assert last_event(redis_client, "second-run") == "run_error"
+    # the status endpoint keeps reporting the run that actually holds the lock
+    assert redis_client.get(crawlAds_api.REDIS_KEY_LATEST) == "running-run"
+
+
+def test_lock_timeout_emits_a_terminal_event(monkeypatch, redis_client):
+    monkeypatch.setattr(crawlAds_api, "CRAWL_LOCK_MODE", "queue")
+    monkeypatch.setattr(crawlAds_api, "CRAWL_LOCK_WAIT", 0)
+    redis_client.set(crawlAds_api.REDIS_KEY_LOCK, "running-run")
+
+    crawlAds_api.crawl_multi_worker(app_with(redis_client), "waiting-run")
+
+    assert redis_client.hget(f"{crawlAds_api.REDIS_KEY_PREFIX}waiting-run", "status") == "error"
+    assert last_event(redis_client, "waiting-run") == "run_error"
+
+
+def test_run_becomes_latest_once_it_holds_the_lock(monkeypatch, redis_client):
+    seen_latest = []
+    monkeypatch.setattr(
+        crawlAds_api, "crawl_multi_profiles",
+        lambda run_id, client: seen_latest.append(client.get(crawlAds_api.REDIS_KEY_LATEST)) or {"status": "done"},
+    )
+
+    crawlAds_api.crawl_multi_worker(app_with(redis_client), "run-1")
+
+    assert seen_latest == ["run-1"]
+    assert redis_client.get(crawlAds_api.REDIS_KEY_LOCK) is None
+
+
+def test_without_redis_the_worker_still_runs(monkeypatch):
+    ran = []
+    monkeypatch.setattr(crawlAds_api, "crawl_multi_profiles", lambda run_id, client: ran.append(run_id) or {"status": "done"})
+    crawlAds_api.crawl_multi_worker(app_with(None), "run-1")
+    assert ran == ["run-1"]
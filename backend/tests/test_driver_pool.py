@@ -0,0 +1,50 @@
+from services.driver_pool import DriverPool
+
+
+class FakeDriver:
+    window_handles = ["main"]
+
+    def __init__(self):
+        self.quit_called = False
+        self.user_agent = None
+
+    def execute_script(self, script):
+        return 1
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.user_agent = params["userAgent"]
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_same_proxy_reuses_driver():
+    pool = DriverPool(enabled=True)
+    driver, reused = pool.checkout("p1", FakeDriver, launch_key="1.1.1.1:80")
+    assert not reused
+    pool.checkin("p1", driver)
+
+    again, reused = pool.checkout("p1", FakeDriver, launch_key="1.1.1.1:80")
+    assert reused
+    assert again is driver
+
+
+def test_proxy_change_relaunches_driver():
+    pool = DriverPool(enabled=True)
+    driver, _ = pool.checkout("p1", FakeDriver, launch_key="1.1.1.1:80")
+    pool.checkin("p1", driver)
+
+    fresh, reused = pool.checkout("p1", FakeDriver, launch_key="2.2.2.2:80")
+    assert not reused
+    assert fresh is not driver
+    assert driver.quit_called
+    assert pool.launch_key("p1") == "2.2.2.2:80"
+    assert pool.stats()["proxy_relaunches"] == 1
+
+
+def test_rebind_reports_user_agent_override():
+    pool = DriverPool(enabled=True)
+    driver = FakeDriver()
+    assert pool.rebind(driver, "UA/1.0")
+    assert driver.user_agent == "UA/1.0"
+    assert not pool.rebind(driver, None)
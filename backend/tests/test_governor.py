@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from services.governor import ConcurrencyGovernor
+
+
+def host(available_mb: int, load: float = 0.1, per_chrome_mb: int = 500) -> dict:
+    return {"available_mb": available_mb, "load_per_cpu": load, "chrome_browsers": 0,
+            "chrome_rss_mb": 0, "per_chrome_mb": per_chrome_mb}
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    gov = ConcurrencyGovernor(min_workers=1, max_workers=16, mem_reserve_mb=1000, load_high=0.9, load_low=0.6)
+    current = {"sample": host(1000 + 2 * 500)}
+    monkeypatch.setattr(gov, "sample", lambda: current["sample"])
+    gov.next_sample = lambda s: current.update(sample=s)
+    return gov
+
+
+def admit_all(gov) -> int:
+    admitted = 0
+    while admitted < 16 and gov.try_enter():
+        admitted += 1
+    return admitted
+
+
+def test_admissions_count_against_the_sampled_memory(governor):
+    # room for two more browsers; idle CPU would allow one step per sample
+    admitted = 0
+    for _ in range(10):
+        admitted += admit_all(governor)
+        governor.next_sample(host(1000 + (2 - admitted) * 500))
+    assert admitted == 2
+    assert governor.active == 2
+
+
+def test_ramps_one_browser_per_sample(governor):
+    governor.next_sample(host(100000))
+    assert admit_all(governor) == 1
+    assert admit_all(governor) == 0
+    governor.next_sample(host(100000))
+    assert admit_all(governor) == 1
+    assert governor.active == 2
+
+    # under load the target steps down by one, not to the floor
+    governor.active = 6
+    governor.next_sample(host(100000, load=2.0))
+    assert governor.target() == 5
+
+
+def test_min_workers_is_kept_on_a_starved_host(governor):
+    governor.next_sample(host(0, load=5.0))
+    assert governor.target() == 1
+    assert governor.try_enter()
+    assert not governor.try_enter()
+
+
+def test_running_profiles_yield_down_to_the_target(governor):
+    governor.next_sample(host(100000))
+    governor.active = 4
+    governor.next_sample(host(100000, load=2.0))
+    assert governor.target() == 3
+
+    answers = []
+    both_asked = threading.Barrier(2)
+
+    def profile():
+        # the same profile keeps being told to stop until it leaves
+        answers.append((governor.should_yield(), governor.should_yield()))
+        both_asked.wait(timeout=5)
+
+    threads = [threading.Thread(target=profile) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(answers) == [(False, False), (True, True)]
@@ -0,0 +1,69 @@
+import time
+
+import fakeredis
+import pytest
+
+from services.job_queue import RedisJobQueue, RedisKeywordSource
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def kws(*words):
+    return [{"keyword": w} for w in words]
+
+
+def test_enqueue_dedupes_and_claims_in_order(redis_client):
+    queue = RedisJobQueue(redis_client)
+    assert queue.enqueue_run("r1", kws("a", "b", "a", " ")) == 2
+    first = queue.claim()
+    second = queue.claim()
+    assert [first["keyword"], second["keyword"]] == ["a", "b"]
+    assert queue.claim() is None
+    assert queue.in_flight_count() == 2
+
+
+def test_ack_finishes_the_run(redis_client):
+    queue = RedisJobQueue(redis_client)
+    queue.enqueue_run("r1", kws("a"))
+    job = queue.claim()
+    assert queue.ack(job["_job_id"], "r1")
+    assert not queue.ack(job["_job_id"], "r1")
+    assert redis_client.hget("crawl:status:r1", "status") == "done"
+
+
+def test_expired_jobs_are_requeued_then_dead(redis_client):
+    queue = RedisJobQueue(redis_client, visibility_timeout=0, max_attempts=2)
+    queue.enqueue_run("r1", kws("a"))
+    queue.claim()
+    assert queue.requeue_expired() == 1
+    assert queue.pending_count() == 1
+    queue.claim()
+    assert queue.requeue_expired() == 0
+    assert redis_client.llen(queue.dead_key) == 1
+    assert redis_client.hget("crawl:status:r1", "status") == "done"
+
+
+def test_heartbeat_keeps_a_long_job_from_being_reclaimed(redis_client):
+    queue = RedisJobQueue(redis_client, visibility_timeout=1)
+    queue.enqueue_run("r1", kws("a"))
+    job = queue.claim()
+    time.sleep(0.6)
+    assert queue.touch_held() == 1
+    time.sleep(0.6)
+    # past the original deadline, but the heartbeat moved it
+    assert queue.requeue_expired() == 0
+    assert queue.ack(job["_job_id"], "r1")
+    assert queue.touch_held() == 0
+
+
+def test_retry_hands_the_job_back(redis_client):
+    queue = RedisJobQueue(redis_client, max_attempts=3)
+    source = RedisKeywordSource(queue)
+    queue.enqueue_run("r1", kws("a"))
+    job = source.next_for("p1")
+    assert source.retry(job)
+    assert queue.in_flight_count() == 0
+    assert source.next_for("p2")["keyword"] == "a"
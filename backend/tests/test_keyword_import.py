@@ -0,0 +1,52 @@
+import asyncio
+
+from api.keyword_api import iter_import_rows, normalize_keyword
+
+
+class FakeUpload:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def parse(text: str, fmt: str = "csv") -> list:
+    async def collect():
+        return [row async for row in iter_import_rows(FakeUpload(text.encode("utf-8")), fmt)]
+    return asyncio.run(collect())
+
+
+def test_csv_with_header():
+    rows = parse("keyword,active\r\ngiày nam,false\r\náo,\r\n")
+    assert rows == [(1, "giày nam", False, None), (2, "áo", None, None)]
+
+
+def test_csv_without_header_keeps_the_first_row():
+    rows = parse("giày nam,true\náo khoác\n")
+    assert rows == [(1, "giày nam", True, None), (2, "áo khoác", None, None)]
+
+
+def test_csv_header_columns_in_any_order_after_keyword():
+    rows = parse("Keyword,note,active\nquần,x,yes\n")
+    assert rows == [(1, "quần", True, None)]
+
+
+def test_ndjson_rows():
+    rows = parse('{"keyword": "giày", "active": false}\n"áo"\n[1]\nnot json\n', fmt="ndjson")
+    assert rows[0] == (1, "giày", False, None)
+    assert rows[1] == (2, "áo", None, None)
+    assert rows[2][3] == "Dòng phải là object hoặc string"
+    assert rows[3][3].startswith("JSON không hợp lệ")
+
+
+def test_bom_and_chunk_boundaries():
+    text = "\ufeffkeyword\n" + "".join(f"kw {i}\n" for i in range(5000))
+    rows = parse(text)
+    assert len(rows) == 5000
+    assert rows[-1][1] == "kw 4999"
+
+
+def test_normalize_matches_across_create_and_import():
+    assert normalize_keyword("  giày   nam ") == normalize_keyword("giày nam") == "giày nam"
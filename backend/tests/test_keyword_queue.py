@@ -0,0 +1,50 @@
+from services.keyword_queue import KeywordQueue
+
+
+def kws(*words):
+    return [{"keyword": w} for w in words]
+
+
+def drain(queue, profile):
+    taken = []
+    while True:
+        kw = queue.next_for(profile)
+        if kw is None:
+            return taken
+        taken.append(kw["keyword"])
+
+
+def test_shards_without_duplicates():
+    queue = KeywordQueue(kws("a", "b", "c", "a", " "), replicas=1)
+    assert queue.total == 3
+    first = queue.next_for("p1")
+    second = queue.next_for("p2")
+    assert {first["keyword"], second["keyword"]} <= {"a", "b", "c"}
+    assert first["keyword"] != second["keyword"]
+    assert queue.remaining() == 1
+
+
+def test_replicas_go_to_distinct_profiles():
+    queue = KeywordQueue(kws("a"), replicas=3, max_profiles=2)
+    assert queue.replicas == 2
+    assert queue.next_for("p1")["keyword"] == "a"
+    assert queue.next_for("p1") is None
+    assert queue.next_for("p2")["keyword"] == "a"
+    assert not queue.has_work_for("p3")
+
+
+def test_failed_keyword_goes_to_another_profile():
+    queue = KeywordQueue(kws("a", "b"))
+    kw = queue.next_for("bad")
+    assert queue.retry(kw)
+    # the failing profile does not get it back, a healthy one does
+    assert kw["keyword"] not in drain(queue, "bad")
+    assert kw["keyword"] in drain(queue, "good")
+
+
+def test_retry_is_capped():
+    queue = KeywordQueue(kws("a"), max_attempts=2)
+    assert queue.retry(queue.next_for("p1"))
+    assert not queue.retry(queue.next_for("p2"))
+    assert not queue.has_work_for("p3")
+    assert queue.remaining() == 0
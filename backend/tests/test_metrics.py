@@ -0,0 +1,39 @@
+import socket
+import urllib.request
+
+import pytest
+
+from services.metrics import CRAWL_STAGE_SECONDS, CRAWL_TIMEOUTS, observe_stage, start_metrics_server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_worker_metrics_server_exposes_crawl_series():
+    port = free_port()
+    with observe_stage("page_load"):
+        pass
+    assert start_metrics_server(port)
+    body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+    assert 'crawl_stage_seconds_count{stage="page_load"}' in body
+    # a second worker on the same host just logs and keeps crawling
+    assert not start_metrics_server(port)
+
+
+def test_disabled_metrics_port():
+    assert not start_metrics_server(0)
+
+
+def test_timeouts_are_counted_per_stage():
+    class TimeoutException(Exception):
+        pass
+
+    before = CRAWL_TIMEOUTS.labels("ad_wait")._value.get()
+    with pytest.raises(TimeoutException):
+        with observe_stage("ad_wait"):
+            raise TimeoutException()
+    assert CRAWL_TIMEOUTS.labels("ad_wait")._value.get() == before + 1
+    assert CRAWL_STAGE_SECONDS.labels("ad_wait")._sum.get() >= 0
@@ -0,0 +1,46 @@
+import pytest
+
+from services import pacing
+from services.pacing import RateBudget, get_rate_budget
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1000.0, "slept": []}
+
+    def sleep(seconds):
+        state["slept"].append(seconds)
+        state["now"] += seconds
+
+    monkeypatch.setattr(pacing.time, "monotonic", lambda: state["now"])
+    monkeypatch.setattr(pacing.time, "sleep", sleep)
+    return state
+
+
+def test_burst_is_free_then_requests_are_spaced(clock):
+    budget = RateBudget(per_minute=6, burst=2, jitter=0)
+    assert budget.acquire() == 0
+    assert budget.acquire() == 0
+    assert budget.acquire() == pytest.approx(10)
+    assert budget.acquire() == pytest.approx(10)
+
+
+def test_idle_time_refills_up_to_the_burst(clock):
+    budget = RateBudget(per_minute=60, burst=1, jitter=0)
+    budget.acquire()
+    clock["now"] += 120
+    assert budget.acquire() == 0
+    assert budget.acquire() == pytest.approx(1)
+
+
+def test_jitter_only_adds_delay(clock, monkeypatch):
+    monkeypatch.setattr(pacing.random, "uniform", lambda a, b: b)
+    budget = RateBudget(per_minute=60, burst=1, jitter=0.5)
+    assert budget.acquire() == pytest.approx(0.5)
+
+
+def test_budget_is_shared_per_profile_and_follows_its_rate():
+    first = get_rate_budget({"name": "pacing-p1", "requests_per_minute": 12})
+    again = get_rate_budget({"name": "pacing-p1 ", "requests_per_minute": 30})
+    assert again is first
+    assert first.rate == pytest.approx(0.5)
@@ -0,0 +1,63 @@
+import fcntl
+import os
+
+import pytest
+
+from services.profile_clone import ProfileCloner
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    master = tmp_path / "master"
+    for name in ("P1", "P2"):
+        (master / name).mkdir(parents=True)
+        (master / name / "Preferences").write_bytes(b"x" * 4096)
+    (master / "Local State").write_text("{}")
+    # any clone pushes the cache over its cap, so every release tries to evict
+    return ProfileCloner(str(master), str(tmp_path / "clones"), strategy="copy", max_bytes=1)
+
+
+def test_clone_copies_the_profile_and_is_reused(cloner):
+    root = cloner.get_clone("P1")
+    assert os.path.exists(os.path.join(root, "P1", "Preferences"))
+    assert not os.path.exists(os.path.join(root, "P2"))
+    cloner.get_clone("P1")
+    assert cloner.stats()["created"] == 1
+
+
+def test_clone_in_use_is_not_evicted(cloner):
+    root = cloner.get_clone("P1")
+    cloner.get_clone("P1")
+    cloner.release("P1")
+    # still held by the second user
+    assert os.path.isdir(root)
+    cloner.release("P1")
+    assert not os.path.isdir(root)
+    assert cloner.stats()["evicted"] == 1
+
+
+def test_clone_locked_by_another_process_is_not_evicted(cloner):
+    root = cloner.get_clone("P1")
+    cloner.release("P1", protected={"P1"})
+    other = ProfileCloner(cloner.master_root, cloner.clone_base, strategy="copy", max_bytes=1)
+
+    # the pooled browser's flock is still held, so the other process leaves the clone alone
+    other.evict()
+    assert os.path.isdir(root)
+
+    # once the browser leaves the pool this process may evict it itself
+    cloner.evict()
+    assert not os.path.isdir(root)
+
+
+def test_foreign_flock_blocks_eviction(cloner):
+    root = cloner.get_clone("P2")
+    fd = os.open(os.path.join(cloner.clone_base, ".P2.lock"), os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        cloner.release("P2")
+        assert os.path.isdir(root)
+    finally:
+        os.close(fd)
+    cloner.evict()
+    assert not os.path.isdir(root)
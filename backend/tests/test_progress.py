@@ -0,0 +1,55 @@
+import fakeredis
+import pytest
+
+from services.progress import ProgressReporter
+
+RUN_KEY = "crawl:status:r1"
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_increment_updates_count_percentage_and_message(redis_client):
+    redis_client.hset(RUN_KEY, mapping={"total_keywords": "4", "processed_keywords": "0"})
+    reporter = ProgressReporter(redis_client, coalesce_seconds=0)
+
+    reporter.increment("r1", "p1", total_hint=99)
+
+    assert redis_client.hgetall(RUN_KEY) == {
+        "total_keywords": "4", "processed_keywords": "1", "progress": "25", "message": "p1: processed 1/4",
+    }
+
+
+def test_percentage_is_capped(redis_client):
+    redis_client.hset(RUN_KEY, "total_keywords", "2")
+    reporter = ProgressReporter(redis_client, coalesce_seconds=0)
+    for _ in range(3):
+        reporter.increment("r1", "p1")
+    assert redis_client.hget(RUN_KEY, "processed_keywords") == "3"
+    assert redis_client.hget(RUN_KEY, "progress") == "100"
+
+
+def test_total_hint_is_used_without_a_stored_total(redis_client):
+    reporter = ProgressReporter(redis_client, coalesce_seconds=0)
+    reporter.increment("r1", "p1", total_hint=8)
+    assert redis_client.hget(RUN_KEY, "progress") == "12"
+    # no total at all still never divides by zero
+    reporter.increment("r2", "p1")
+    assert redis_client.hget("crawl:status:r2", "progress") == "100"
+
+
+def test_increments_coalesce_until_flush(redis_client):
+    redis_client.hset(RUN_KEY, "total_keywords", "10")
+    reporter = ProgressReporter(redis_client, coalesce_seconds=3600)
+    reporter.increment("r1", "p1")  # the first one goes straight out
+    for _ in range(4):
+        reporter.increment("r1", "p2")
+    assert redis_client.hget(RUN_KEY, "processed_keywords") == "1"
+
+    reporter.flush()
+    assert redis_client.hget(RUN_KEY, "processed_keywords") == "5"
+    assert redis_client.hget(RUN_KEY, "message") == "p2: processed 5/10"
+    reporter.flush()
+    assert redis_client.hget(RUN_KEY, "processed_keywords") == "5"
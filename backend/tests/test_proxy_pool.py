@@ -0,0 +1,76 @@
+import threading
+import time
+
+from services.proxy_pool import NO_PROXY, ProxyPool
+
+
+def make_pool(fetch, **kwargs):
+    kwargs.setdefault("refresh_interval", 0.01)
+    kwargs.setdefault("warmup_wait", 2)
+    return ProxyPool(fetch=fetch, probe=lambda host, port: 0.05, source_url="http://proxy-api", **kwargs)
+
+
+def test_first_acquire_waits_for_prefetch():
+    def slow_fetch():
+        time.sleep(0.2)
+        return ("10.0.0.1", "8000", "u", "p")
+
+    pool = make_pool(slow_fetch)
+    assert pool.acquire("p1", wait=0) == ("10.0.0.1", "8000", "u", "p")
+
+
+def test_acquire_falls_back_once_warmup_fails():
+    pool = make_pool(lambda: NO_PROXY)
+    started = time.time()
+    assert pool.acquire("p1", wait=0) == NO_PROXY
+    assert time.time() - started < 1.5
+
+
+def test_prefetch_loop_survives_fetch_exceptions():
+    calls = []
+
+    def flaky_fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("bad payload")
+        return ("10.0.0.2", "8000", "u", "p")
+
+    pool = make_pool(flaky_fetch, size=1)
+    pool.start()
+    deadline = time.time() + 3
+    while time.time() < deadline and pool.stats()["size"] == 0:
+        time.sleep(0.02)
+    assert pool.stats()["loop_errors"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_scoring_prefers_healthy_low_latency_proxies():
+    pool = make_pool(lambda: NO_PROXY, max_failures=2)
+    pool._add(("10.0.0.1", "80", "u", "p"))
+    pool._add(("10.0.0.2", "80", "u", "p"))
+    pool._proxies["10.0.0.2:80"]["latency"] = 0.01
+
+    best = pool.acquire("p1", wait=0)
+    assert best[0] == "10.0.0.2"
+    pool.release(best, ok=False)
+    # the failed proxy cools down, the other one takes over
+    assert pool.acquire("p2", wait=0)[0] == "10.0.0.1"
+    assert pool.stats()["proxies"][1]["cooling_down"]
+
+
+def test_prefer_keeps_the_pooled_browser_proxy():
+    pool = make_pool(lambda: NO_PROXY)
+    pool._add(("10.0.0.1", "80", "u", "p"))
+    pool._add(("10.0.0.2", "80", "u", "p"))
+    pool._proxies["10.0.0.2:80"]["latency"] = 0.01
+
+    assert pool.acquire("p1", wait=0, prefer="10.0.0.1:80")[0] == "10.0.0.1"
+
+
+def test_release_scores_the_proxy_that_was_acquired():
+    pool = make_pool(lambda: NO_PROXY, max_failures=1)
+    pool._add(("10.0.0.1", "80", "u", "p"))
+    proxy = pool.acquire("p1", wait=0)
+    pool.release(proxy, ok=False)
+    assert pool.stats()["size"] == 0
+    assert pool.stats()["evicted"] == 1
@@ -0,0 +1,56 @@
+import os
+
+from services import r2_uploader as r2
+from services.r2_uploader import R2Uploader
+
+
+def write_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"shot_{i}.png"
+        path.write_bytes(b"png" + bytes([i]))
+        os.utime(path, (i, i))
+        paths.append(str(path))
+    return paths
+
+
+def test_uploaded_files_are_removed(monkeypatch, tmp_path):
+    monkeypatch.setattr(r2, "upload_to_r2", lambda local_path, key: True)
+    uploader = R2Uploader(workers=1, dead_letter_dir=str(tmp_path / "dead"))
+    done = []
+    path = write_files(tmp_path, 1)[0]
+
+    uploader.submit(path, done.append)
+    uploader.wait_idle(timeout=5)
+
+    assert not os.path.exists(path)
+    assert done and done[0].startswith("screenshots/")
+
+
+def test_failed_uploads_go_to_a_bounded_dead_letter_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(r2, "upload_to_r2", lambda local_path, key: False)
+    monkeypatch.setattr(r2, "r2_configured", lambda: False)
+    dead = tmp_path / "dead"
+    uploader = R2Uploader(workers=1, dead_letter_dir=str(dead), dead_letter_max=2)
+    done = []
+
+    for path in write_files(tmp_path, 4):
+        uploader.submit(path, done.append)
+    uploader.wait_idle(timeout=5)
+
+    assert done == [None] * 4
+    assert not list(tmp_path.glob("shot_*.png"))
+    assert sorted(os.listdir(dead)) == ["shot_2.png", "shot_3.png"]
+    assert uploader.stats()["discarded"] == 2
+
+
+def test_failed_uploads_are_deleted_without_a_dead_letter_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(r2, "upload_to_r2", lambda local_path, key: False)
+    monkeypatch.setattr(r2, "r2_configured", lambda: False)
+    uploader = R2Uploader(workers=1, dead_letter_dir="")
+    path = write_files(tmp_path, 1)[0]
+
+    uploader.submit(path)
+    uploader.wait_idle(timeout=5)
+
+    assert not os.path.exists(path)
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from services import resource_blocking
+
+
+def log_entry(method, **params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}}), "level": "INFO"}
+
+
+class PerfLogDriver:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_log(self, kind):
+        assert kind == "performance"
+        entries, self.entries = self.entries, []
+        return entries
+
+
+class ResourceTimingDriver:
+    def get_log(self, kind):
+        raise Exception("performance log not enabled")
+
+    def execute_script(self, script):
+        return [1200, 3]
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(resource_blocking, "_stats", {k: 0 for k in resource_blocking._stats})
+
+
+def test_cdp_log_counts_cross_origin_bytes():
+    driver = PerfLogDriver([
+        log_entry("Network.requestWillBeSent", requestId="1"),
+        log_entry("Network.loadingFinished", requestId="1", encodedDataLength=50000),
+        # cross-origin image: resource timing would report 0 here
+        log_entry("Network.loadingFinished", requestId="2", encodedDataLength=20000),
+        log_entry("Network.loadingFailed", requestId="3", blockedReason="inspector"),
+        {"message": "not json"},
+    ])
+    assert resource_blocking.record_page_bytes(driver) == 70000
+    # drained: the next page starts from zero
+    assert resource_blocking.record_page_bytes(driver) == 0
+
+    stats = resource_blocking.page_bytes_stats()
+    assert stats["requests"] == 2
+    assert stats["blocked"] == 1
+    assert stats["pages_cdp"] == 2
+    assert not stats["lower_bound"]
+
+
+def test_resource_timing_fallback_is_flagged_as_lower_bound():
+    assert resource_blocking.record_page_bytes(ResourceTimingDriver()) == 1200
+    stats = resource_blocking.page_bytes_stats()
+    assert stats["pages_resource_timing"] == 1
+    assert stats["lower_bound"]
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from services import scheduler
+from services.scheduler import SCHEDULER_MAX_INTERVAL, AdaptiveScheduler, RunResults
+
+
+def test_tick_leases_keywords_until_they_report_back(monkeypatch):
+    postponed = {}
+    monkeypatch.setattr(scheduler, "get_due_keywords", lambda now: [{"keyword": "giày"}, {"keyword": "áo"}])
+    monkeypatch.setattr(scheduler, "postpone_keywords", lambda keywords, until: postponed.update(keywords=keywords, until=until))
+
+    dispatched = []
+    sched = AdaptiveScheduler(None, dispatched.append)
+    started = datetime.now()
+    assert sched.tick() == 2
+
+    assert postponed["keywords"] == ["giày", "áo"]
+    assert postponed["until"] - started >= timedelta(seconds=SCHEDULER_MAX_INTERVAL)
+    assert len(dispatched) == 1
+
+
+def test_leadership_survives_a_blocking_dispatch():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    leader = AdaptiveScheduler(redis_client, lambda keywords: None, leader_ttl=2)
+    other = AdaptiveScheduler(redis_client, lambda keywords: None, leader_ttl=2)
+    try:
+        assert leader._is_leader()
+        # longer than the leader TTL, as a local-mode crawl would be
+        time.sleep(3)
+        assert not other._is_leader()
+        assert leader._is_leader()
+    finally:
+        leader.stop()
+        other.stop()
+    assert other._is_leader()
+    other.stop()
+
+
+def test_record_keyword_result_backs_off_and_speeds_up(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(scheduler, "get_keyword_schedule", lambda keyword: saved.get(keyword))
+    monkeypatch.setattr(scheduler, "update_keyword_schedule", lambda keyword, fields: saved.__setitem__(keyword, fields))
+
+    scheduler.record_keyword_result("giày", {"a"}, base_interval=60)
+    first = saved["giày"]["crawl_interval"]
+    scheduler.record_keyword_result("giày", {"a"}, base_interval=60)
+    assert saved["giày"]["crawl_interval"] == first * 2
+    scheduler.record_keyword_result("giày", {"b"}, base_interval=60)
+    assert saved["giày"]["crawl_interval"] == first
+    assert saved["giày"]["priority"] == 1
+
+
+@pytest.mark.parametrize("use_redis", [False, True])
+def test_run_results_record_once_per_keyword_and_release_failures(monkeypatch, use_redis):
+    recorded, released = {}, []
+    monkeypatch.setattr(scheduler, "record_keyword_result", lambda keyword, ad_keys: recorded.setdefault(keyword, []).append(set(ad_keys)))
+    monkeypatch.setattr(scheduler, "release_keywords", lambda keywords: released.extend(keywords))
+    redis_client = fakeredis.FakeRedis(decode_responses=True) if use_redis else None
+
+    # Redis-backed results are rebuilt per report, as the worker replicas do
+    results = RunResults("r1", redis_client)
+    fresh = (lambda: RunResults("r1", redis_client)) if use_redis else (lambda: results)
+    fresh().track(["giày", "áo", "mũ"])
+    # replicas on different profiles (or hosts) report the same keyword
+    for ad_keys in ({"a"}, {"b"}, None):
+        fresh().add("giày", ad_keys)
+    fresh().add("áo", None)
+
+    assert results.finish() == {"recorded": 1, "released": 2}
+    assert recorded == {"giày": [{"a", "b"}]}
+    assert sorted(released) == ["mũ", "áo"]
+    if use_redis:
+        assert not redis_client.keys("crawl:schedule:*")
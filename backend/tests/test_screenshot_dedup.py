@@ -0,0 +1,93 @@
+import fakeredis
+import pytest
+from PIL import Image, ImageDraw
+
+from services.screenshot_dedup import REDIS_KEY_PHASH, ScreenshotDedup, dhash, hamming
+
+
+def creative(path, text_x=20, banner=(30, 90, 200), size=(600, 150)):
+    img = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, size[0] // 3, size[1]), fill=banner)
+    draw.rectangle((text_x + 200, 40, text_x + 500, 110), fill=(20, 20, 20))
+    img.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def dedup(monkeypatch, redis_client):
+    d = ScreenshotDedup(max_distance=4)
+    monkeypatch.setattr(d, "_client", lambda: redis_client)
+    return d
+
+
+def test_dhash_ignores_encoding_and_scale(tmp_path):
+    png = creative(tmp_path / "a.png")
+    Image.open(png).convert("RGB").resize((300, 75)).save(tmp_path / "a.jpg", quality=70)
+
+    h = dhash(png)
+    assert len(h) == 16
+    assert hamming(h, dhash(str(tmp_path / "a.jpg"))) <= 4
+
+
+def test_dhash_separates_different_creatives(tmp_path):
+    a = dhash(creative(tmp_path / "a.png"))
+    b = dhash(creative(tmp_path / "b.png", text_x=-150, banner=(250, 250, 250)))
+    assert hamming(a, b) > 4
+
+
+def test_hamming():
+    assert hamming("00", "00") == 0
+    assert hamming("0f", "00") == 4
+    assert hamming("ffffffffffffffff", "0000000000000000") == 64
+
+
+def test_lookup_hits_within_the_threshold(dedup):
+    dedup.remember("ad1", "ff00000000000000", "screenshots/abc.webp")
+
+    assert dedup.lookup("ad1", "ff00000000000007") == "screenshots/abc.webp"
+    assert dedup.lookup("ad1", "ff0000000000001f") is None
+    assert dedup.lookup("ad2", "ff00000000000000") is None
+    assert dedup.stats()["hits"] == 1
+    assert dedup.stats()["misses"] == 2
+
+
+def test_other_workers_entries_are_read_through_redis(dedup, redis_client, monkeypatch):
+    redis_client.hset(f"{REDIS_KEY_PHASH}ad1", mapping={"hash": "00", "key": "screenshots/x.webp"})
+
+    assert dedup.lookup("ad1", "01") == "screenshots/x.webp"
+    # cached locally now: Redis is not asked again
+    monkeypatch.setattr(redis_client, "hgetall", lambda name: pytest.fail("cached entry re-read"))
+    assert dedup.lookup("ad1", "00") == "screenshots/x.webp"
+
+
+def test_remember_writes_through_with_a_ttl(dedup, redis_client):
+    dedup.remember("ad1", "abcd", "screenshots/y.webp")
+    assert redis_client.hgetall(f"{REDIS_KEY_PHASH}ad1") == {"hash": "abcd", "key": "screenshots/y.webp"}
+    assert redis_client.ttl(f"{REDIS_KEY_PHASH}ad1") > 0
+
+
+def test_incomplete_redis_entries_and_errors_are_misses(dedup, redis_client, monkeypatch):
+    redis_client.hset(f"{REDIS_KEY_PHASH}ad1", "hash", "00")
+    assert dedup.lookup("ad1", "00") is None
+
+    def down(name):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(redis_client, "hgetall", down)
+    assert dedup.lookup("ad2", "00") is None
+    assert dedup.stats()["errors"] == 1
+
+
+def test_local_cache_is_bounded(monkeypatch):
+    d = ScreenshotDedup(cache_size=2)
+    monkeypatch.setattr(d, "_client", lambda: None)
+    for i in range(3):
+        d.remember(f"ad{i}", "00", f"k{i}")
+    assert d.lookup("ad0", "00") is None
+    assert d.lookup("ad2", "00") == "k2"
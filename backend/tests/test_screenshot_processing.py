@@ -0,0 +1,104 @@
+import os
+import random
+import threading
+
+import pytest
+from PIL import Image
+
+from services.screenshot_processing import ScreenshotProcessor, crop_to_rect, process_screenshot
+
+
+def capture(path, width=1200, height=800, noisy=True):
+    # noise so lossy output is clearly smaller than the PNG capture, like a real page
+    img = Image.new("RGB", (width, height), (240, 240, 240))
+    if noisy:
+        rnd = random.Random(1)
+        img.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(width * height)])
+    img.save(path, "PNG", optimize=True)
+    return str(path)
+
+
+def test_crop_resize_and_webp(tmp_path):
+    path = capture(tmp_path / "ad.png")
+    res = process_screenshot(path, {"x": 100, "y": 200, "width": 1000, "height": 150}, fmt="webp", max_width=500)
+
+    assert res["path"] == str(tmp_path / "ad.webp")
+    assert not os.path.exists(path)
+    with Image.open(res["path"]) as out:
+        assert out.format == "WEBP"
+        assert out.size == (500, 75)
+    assert res["bytes_out"] < res["bytes_in"]
+    assert res["phash"] is not None
+    assert res["thumbnail"] is None
+
+
+def test_jpeg_with_thumbnail(tmp_path):
+    path = capture(tmp_path / "ad.png", width=600, height=300)
+    res = process_screenshot(path, fmt="jpeg", max_width=800, thumbnail_width=200)
+
+    with Image.open(res["path"]) as out:
+        assert out.format == "JPEG"
+        assert out.size == (600, 300)
+    with Image.open(res["thumbnail"]) as thumb:
+        assert thumb.size == (200, 100)
+
+
+def test_original_is_kept_when_encoding_would_grow_it(tmp_path):
+    path = capture(tmp_path / "flat.png", width=300, height=100, noisy=False)
+    res = process_screenshot(path, fmt="png", max_width=800)
+
+    assert res["path"] == path
+    assert os.path.exists(path)
+    assert res["bytes_out"] == res["bytes_in"]
+
+
+@pytest.mark.parametrize("rect", [None, {"x": 0, "y": 300, "width": 600, "height": 4}, {"x": 0, "y": 0, "width": 0, "height": 90}])
+def test_collapsed_rect_keeps_the_whole_viewport(rect):
+    img = Image.new("RGB", (1200, 800))
+    assert crop_to_rect(img, rect) is img
+
+
+def test_rect_is_clamped_to_the_capture():
+    img = Image.new("RGB", (1200, 800))
+    assert crop_to_rect(img, {"x": -10, "y": 700, "width": 2000, "height": 300}).size == (1200, 100)
+
+
+def test_processor_hands_processed_files_over(tmp_path):
+    processor = ScreenshotProcessor(enabled=True, workers=1)
+    path = capture(tmp_path / "ad.png", width=400, height=200)
+    results = []
+    done = threading.Event()
+
+    def then(result):
+        results.append(result)
+        done.set()
+
+    try:
+        processor.submit(path, {"x": 0, "y": 0, "width": 400, "height": 100})
+        processor.when_ready(path, then)
+        assert done.wait(60)
+        # a file that was never submitted passes straight through
+        processor.when_ready(str(tmp_path / "raw.png"), results.append)
+    finally:
+        processor.close()
+
+    assert results[0]["path"].endswith(".webp")
+    assert results[0]["phash"] is not None
+    assert results[1] == {"path": str(tmp_path / "raw.png"), "thumbnail": None, "phash": None}
+    assert processor.stats()["processed"] == 1
+
+
+def test_processing_error_keeps_the_original(tmp_path):
+    processor = ScreenshotProcessor(enabled=True, workers=1)
+    path = str(tmp_path / "broken.png")
+    with open(path, "wb") as f:
+        f.write(b"not a png")
+    results = []
+    try:
+        processor.submit(path)
+        processor.when_ready(path, results.append)
+    finally:
+        processor.close()
+
+    assert results == [{"path": path, "thumbnail": None, "phash": None}]
+    assert processor.stats()["failed"] == 1
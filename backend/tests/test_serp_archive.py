@@ -0,0 +1,53 @@
+import os
+
+import mongomock
+import pytest
+
+from services import serp_archive
+
+
+@pytest.fixture
+def r2_archive(monkeypatch, tmp_path):
+    collection = mongomock.MongoClient().db.serp_archive
+    uploads = []
+
+    def submit(path, key=None, keep_local=False, on_done=None):
+        # the uploader runs on_done(key) once the object is in the bucket, on_done(None) if it never gets there
+        assert keep_local
+        uploads.append((path, key, on_done))
+
+    monkeypatch.setattr(serp_archive, "archive_collection", lambda: collection)
+    monkeypatch.setattr(serp_archive, "SERP_ARCHIVE_BACKEND", "r2")
+    monkeypatch.setattr(serp_archive, "SERP_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(serp_archive.r2_uploader, "submit", submit)
+    return collection, uploads
+
+
+def test_r2_backend_archives_a_page_once(r2_archive):
+    collection, uploads = r2_archive
+
+    first = serp_archive.archive_page("<html>same</html>", "run1", "giày", "p1")
+    # still uploading: the local copy is what dedupes
+    assert collection.count_documents({"digest": first, "backend": "r2"}) == 0
+    path, key, on_done = uploads[0]
+    on_done(key)
+    assert not os.path.exists(path)
+    second = serp_archive.archive_page("<html>same</html>", "run2", "giày", "p2")
+
+    assert first == second
+    assert len(uploads) == 1
+    assert collection.count_documents({"digest": first, "backend": "r2"}) == 2
+
+
+def test_failed_upload_keeps_the_page_local(r2_archive):
+    collection, uploads = r2_archive
+
+    digest = serp_archive.archive_page("<html>lost</html>", "run1", "giày", "p1")
+    path, key, on_done = uploads[0]
+    on_done(None)
+
+    assert os.path.exists(path)
+    assert collection.count_documents({"digest": digest, "backend": "r2"}) == 0
+    assert serp_archive.load_page(digest) == "<html>lost</html>"
+    serp_archive.archive_page("<html>lost</html>", "run2", "giày", "p2")
+    assert len(uploads) == 1
@@ -0,0 +1,48 @@
+from services.serp_extract import extract_ads_from_html, extract_real_link_and_domain, make_ad_key, normalize_link
+
+SERP = """
+<html><body>
+<div data-text-ad="1">
+  <span>Quảng cáo</span>
+  <a href="/aclk?sa=l&adurl=https://www.shop.vn/giay?gclid=abc">Giày</a>
+  <span data-dtld="shop.vn"> Shop VN </span>
+</div>
+<div data-text-ad="2">
+  <span>Sponsored</span><span>Sponsored</span>
+  <a href="javascript:void(0)">x</a>
+  <a href="https://other.vn/">Other</a>
+</div>
+<div class="organic"><a href="https://organic.vn/">not an ad</a></div>
+</body></html>
+"""
+
+
+def test_extract_ads_from_archived_html():
+    ads = extract_ads_from_html(SERP)
+
+    assert [ad["data_text_ad"] for ad in ads] == ["1", "2"]
+    assert ads[0]["href"] == "https://www.google.com/aclk?sa=l&adurl=https://www.shop.vn/giay?gclid=abc"
+    assert ads[0]["advertiser"] == "Shop VN"
+    assert ads[0]["rect"] is None
+    # non-http anchors are skipped; a block with two labels is still one ad
+    assert ads[1]["href"] == "https://other.vn/"
+    assert ads[1]["advertiser"] == ""
+
+
+def test_click_urls_resolve_to_the_landing_page():
+    link, domain = extract_real_link_and_domain(extract_ads_from_html(SERP)[0]["href"])
+    assert link == "https://www.shop.vn/giay?gclid=abc"
+    assert domain == "shop.vn"
+
+
+def test_normalize_link_drops_click_tracking():
+    assert normalize_link("https://www.Shop.vn/giay/?utm_source=g&gclid=1&size=42&color=den") == "shop.vn/giay?color=den&size=42"
+    assert normalize_link("https://shop.vn/giay") == "shop.vn/giay"
+    assert normalize_link("https://shop.vn/") == "shop.vn"
+
+
+def test_ad_key_is_stable_across_tracking_and_formatting():
+    key = make_ad_key("Giày ", "https://www.shop.vn/giay/?gclid=1", "shop.vn")
+    assert key == make_ad_key("giày", "https://shop.vn/giay?utm_campaign=x&srsltid=2", "Shop.vn")
+    assert key != make_ad_key("áo", "https://shop.vn/giay", "shop.vn")
+    assert key != make_ad_key("giày", "https://shop.vn/giay?size=42", "shop.vn")
@@ -0,0 +1,96 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from models import versioned_cache
+from models.versioned_cache import VersionedCache, bump_version, bump_version_async, version_key
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(monkeypatch, server):
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(versioned_cache, "_redis", client)
+    return client
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(versioned_cache, "_redis", None)
+    monkeypatch.setattr(versioned_cache, "_redis_failed", True)
+
+
+def counting_loader(rows):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return [dict(r) for r in rows]
+    return load, calls
+
+
+def test_reads_are_served_from_memory_until_the_version_moves(redis_client):
+    load, calls = counting_loader([{"keyword": "a"}])
+    cache = VersionedCache("keywords", load)
+    assert cache.get() == [{"keyword": "a"}]
+    assert cache.get() == [{"keyword": "a"}]
+    assert len(calls) == 1
+    assert cache.version == "0"
+
+    bump_version("keywords")
+    cache.get()
+    assert len(calls) == 2
+    assert cache.version == "1"
+    assert cache.stats() == {"hits": 1, "loads": 2, "version": "1", "size": 1}
+
+
+def test_async_bump_from_the_api_invalidates_other_processes(redis_client, server):
+    load, calls = counting_loader([{"name": "p1"}])
+    cache = VersionedCache("profiles", load)
+    cache.get()
+
+    aredis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    asyncio.run(bump_version_async(aredis, "profiles"))
+    assert redis_client.get(version_key("profiles")) == "1"
+    cache.get()
+    assert len(calls) == 2
+
+
+def test_callers_get_copies(redis_client):
+    load, calls = counting_loader([{"name": "p1"}])
+    cache = VersionedCache("profiles", load)
+    cache.get()[0]["status"] = "annotated"
+    assert cache.get() == [{"name": "p1"}]
+    assert len(calls) == 1
+
+
+def test_without_redis_falls_back_to_ttl(no_redis, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(versioned_cache.time, "time", lambda: now[0])
+    load, calls = counting_loader([{"keyword": "a"}])
+    cache = VersionedCache("keywords", load)
+    cache.get()
+    now[0] += versioned_cache.CACHE_FALLBACK_TTL - 1
+    cache.get()
+    assert len(calls) == 1
+    now[0] += 2
+    cache.get()
+    assert len(calls) == 2
+    # bumping without a client is a no-op, not an error
+    bump_version("keywords")
+    asyncio.run(bump_version_async(None, "keywords"))
+
+
+def test_invalidate_forces_a_reload(redis_client):
+    load, calls = counting_loader([])
+    cache = VersionedCache("keywords", load)
+    cache.get()
+    cache.invalidate()
+    cache.get()
+    assert len(calls) == 2
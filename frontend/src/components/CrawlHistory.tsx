@@ -114,13 +114,12 @@ export default function CrawlHistory() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const res = await fetch(`${API_BASE_URL}/api/ads/`)
+        const res = await fetch(`${API_BASE_URL}/api/ads/?limit=500`)
         if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`)
         const data = await res.json()
-        if (!Array.isArray(data)) throw new Error('Data is not an array')
+        if (!Array.isArray(data.items)) throw new Error('Data is not an array')
 
-        const limitedData = data.slice(-500)
-        setHistory(limitedData.reverse())
+        setHistory(data.items)
       } catch (err) {
         setError('lỗi tải dữ liệu.')
       }